@@ -0,0 +1,31 @@
+"""add_escalation_columns
+
+Revision ID: a7d3e9f1c5b2
+Revises: f2b8c4d1e7a3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f1c5b2'
+down_revision: Union[str, None] = 'f2b8c4d1e7a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Answers rejected by output validation (and their tokens) on both job tables
+    for table in ('extraction_jobs', 'api_extraction_jobs'):
+        op.add_column(table, sa.Column('escalation_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('escalation_tokens', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    for table in ('api_extraction_jobs', 'extraction_jobs'):
+        op.drop_column(table, 'escalation_tokens')
+        op.drop_column(table, 'escalation_count')
@@ -0,0 +1,29 @@
+"""add_continuation_count
+
+Revision ID: b4e8f2a6d9c3
+Revises: a7d3e9f1c5b2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8f2a6d9c3'
+down_revision: Union[str, None] = 'a7d3e9f1c5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Completions that continued an answer cut off at max_tokens, on both job tables
+    for table in ('extraction_jobs', 'api_extraction_jobs'):
+        op.add_column(table, sa.Column('continuation_count', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    for table in ('api_extraction_jobs', 'extraction_jobs'):
+        op.drop_column(table, 'continuation_count')
@@ -0,0 +1,29 @@
+"""add_message_layout
+
+Revision ID: c9a1d5e3f7b4
+Revises: b4e8f2a6d9c3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9a1d5e3f7b4'
+down_revision: Union[str, None] = 'b4e8f2a6d9c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Message layout of each job (prompt_first or document_first), on both job tables
+    for table in ('extraction_jobs', 'api_extraction_jobs'):
+        op.add_column(table, sa.Column('message_layout', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    for table in ('api_extraction_jobs', 'extraction_jobs'):
+        op.drop_column(table, 'message_layout')
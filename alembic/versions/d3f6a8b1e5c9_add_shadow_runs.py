@@ -0,0 +1,61 @@
+"""add_shadow_runs
+
+Revision ID: d3f6a8b1e5c9
+Revises: c9a1d5e3f7b4
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f6a8b1e5c9'
+down_revision: Union[str, None] = 'c9a1d5e3f7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create shadow_runs table
+    op.create_table(
+        'shadow_runs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('extractor_id', sa.Integer(), nullable=False),
+        sa.Column('production_model', sa.String(100), nullable=True),
+        sa.Column('candidate_model', sa.String(100), nullable=False),
+        sa.Column('status', sa.String(32), nullable=False, server_default='completed'),
+        sa.Column('result_content', sa.Text(), nullable=True),
+        sa.Column('agreement', sa.Float(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('latency_ms', sa.Integer(), nullable=True),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=True),
+        sa.Column('completion_tokens', sa.Integer(), nullable=True),
+        sa.Column('total_tokens', sa.Integer(), nullable=True),
+        sa.Column('cost', sa.Float(), nullable=True),
+        sa.Column('production_latency_ms', sa.Integer(), nullable=True),
+        sa.Column('production_total_tokens', sa.Integer(), nullable=True),
+        sa.Column('production_cost', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.ForeignKeyConstraint(['job_id'], ['extraction_jobs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['extractor_id'], ['extractors.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_shadow_runs_job_id', 'shadow_runs', ['job_id'])
+    op.create_index('ix_shadow_runs_extractor_id', 'shadow_runs', ['extractor_id'])
+    op.create_index('ix_shadow_runs_candidate_model', 'shadow_runs', ['candidate_model'])
+    op.create_index('ix_shadow_runs_created_at', 'shadow_runs', ['created_at'])
+    op.create_index('idx_shadow_extractor_candidate', 'shadow_runs', ['extractor_id', 'candidate_model'])
+
+
+def downgrade() -> None:
+    # Drop shadow_runs table
+    op.drop_index('idx_shadow_extractor_candidate', 'shadow_runs')
+    op.drop_index('ix_shadow_runs_created_at', 'shadow_runs')
+    op.drop_index('ix_shadow_runs_candidate_model', 'shadow_runs')
+    op.drop_index('ix_shadow_runs_extractor_id', 'shadow_runs')
+    op.drop_index('ix_shadow_runs_job_id', 'shadow_runs')
+    op.drop_table('shadow_runs')
@@ -0,0 +1,61 @@
+"""add_deferred_batch_jobs
+
+Revision ID: e1a4b7c9d2f6
+Revises: d5f7e8a9b2c3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a4b7c9d2f6'
+down_revision: Union[str, None] = 'd5f7e8a9b2c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Job class and batch membership on both job tables
+    for table in ('extraction_jobs', 'api_extraction_jobs'):
+        op.add_column(table, sa.Column('job_class', sa.String(20), nullable=False, server_default='interactive'))
+        op.add_column(table, sa.Column('batch_id', sa.String(100), nullable=True))
+        op.create_index(f'ix_{table}_job_class', table, ['job_class'])
+        op.create_index(f'ix_{table}_batch_id', table, ['batch_id'])
+
+    # Create llm_batches table
+    op.create_table(
+        'llm_batches',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('batch_id', sa.String(100), nullable=False),
+        sa.Column('provider_name', sa.String(100), nullable=False),
+        sa.Column('backend', sa.String(50), nullable=False),
+        sa.Column('provider_batch_id', sa.String(255), nullable=True),
+        sa.Column('status', sa.String(32), nullable=False, server_default='submitted'),
+        sa.Column('request_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('batch_id')
+    )
+    op.create_index('ix_llm_batches_batch_id', 'llm_batches', ['batch_id'])
+    op.create_index('ix_llm_batches_status', 'llm_batches', ['status'])
+    op.create_index('ix_llm_batches_created_at', 'llm_batches', ['created_at'])
+
+
+def downgrade() -> None:
+    # Drop llm_batches table
+    op.drop_index('ix_llm_batches_created_at', 'llm_batches')
+    op.drop_index('ix_llm_batches_status', 'llm_batches')
+    op.drop_index('ix_llm_batches_batch_id', 'llm_batches')
+    op.drop_table('llm_batches')
+
+    for table in ('api_extraction_jobs', 'extraction_jobs'):
+        op.drop_index(f'ix_{table}_batch_id', table)
+        op.drop_index(f'ix_{table}_job_class', table)
+        op.drop_column(table, 'batch_id')
+        op.drop_column(table, 'job_class')
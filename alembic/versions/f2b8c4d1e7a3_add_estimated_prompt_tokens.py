@@ -0,0 +1,29 @@
+"""add_estimated_prompt_tokens
+
+Revision ID: f2b8c4d1e7a3
+Revises: e1a4b7c9d2f6
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8c4d1e7a3'
+down_revision: Union[str, None] = 'e1a4b7c9d2f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pre-flight prompt token estimate on both job tables
+    for table in ('extraction_jobs', 'api_extraction_jobs'):
+        op.add_column(table, sa.Column('estimated_prompt_tokens', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in ('api_extraction_jobs', 'extraction_jobs'):
+        op.drop_column(table, 'estimated_prompt_tokens')
@@ -0,0 +1,29 @@
+"""add_job_max_tokens
+
+Revision ID: f6c3a9d2b8e4
+Revises: d3f6a8b1e5c9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c3a9d2b8e4'
+down_revision: Union[str, None] = 'd3f6a8b1e5c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Completion limit a deferred request was submitted with, on both job tables
+    for table in ('extraction_jobs', 'api_extraction_jobs'):
+        op.add_column(table, sa.Column('max_tokens', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in ('api_extraction_jobs', 'extraction_jobs'):
+        op.drop_column(table, 'max_tokens')
@@ -2,6 +2,9 @@
 
 import os
 from celery import Celery
+from celery.signals import setup_logging as celery_setup_logging, worker_process_init, worker_process_shutdown
+
+from autoglean.core.config import get_config_loader
 
 # Get Celery broker and backend from environment
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6380/0')
@@ -28,6 +31,48 @@ celery_app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
+# Deferred jobs are collected into provider batches and polled by Celery Beat
+_batch_config = get_config_loader().load_llm_config().get('batch', {}) or {}
+celery_app.conf.beat_schedule = {
+    'collect-deferred-jobs': {
+        'task': 'autoglean.collect_deferred_jobs',
+        'schedule': float(_batch_config.get('collect_interval_seconds', 300)),
+    },
+    'poll-llm-batches': {
+        'task': 'autoglean.poll_llm_batches',
+        'schedule': float(_batch_config.get('poll_interval_seconds', 60)),
+    },
+}
+
+# Shadow runs of candidate models have their own queue, served by a
+# dedicated low-concurrency worker so they never hold up production jobs
+_shadow_config = get_config_loader().load_extractors_config().get('shadow', {}) or {}
+celery_app.conf.task_routes = {
+    'autoglean.shadow_extract': {'queue': _shadow_config.get('queue', 'shadow')},
+}
+
+
+@celery_setup_logging.connect
+def configure_worker_logging(**kwargs):
+    """Use the app's structured queue-based logging instead of Celery's default."""
+    from autoglean.core.logging_config import setup_logging
+    setup_logging()
+
+
+@worker_process_init.connect
+def warm_up_http_pools(**kwargs):
+    """Open provider connections in each worker process before its first job."""
+    from autoglean.llm.http_pool import get_http_pool
+    get_http_pool().warm_up()
+
+
+@worker_process_shutdown.connect
+def close_http_pools(**kwargs):
+    """Close pooled provider connections when a worker process exits."""
+    from autoglean.llm.http_pool import get_http_pool
+    get_http_pool().close()
+
+
 # Import tasks to register them
 try:
     from autoglean.api import tasks  # noqa
@@ -7,19 +7,35 @@ from typing import List
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from celery.result import AsyncResult
 
 from autoglean.core.config import get_config_loader
+from autoglean.core.logging_config import setup_logging
 from autoglean.core.storage import get_storage_manager
-from autoglean.extractors.document import get_document_extractor
+from autoglean.extractors.budgets import get_token_budgets
+from autoglean.extractors.document import get_document_extractor, build_system_prompt
+from autoglean.extractors.encoding import encoded_prompt
+from autoglean.extractors.routing import get_model_router
+from autoglean.extractors.shadow import get_shadow_evaluator
+from autoglean.llm.cache import get_response_cache
+from autoglean.llm.circuit_breaker import get_circuit_breaker
+from autoglean.llm.context_cache import get_context_cache_manager
+from autoglean.llm.http_pool import get_http_pool
+from autoglean.llm.key_pool import get_key_pool
+from autoglean.llm.rate_limiter import get_rate_limiter
+from autoglean.llm.tokens import get_token_estimator
 from autoglean.api.celery_app import celery_app
 from autoglean.api import tasks
+from autoglean.api.streaming import stream_task_events
 from autoglean.api.models import (
     ExtractorInfo,
     ExtractorsListResponse,
     ExtractionRequest,
     ExtractionResponse,
+    CombinedExtractionRequest,
+    CombinedExtractionResponse,
+    CombinedExtractionJob,
     TaskStatusResponse,
     FileUploadResponse,
     HealthResponse,
@@ -34,10 +50,11 @@ from autoglean.public_api.routes import router as public_api_router
 from autoglean.analytics.routes import router as analytics_router
 from autoglean.auth.dependencies import get_current_active_user
 from autoglean.db.base import get_db
+from autoglean.db.models import ExtractionJob, ApiExtractionJob
 from autoglean.jobs.service import create_extraction_job
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Load configuration
@@ -131,6 +148,8 @@ async def update_extractor_prompt(extractor_id: str, request: UpdateExtractorReq
         if extractor_id not in config.get('extractors', {}):
             raise HTTPException(status_code=404, detail=f"Extractor '{extractor_id}' not found")
 
+        old_config = dict(config['extractors'][extractor_id])
+        old_prompt = old_config.get('prompt', '')
         config['extractors'][extractor_id]['prompt'] = request.prompt
 
         # Save back to file
@@ -139,6 +158,15 @@ async def update_extractor_prompt(extractor_id: str, request: UpdateExtractorReq
 
         logger.info(f"Updated extractor '{extractor_id}' prompt")
 
+        # Pick up the new prompt (workers re-read the changed file themselves)
+        # and drop provider caches built for the old one: requests carry the
+        # prompt with its output encoding instructions appended
+        config_loader.reload()
+        if old_prompt != request.prompt:
+            context_cache = get_context_cache_manager()
+            for system_prompt in {build_system_prompt(encoded_prompt(old_config)), build_system_prompt(old_prompt)}:
+                context_cache.invalidate_prompt(system_prompt)
+
         return {"message": "Extractor updated successfully", "extractor_id": extractor_id}
 
     except HTTPException:
@@ -148,6 +176,166 @@ async def update_extractor_prompt(extractor_id: str, request: UpdateExtractorReq
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# === LLM Provider Endpoints ===
+
+@app.get("/api/llm/rate-limits")
+async def get_rate_limit_headroom(current_user = Depends(get_current_active_user)):
+    """Get remaining RPM/TPM headroom for every rate-limited provider."""
+    try:
+        rate_limiter = get_rate_limiter()
+        providers = config_loader.load_llm_config().get('providers', {})
+        return {
+            'providers': [
+                rate_limiter.get_headroom(provider_name)
+                for provider_name in providers
+                if rate_limiter.is_limited(provider_name)
+            ]
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to get rate limit headroom: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/circuits")
+async def get_circuit_states(current_user = Depends(get_current_active_user)):
+    """Get the circuit breaker state (closed, open, half_open) of every provider."""
+    try:
+        circuit_breaker = get_circuit_breaker()
+        providers = config_loader.load_llm_config().get('providers', {})
+        return {'providers': [circuit_breaker.get_state(provider_name) for provider_name in providers]}
+
+    except Exception as e:
+        logger.error(f"Failed to get circuit states: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/token-estimates")
+async def get_token_estimate_calibration(
+    limit: int = 1000,
+    current_user = Depends(get_current_active_user),
+    db = Depends(get_db)
+):
+    """
+    Compare pre-flight prompt estimates with billed prompt tokens.
+
+    Uses the most recent completed, non-cached jobs; the suggested
+    token_scale per provider goes under token_estimation in llm.yaml.
+    """
+    try:
+        samples = []
+        for model in (ExtractionJob, ApiExtractionJob):
+            rows = db.query(model.model_used, model.estimated_prompt_tokens, model.prompt_tokens).filter(
+                model.status == "completed",
+                model.is_cached_result == False,
+                model.estimated_prompt_tokens != None,
+                model.prompt_tokens > 0
+            ).order_by(model.completed_at.desc()).limit(limit).all()
+            samples.extend(tuple(row) for row in rows)
+        return {'providers': get_token_estimator().calibration(samples)}
+
+    except Exception as e:
+        logger.error(f"Failed to get token estimate calibration: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/token-budgets")
+async def get_token_budget_recommendations(
+    refresh: bool = False,
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Get learned max_tokens recommendations per extractor.
+
+    Shows each extractor's completion-token percentiles over its recent
+    jobs, its static max_tokens and the recommended budget (applied to
+    calls when token_budgets.apply is set in extractors.yaml).
+    """
+    try:
+        budgets = get_token_budgets()
+        extractor = get_document_extractor()
+        recommendations = []
+        for extractor_id, extractor_config in extractor.list_extractors().items():
+            model = extractor_config.get('llm', 'gemini-flash')
+            max_output_tokens = extractor.llm_client.get_model_config(model).get('max_output_tokens')
+            recommendations.append(budgets.recommend(
+                extractor_id, int(extractor_config.get('max_tokens', 2000)), max_output_tokens, refresh
+            ))
+            refresh = False
+        return {
+            'apply': budgets.apply,
+            'percentile': budgets.percentile,
+            'margin': budgets.margin,
+            'min_samples': budgets.min_samples,
+            'extractors': recommendations
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to get token budget recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/shadow")
+async def get_shadow_report(
+    days: int = 7,
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Get the shadow evaluation of candidate models.
+
+    For each extractor and candidate model, compares the shadow runs of the
+    last `days` days with the production jobs they re-ran: agreement of the
+    outputs, median latency, mean tokens and cost, and the relative deltas.
+    """
+    try:
+        evaluator = get_shadow_evaluator()
+        return {
+            'enabled': evaluator.enabled,
+            'sample_rate': evaluator.sample_rate,
+            'agreement_threshold': evaluator.agreement_threshold,
+            'days': days,
+            'candidates': evaluator.report(days)
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to get shadow evaluation report: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/key-pool")
+async def get_key_pool_stats(current_user = Depends(get_current_active_user)):
+    """Get headroom, cooldown, in-flight leases and latency of every pooled provider key."""
+    try:
+        return get_key_pool().get_stats()
+
+    except Exception as e:
+        logger.error(f"Failed to get key pool stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/http-pool")
+async def get_http_pool_stats(current_user = Depends(get_current_active_user)):
+    """Get request/connection counters of the pooled provider clients in this process."""
+    return get_http_pool().get_stats()
+
+
+@app.get("/api/llm/routing")
+async def get_routing_stats(current_user = Depends(get_current_active_user)):
+    """Get the model ladder and routed outcome counts (success rate per extractor and model)."""
+    try:
+        return get_model_router().get_stats()
+
+    except Exception as e:
+        logger.error(f"Failed to get routing stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/llm/cache")
+async def get_cache_stats(current_user = Depends(get_current_active_user)):
+    """Get LLM response cache hit/miss counters for this process."""
+    return get_response_cache().get_stats()
+
+
 # === File Upload Endpoints ===
 
 @app.post("/api/upload", response_model=FileUploadResponse)
@@ -224,9 +412,20 @@ async def extract_document(
             user_id=current_user.id,
             extractor_id=extractor_db_id,
             file_name=file_name,
-            file_path=file_path
+            file_path=file_path,
+            job_class="deferred" if request.deferred else "interactive"
         )
 
+        if request.deferred:
+            # Picked up by the batch collector; the result is stored under this task ID
+            logger.info(f"Extraction queued for batch processing, Job: {request.job_id}, User: {current_user.email}")
+            return ExtractionResponse(
+                task_id=tasks.deferred_task_id(request.job_id),
+                job_id=request.job_id,
+                status="queued",
+                message="Extraction queued for batch processing"
+            )
+
         # Start Celery task (using UUID string)
         task = tasks.extract_document_task.delay(
             job_id=request.job_id,
@@ -251,6 +450,74 @@ async def extract_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/extract/combined", response_model=CombinedExtractionResponse)
+async def extract_document_combined(
+    request: CombinedExtractionRequest,
+    current_user = Depends(get_current_active_user),
+    db = Depends(get_db)
+):
+    """
+    Run several extractors on one uploaded document in a single LLM call.
+
+    The document and its image tokens are sent once. One job is created per
+    extractor (job ID ``{job_id}-{extractor_id}``), each with its own result
+    and a share of the call's token usage.
+    """
+    try:
+        from autoglean.db.models import Extractor
+
+        files = storage_manager.list_job_documents(request.job_id)
+        if not files:
+            raise HTTPException(status_code=404, detail="No files found for job_id")
+
+        file_path = str(files[0])
+        file_name = files[0].name
+
+        extractor_ids = list(dict.fromkeys(request.extractor_ids))
+        extractors = {
+            extractor.extractor_id: extractor
+            for extractor in db.query(Extractor).filter(Extractor.extractor_id.in_(extractor_ids)).all()
+        }
+        missing = [extractor_id for extractor_id in extractor_ids if extractor_id not in extractors]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Extractors not found: {', '.join(missing)}")
+
+        jobs = []
+        for extractor_id in extractor_ids:
+            job_id = tasks.combined_job_id(request.job_id, extractor_id)
+            create_extraction_job(
+                db=db,
+                job_id=job_id,
+                user_id=current_user.id,
+                extractor_id=extractors[extractor_id].id,
+                file_name=file_name,
+                file_path=file_path
+            )
+            jobs.append(CombinedExtractionJob(job_id=job_id, extractor_id=extractor_id))
+
+        task = tasks.extract_combined_task.delay(
+            job_ids=[job.job_id for job in jobs],
+            extractor_ids=extractor_ids,
+            file_path=file_path
+        )
+
+        logger.info(f"Combined extraction task started: {task.id}, {len(jobs)} extractors, User: {current_user.email}")
+
+        return CombinedExtractionResponse(
+            task_id=task.id,
+            jobs=jobs,
+            status="processing",
+            message=f"Combined extraction with {len(jobs)} extractors started"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Combined extraction request failed: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/task/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(task_id: str):
     """
@@ -304,6 +571,28 @@ async def get_task_status(task_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/task/{task_id}/stream")
+async def stream_task(
+    task_id: str,
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Stream partial extraction content as Server-Sent Events.
+
+    Emits a 'snapshot' of the content generated so far, 'delta' events as
+    more arrives ('reset' when a retry starts over), and a final 'done'
+    event with the task result ('timeout' for an unknown or expired task).
+    """
+    return StreamingResponse(
+        stream_task_events(task_id),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 # === Results Endpoints ===
 
 @app.get("/api/results/{job_id}")
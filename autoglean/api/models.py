@@ -34,6 +34,13 @@ class ExtractionRequest(BaseModel):
     """Request to extract from document."""
     extractor_id: str = Field(..., description="ID of extractor to use")
     job_id: str = Field(..., description="Unique job identifier")
+    deferred: bool = Field(False, description="Queue for discounted provider batch processing (results within ~24h)")
+
+
+class CombinedExtractionRequest(BaseModel):
+    """Request to run several extractors on one document in a single LLM call."""
+    extractor_ids: List[str] = Field(..., min_length=2, description="IDs of extractors to run together")
+    job_id: str = Field(..., description="Job identifier of the uploaded document")
 
 
 class BatchExtractionRequest(BaseModel):
@@ -64,6 +71,20 @@ class ExtractionResponse(BaseModel):
     message: str
 
 
+class CombinedExtractionJob(BaseModel):
+    """Job created for one extractor of a combined extraction."""
+    job_id: str
+    extractor_id: str
+
+
+class CombinedExtractionResponse(BaseModel):
+    """Response for combined extraction request."""
+    task_id: str
+    jobs: List[CombinedExtractionJob]
+    status: str
+    message: str
+
+
 class TaskStatusResponse(BaseModel):
     """Response for task status check."""
     task_id: str
@@ -0,0 +1,224 @@
+"""Live partial results for running extraction tasks.
+
+Workers publish streamed LLM output as it arrives; the API relays it to
+clients as Server-Sent Events. With Redis, every chunk is appended to a
+per-task buffer and published on a per-task channel in one transaction,
+so a subscriber can take a consistent snapshot and then continue with
+deltas without gaps. The accumulated content is also written (throttled)
+to the Celery task meta, which is what /api/task/{task_id} returns and
+what the SSE endpoint polls when Redis is unavailable.
+
+A retried task keeps its task id, so each publisher starts by clearing
+the buffer and announcing a ``reset``: subscribers drop what they have and
+follow the new attempt from seq 1.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+from celery.result import AsyncResult
+
+from autoglean.api.celery_app import celery_app
+from autoglean.core.redis_client import get_async_redis_client, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Partial buffers outlive the task long enough for late subscribers
+_PARTIAL_TTL = 3600
+
+
+def _channel(task_id: str) -> str:
+    return f"autoglean:task:{task_id}:stream"
+
+
+def _content_key(task_id: str) -> str:
+    return f"autoglean:task:{task_id}:partial"
+
+
+def _seq_key(task_id: str) -> str:
+    return f"autoglean:task:{task_id}:seq"
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class PartialResultPublisher:
+    """Publish streamed content of a Celery task as it is generated."""
+
+    def __init__(self, task, job_id: str, meta_interval: float = 0.5):
+        """
+        Args:
+            task: Bound Celery task whose state carries the partial content
+            job_id: Job identifier included in the task meta
+            meta_interval: Minimum seconds between task meta updates
+        """
+        self.task = task
+        self.task_id = task.request.id
+        self.job_id = job_id
+        self.meta_interval = meta_interval
+        self.redis = get_redis_client()
+        self.content = ''
+        self.seq = 0
+        # Tells the attempts of a retried task apart in the task meta
+        self.stream_id = uuid.uuid4().hex
+        self._last_meta_update = 0.0
+        self._reset()
+
+    def _reset(self):
+        """Drop the content of an earlier attempt and tell subscribers to start over."""
+        if self.redis is None or not self.task_id:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(_content_key(self.task_id), _seq_key(self.task_id))
+            pipe.publish(_channel(self.task_id), json.dumps({'type': 'reset', 'seq': 0}))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to reset partial result stream for {self.task_id}: {e}")
+
+    def __call__(self, delta: str):
+        """Append a piece of streamed content."""
+        self.content += delta
+        self.seq += 1
+
+        if self.redis is not None and self.task_id:
+            try:
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.append(_content_key(self.task_id), delta)
+                pipe.set(_seq_key(self.task_id), self.seq, ex=_PARTIAL_TTL)
+                pipe.expire(_content_key(self.task_id), _PARTIAL_TTL)
+                pipe.publish(_channel(self.task_id), json.dumps({
+                    'type': 'delta',
+                    'seq': self.seq,
+                    'content': delta
+                }, ensure_ascii=False))
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to publish partial result for {self.task_id}: {e}")
+
+        now = time.monotonic()
+        if now - self._last_meta_update >= self.meta_interval:
+            self._last_meta_update = now
+            self._update_meta()
+
+    def _update_meta(self):
+        if not self.task_id:
+            return
+        self.task.update_state(
+            state='PROCESSING',
+            meta={
+                'status': 'Streaming results...',
+                'job_id': self.job_id,
+                'partial_content': self.content,
+                'partial_seq': self.seq,
+                'partial_stream': self.stream_id
+            }
+        )
+
+    def close(self):
+        """Signal subscribers that the stream has ended."""
+        if self.redis is None or not self.task_id:
+            return
+        try:
+            self.redis.publish(_channel(self.task_id), json.dumps({'type': 'end', 'seq': self.seq}))
+        except Exception as e:
+            logger.warning(f"Failed to close partial result stream for {self.task_id}: {e}")
+
+
+def _final_event(task_result: AsyncResult) -> Optional[str]:
+    """Build the terminating event once the task has finished."""
+    if task_result.state == 'SUCCESS':
+        return _sse('done', {'status': 'success', 'result': task_result.result})
+    if task_result.state == 'FAILURE':
+        return _sse('done', {'status': 'failure', 'error': str(task_result.info)})
+    return None
+
+
+async def stream_task_events(
+    task_id: str,
+    poll_interval: float = 0.5,
+    idle_timeout: float = 300.0
+) -> AsyncIterator[str]:
+    """
+    Yield Server-Sent Events for a task until it finishes.
+
+    Events:
+        snapshot: {'content', 'seq'} - all content generated so far
+        delta: {'content', 'seq'} - content appended since the previous event
+        reset: {'seq'} - the task restarted (retry); discard the content so far
+        done: {'status', 'result'|'error'} - the task's final state
+        timeout: {'state'} - the task stayed PENDING with nothing streamed for
+            idle_timeout seconds (an unknown or expired task id is PENDING
+            forever); the stream ends
+    """
+    client = get_async_redis_client()
+    pubsub = None
+    last_seq = 0
+    last_stream = None
+    last_activity = time.monotonic()
+
+    try:
+        if client is not None:
+            # Subscribe before the snapshot so no delta falls in between
+            pubsub = client.pubsub()
+            await pubsub.subscribe(_channel(task_id))
+            pipe = client.pipeline(transaction=True)
+            pipe.get(_content_key(task_id))
+            pipe.get(_seq_key(task_id))
+            content, seq = await pipe.execute()
+            if seq:
+                last_seq = int(seq)
+                yield _sse('snapshot', {'content': content.decode('utf-8'), 'seq': last_seq})
+
+        while True:
+            task_result = AsyncResult(task_id, app=celery_app)
+            final_event = await asyncio.to_thread(_final_event, task_result)
+            if final_event:
+                yield final_event
+                return
+
+            if task_result.state != 'PENDING':
+                last_activity = time.monotonic()
+            elif time.monotonic() - last_activity >= idle_timeout:
+                yield _sse('timeout', {'state': task_result.state})
+                return
+
+            if pubsub is None:
+                # No Redis: fall back to the throttled task meta
+                info = task_result.info
+                if isinstance(info, dict) and 'partial_seq' in info and (
+                    info.get('partial_stream') != last_stream or info['partial_seq'] > last_seq
+                ):
+                    if last_stream is not None and info.get('partial_stream') != last_stream:
+                        yield _sse('reset', {'seq': 0})
+                    last_stream = info.get('partial_stream')
+                    last_seq = info['partial_seq']
+                    last_activity = time.monotonic()
+                    yield _sse('snapshot', {'content': info.get('partial_content', ''), 'seq': last_seq})
+                await asyncio.sleep(poll_interval)
+                continue
+
+            # Relay deltas until the stream goes idle, then re-check the task
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_interval)
+            while message is not None:
+                event = json.loads(message['data'])
+                last_activity = time.monotonic()
+                if event['type'] == 'reset':
+                    last_seq = 0
+                    yield _sse('reset', {'seq': 0})
+                elif event['type'] == 'delta' and event['seq'] > last_seq:
+                    last_seq = event['seq']
+                    yield _sse('delta', {'content': event['content'], 'seq': last_seq})
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+    finally:
+        if pubsub is not None:
+            await pubsub.unsubscribe(_channel(task_id))
+            await pubsub.aclose()
+        if client is not None:
+            await client.aclose()
@@ -3,12 +3,20 @@
 import logging
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 from autoglean.api.celery_app import celery_app
+from autoglean.api.streaming import PartialResultPublisher
 from autoglean.extractors.document import get_document_extractor
+from autoglean.extractors.layout import layout_for
+from autoglean.extractors.shadow import agreement, completion_cost, get_shadow_evaluator
+from autoglean.core.config import get_config_loader
 from autoglean.core.storage import get_storage_manager
+from autoglean.core.logging_config import job_context
 from autoglean.db.base import get_db
-from autoglean.db.models import ExtractionJob, ExtractorUsageStats, ApiExtractionJob
+from autoglean.db.models import ExtractionJob, ExtractorUsageStats, ApiExtractionJob, LlmBatch, ShadowRun
+from autoglean.llm.batch import get_batch_backend, get_batch_backend_name, get_batch_config, new_batch_id
+from autoglean.llm.errors import ProviderUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +48,101 @@ def _update_usage_stats(db, extractor_id: int, success: bool = True):
     db.commit()
 
 
+def _apply_result(row, result: dict, is_cached: bool):
+    """Copy a successful extraction result onto a job row."""
+    row.status = "completed"  # Use "completed" to match existing jobs
+    row.result_content = result.get('result_content', '')
+    row.result_path = result.get('result_path', '')
+    row.completed_at = datetime.utcnow()
+    row.is_cached_result = is_cached  # Mark if result was from cache
+
+    # Update token usage if available
+    if 'usage' in result:
+        usage = result['usage']
+        row.prompt_tokens = usage.get('prompt_tokens')
+        row.completion_tokens = usage.get('completion_tokens')
+        row.total_tokens = usage.get('total_tokens')
+        row.cached_tokens = usage.get('cached_tokens')  # Save cached tokens
+
+    # Pre-flight estimate, kept next to the actual prompt tokens for calibration
+    if result.get('estimated_prompt_tokens') is not None:
+        row.estimated_prompt_tokens = result['estimated_prompt_tokens']
+
+    # Answers rejected by output validation before the accepted one, and their cost
+    escalations = result.get('escalations') or []
+    row.escalation_count = len(escalations)
+    row.escalation_tokens = sum(escalation.get('total_tokens') or 0 for escalation in escalations)
+
+    # Completions that continued an answer cut off at max_tokens
+    row.continuation_count = result.get('continuations') or 0
+
+    # Message layout, to compare cached_tokens between layouts
+    row.message_layout = result.get('message_layout')
+
+    if 'model' in result:
+        row.model_used = result['model']
+
+
+def _record_success(db, job, api_job, result: dict, is_cached: bool, db_extractor_id):
+    """Mark the job rows of a finished extraction as completed."""
+    if job:
+        _apply_result(job, result, is_cached)
+        db.commit()
+
+        # Update usage stats (only for non-cached results)
+        if not is_cached and db_extractor_id:
+            _update_usage_stats(db, db_extractor_id)
+
+    # Also update API extraction job if this is an API request
+    if api_job:
+        _apply_result(api_job, result, is_cached)
+        db.commit()
+        logger.info(f"API extraction job {api_job.job_id} marked as completed")
+
+
+def _record_failure(db, job, api_job, error: Exception, db_extractor_id):
+    """Mark the job rows of a failed extraction as failed."""
+    if job:
+        job.status = "failed"  # Use "failed" to match existing jobs
+        job.error_message = str(error)
+        job.completed_at = datetime.utcnow()
+        db.commit()
+
+    # Update usage stats (count failures too)
+    if db_extractor_id:
+        _update_usage_stats(db, db_extractor_id, success=False)
+
+    # Also update API extraction job if this is an API request
+    if api_job:
+        api_job.status = "failed"
+        api_job.error_message = str(error)
+        api_job.completed_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"API extraction job {api_job.job_id} marked as failed")
+
+
+def _reschedule(task, db, rows: list, error: ProviderUnavailableError):
+    """
+    Re-queue an extraction whose providers are all unavailable instead of failing it.
+
+    The worker is freed while the provider recovers. Raises Celery's Retry;
+    returns only when the task has no reschedules left.
+    """
+    settings = get_config_loader().load_llm_config().get('settings', {})
+    max_reschedules = int(settings.get('max_reschedules', 5))
+    if task.request.called_directly or task.request.retries >= max_reschedules:
+        return
+
+    for row in rows:
+        if row:
+            row.status = "pending"
+    db.commit()
+
+    countdown = max(1.0, error.retry_after)
+    logger.warning(f"Providers unavailable ({error.kind}), rescheduling in {countdown:.0f}s: {error}")
+    raise task.retry(countdown=countdown, exc=error, max_retries=max_reschedules)
+
+
 @celery_app.task(bind=True, name='autoglean.extract_document')
 def extract_document_task(
     self,
@@ -58,6 +161,12 @@ def extract_document_task(
     Returns:
         Extraction result dictionary
     """
+    with job_context(job_id):
+        return _run_extraction(self, job_id, extractor_id, file_path)
+
+
+def _run_extraction(task, job_id: str, extractor_id: str, file_path: str) -> dict:
+    """Run an extraction job and record the outcome on its job rows."""
     db = next(get_db())
 
     try:
@@ -82,7 +191,7 @@ def extract_document_task(
             db.commit()
 
         # Update task state
-        self.update_state(
+        task.update_state(
             state='PROCESSING',
             meta={'status': 'Processing document...'}
         )
@@ -124,61 +233,28 @@ def extract_document_task(
             }
             is_cached = True
         else:
-            # Get extractor and process document
+            # Get extractor and process document, publishing content as it streams in
             extractor = get_document_extractor()
-            result = extractor.extract(
-                extractor_id=extractor_id,
-                file_path=file_path,
-                job_id=job_id
-            )
+            publisher = PartialResultPublisher(task, job_id)
+            try:
+                result = extractor.extract(
+                    extractor_id=extractor_id,
+                    file_path=file_path,
+                    job_id=job_id,
+                    on_partial=publisher
+                )
+            finally:
+                publisher.close()
+            # Served from the LLM response cache: no tokens billed
+            is_cached = result.get('cache_hit', False)
 
         logger.info(f"Extraction completed for job: {job_id} (cached: {is_cached})")
 
-        # Update database: mark as completed
-        if job:
-            job.status = "completed"  # Use "completed" to match existing jobs
-            job.result_content = result.get('result_content', '')
-            job.result_path = result.get('result_path', '')
-            job.completed_at = datetime.utcnow()
-            job.is_cached_result = is_cached  # Mark if result was from cache
-
-            # Update token usage if available
-            if 'usage' in result:
-                usage = result['usage']
-                job.prompt_tokens = usage.get('prompt_tokens')
-                job.completion_tokens = usage.get('completion_tokens')
-                job.total_tokens = usage.get('total_tokens')
-                job.cached_tokens = usage.get('cached_tokens')  # Save cached tokens
-
-            if 'model' in result:
-                job.model_used = result['model']
-
-            db.commit()
-
-            # Update usage stats (only for non-cached results)
-            if not is_cached and db_extractor_id:
-                _update_usage_stats(db, db_extractor_id)
+        _record_success(db, job, api_job, result, is_cached, db_extractor_id)
 
-        # Also update API extraction job if this is an API request
-        if api_job:
-            api_job.status = "completed"
-            api_job.result_content = result.get('result_content', '')
-            api_job.result_path = result.get('result_path', '')
-            api_job.completed_at = datetime.utcnow()
-            api_job.is_cached_result = is_cached
-
-            if 'usage' in result:
-                usage = result['usage']
-                api_job.prompt_tokens = usage.get('prompt_tokens')
-                api_job.completion_tokens = usage.get('completion_tokens')
-                api_job.total_tokens = usage.get('total_tokens')
-                api_job.cached_tokens = usage.get('cached_tokens')
-
-            if 'model' in result:
-                api_job.model_used = result['model']
-
-            db.commit()
-            logger.info(f"API extraction job {job_id} marked as completed")
+        # A sample of fresh results is re-run on candidate models
+        if job and not is_cached:
+            _schedule_shadow_runs(job_id, extractor_id, file_path)
 
         return {
             'status': 'completed',
@@ -187,26 +263,12 @@ def extract_document_task(
         }
 
     except Exception as e:
-        logger.error(f"Extraction failed for job {job_id}: {str(e)}", exc_info=True)
+        if isinstance(e, ProviderUnavailableError):
+            _reschedule(task, db, [job, api_job], e)
 
-        # Update database: mark as failed
-        if job:
-            job.status = "failed"  # Use "failed" to match existing jobs
-            job.error_message = str(e)
-            job.completed_at = datetime.utcnow()
-            db.commit()
-
-        # Update usage stats (count failures too)
-        if db_extractor_id:
-            _update_usage_stats(db, db_extractor_id, success=False)
+        logger.error(f"Extraction failed for job {job_id}: {str(e)}", exc_info=True)
 
-        # Also update API extraction job if this is an API request
-        if api_job:
-            api_job.status = "failed"
-            api_job.error_message = str(e)
-            api_job.completed_at = datetime.utcnow()
-            db.commit()
-            logger.info(f"API extraction job {job_id} marked as failed")
+        _record_failure(db, job, api_job, e, db_extractor_id)
 
         # Return error as a dict instead of raising to avoid Celery serialization issues
         return {
@@ -219,6 +281,112 @@ def extract_document_task(
         db.close()
 
 
+def _schedule_shadow_runs(job_id: str, extractor_id: str, file_path: str):
+    """Queue shadow runs of a completed job on its extractor's candidate models, if sampled."""
+    try:
+        evaluator = get_shadow_evaluator()
+        extractor_config = get_document_extractor().get_extractor_config(extractor_id)
+        for candidate in evaluator.sample(extractor_id, extractor_config):
+            # Routed to the shadow queue (see celery_app.task_routes)
+            shadow_extract_task.apply_async(
+                args=[job_id, extractor_id, file_path, candidate],
+                countdown=evaluator.delay_seconds
+            )
+            logger.info(
+                f"Queued shadow run of job {job_id} on {candidate}",
+                extra={'event': 'shadow_scheduled', 'extractor_id': extractor_id, 'candidate_model': candidate}
+            )
+    except Exception as e:
+        # Shadow evaluation must never affect the production job
+        logger.warning(f"Could not queue shadow runs for job {job_id}: {e}")
+
+
+@celery_app.task(name='autoglean.shadow_extract', ignore_result=True)
+def shadow_extract_task(job_id: str, extractor_id: str, file_path: str, candidate: str) -> dict:
+    """
+    Re-run a completed extraction job on a candidate model.
+
+    Runs on the low-priority shadow queue. The candidate's output, latency,
+    tokens and agreement with the production result are stored as a
+    ShadowRun; the job itself is left untouched.
+
+    Args:
+        job_id: Unique job identifier of the completed job
+        extractor_id: ID of the extractor used
+        file_path: Path to the document file
+        candidate: Provider name of the candidate model
+
+    Returns:
+        Dictionary with the run's status and agreement
+    """
+    with job_context(job_id):
+        return _run_shadow(job_id, extractor_id, file_path, candidate)
+
+
+def _run_shadow(job_id: str, extractor_id: str, file_path: str, candidate: str) -> dict:
+    """Run a candidate model on a completed job and store the comparison."""
+    db = next(get_db())
+
+    try:
+        job = db.query(ExtractionJob).filter(ExtractionJob.job_id == job_id).first()
+        if job is None or job.status != "completed":
+            logger.info(f"Skipping shadow run of job {job_id}: not a completed extraction job")
+            return {'status': 'skipped', 'job_id': job_id}
+
+        production_latency_ms = None
+        if job.started_at and job.completed_at:
+            production_latency_ms = round((job.completed_at - job.started_at).total_seconds() * 1000)
+        run = ShadowRun(
+            job_id=job.id,
+            extractor_id=job.extractor_id,
+            production_model=job.model_used,
+            candidate_model=candidate,
+            production_latency_ms=production_latency_ms,
+            production_total_tokens=job.total_tokens,
+            production_cost=completion_cost(job.model_used, job.prompt_tokens, job.completion_tokens)
+        )
+
+        try:
+            output = get_shadow_evaluator().run(extractor_id, file_path, candidate)
+            usage = output['usage']
+            run.status = "completed"
+            run.result_content = output['content']
+            run.agreement = agreement(job.result_content, output['content'], output['output_format'])
+            run.latency_ms = output['latency_ms']
+            run.prompt_tokens = usage.get('prompt_tokens')
+            run.completion_tokens = usage.get('completion_tokens')
+            run.total_tokens = usage.get('total_tokens')
+            run.cost = completion_cost(output['model'], run.prompt_tokens, run.completion_tokens)
+            if output['truncated']:
+                run.error_message = "Candidate output truncated at max_tokens"
+        except Exception as e:
+            logger.warning(f"Shadow run of job {job_id} on {candidate} failed: {e}")
+            run.status = "failed"
+            run.error_message = str(e)
+
+        db.add(run)
+        db.commit()
+
+        logger.info(
+            f"Shadow run of job {job_id} on {candidate}: {run.status}, agreement {run.agreement}",
+            extra={
+                'event': 'shadow_run',
+                'extractor_id': extractor_id,
+                'production_model': job.model_used,
+                'candidate_model': candidate,
+                'status': run.status,
+                'agreement': run.agreement,
+                'latency_ms': run.latency_ms,
+                'production_latency_ms': production_latency_ms,
+                'total_tokens': run.total_tokens,
+                'production_total_tokens': job.total_tokens
+            }
+        )
+        return {'status': run.status, 'job_id': job_id, 'candidate': candidate, 'agreement': run.agreement}
+    finally:
+        db.close()
+
+
 @celery_app.task(name='docinfo.extract_batch')
 def extract_batch_task(
     job_id: str,
@@ -266,3 +434,276 @@ def extract_batch_task(
         'results': results,
         'errors': errors
     }
+
+
+# === Combined extraction (several extractors, one call) ===
+
+def combined_job_id(job_id: str, extractor_id: str) -> str:
+    """Job ID of one extractor's row in a combined extraction of an upload."""
+    return f"{job_id}-{extractor_id}"
+
+
+@celery_app.task(bind=True, name='autoglean.extract_combined')
+def extract_combined_task(
+    self,
+    job_ids: list[str],
+    extractor_ids: list[str],
+    file_path: str
+) -> dict:
+    """
+    Run several extractors on one document in a single LLM call.
+
+    Args:
+        job_ids: Job ID of each extractor's ExtractionJob row
+        extractor_ids: IDs of extractors to run, in the same order
+        file_path: Path to document file
+
+    Returns:
+        Per-job results and errors
+    """
+    with job_context(job_ids[0]):
+        return _run_combined_extraction(self, job_ids, extractor_ids, file_path)
+
+
+def _run_combined_extraction(task, job_ids: list, extractor_ids: list, file_path: str) -> dict:
+    """Run a combined extraction and record each extractor's outcome on its job row."""
+    db = next(get_db())
+
+    try:
+        logger.info(f"Starting combined extraction: {', '.join(extractor_ids)} on {Path(file_path).name}")
+        rows = {job.job_id: job for job in db.query(ExtractionJob).filter(ExtractionJob.job_id.in_(job_ids)).all()}
+        for job in rows.values():
+            job.status = "processing"
+            job.started_at = datetime.utcnow()
+        db.commit()
+
+        task.update_state(
+            state='PROCESSING',
+            meta={'status': f'Processing document with {len(extractor_ids)} extractors...'}
+        )
+
+        try:
+            results, errors = get_document_extractor().extract_combined(extractor_ids, file_path, job_ids)
+        except Exception as e:
+            if isinstance(e, ProviderUnavailableError):
+                _reschedule(task, db, list(rows.values()), e)
+            logger.error(f"Combined extraction failed: {str(e)}", exc_info=True)
+            results, errors = {}, {job_id: e for job_id in job_ids}
+
+        for job_id in job_ids:
+            job = rows.get(job_id)
+            db_extractor_id = job.extractor_id if job else None
+            if job_id in results:
+                _record_success(db, job, None, results[job_id], results[job_id].get('cache_hit', False), db_extractor_id)
+            else:
+                _record_failure(db, job, None, errors.get(job_id, ValueError("No result")), db_extractor_id)
+
+        logger.info(f"Combined extraction finished: {len(results)} succeeded, {len(errors)} failed")
+        return {
+            'status': 'completed' if results else 'failed',
+            'job_ids': job_ids,
+            'results': results,
+            'errors': {job_id: str(error) for job_id, error in errors.items()}
+        }
+    finally:
+        db.close()
+
+
+# === Deferred jobs (provider batch APIs) ===
+
+def deferred_task_id(job_id: str) -> str:
+    """Task ID under which a deferred job's outcome is stored once its batch completes."""
+    return f"deferred_{job_id}"
+
+
+def _split_job_row(row):
+    """Return (job, api_job) for a row of either job table."""
+    if isinstance(row, ApiExtractionJob):
+        return None, row
+    return row, None
+
+
+def _job_file_path(row) -> str:
+    """Document path of a job row (API jobs store only the file name)."""
+    if isinstance(row, ApiExtractionJob):
+        return str(get_storage_manager().get_document_path(row.job_id, row.file_name))
+    return row.file_path
+
+
+def _query_deferred_rows(db, **filters) -> list:
+    """Deferred rows of both job tables matching column filters."""
+    rows = []
+    for model in (ExtractionJob, ApiExtractionJob):
+        query = db.query(model).filter(model.job_class == "deferred")
+        for column, value in filters.items():
+            query = query.filter(getattr(model, column) == value)
+        rows.extend(query.order_by(model.created_at).all())
+    return rows
+
+
+def _finish_deferred_job(db, row, response: Optional[dict], error: Optional[str]):
+    """Save a batch result on a job row and publish it as the job's task result."""
+    job, api_job = _split_job_row(row)
+    extractor_id = row.extractor.extractor_id
+
+    with job_context(row.job_id):
+        try:
+            if response is None:
+                raise ValueError(error or "Batch returned no result for this job")
+            if 'error' in response:
+                raise ValueError(f"Batch request failed: {response['error']}")
+
+            extractor = get_document_extractor()
+            extractor_config = extractor.get_extractor_config(extractor_id)
+            file_path = _job_file_path(row)
+            # The limit the request was submitted with (possibly a learned
+            # budget); rows submitted before it was stored use the static one
+            max_tokens = row.max_tokens or extractor_config.get('max_tokens', 2000)
+            response = {'layout': layout_for(extractor_config), **response}
+            # A batch answer cut off at max_tokens is continued interactively
+            response = extractor.continue_response(extractor_id, file_path, response, max_tokens)
+            result = extractor.finalize_result(extractor_id, file_path, row.job_id, response, max_tokens)
+            _record_success(db, job, api_job, result, False, row.extractor_id)
+            payload = {'status': 'completed', 'job_id': row.job_id, 'result': result}
+        except Exception as e:
+            logger.error(f"Deferred extraction failed for job {row.job_id}: {e}")
+            _record_failure(db, job, api_job, e, row.extractor_id)
+            payload = {
+                'status': 'failed',
+                'job_id': row.job_id,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+
+    # Same shape as extract_document_task's return value, so status polling works unchanged
+    celery_app.backend.store_result(deferred_task_id(row.job_id), payload, 'SUCCESS')
+
+
+@celery_app.task(name='autoglean.collect_deferred_jobs')
+def collect_deferred_jobs_task() -> dict:
+    """
+    Submit queued deferred jobs to provider batch APIs, one batch per provider.
+
+    Returns:
+        Number of batches and jobs submitted
+    """
+    batch_config = get_batch_config()
+    if not batch_config.get('enabled', True):
+        return {'batches': 0, 'jobs': 0}
+
+    db = next(get_db())
+    extractor = get_document_extractor()
+    max_batch_size = int(batch_config.get('max_requests_per_batch', 500))
+
+    try:
+        # Group queued jobs by the provider their extractor uses
+        groups = {}
+        estimates = {}
+        digests = {}
+        for row in _query_deferred_rows(db, status="queued"):
+            try:
+                # Stored transcripts are used, but no OCR call is made while collecting
+                request = extractor.build_request(row.extractor.extractor_id, _job_file_path(row), allow_transcribe=False)
+            except Exception as e:
+                _finish_deferred_job(db, row, None, f"Failed to prepare request: {e}")
+                continue
+            estimates[row.job_id] = request['estimated_prompt_tokens']
+            digests[row.job_id] = request['document_digest']
+            groups.setdefault(request['model'], []).append((row, {
+                'custom_id': row.job_id,
+                'messages': request['messages'],
+                'image_url': request['image'].data_url if request['image'] else None,
+                'temperature': request['temperature'],
+                'max_tokens': request['max_tokens']
+            }))
+
+        submitted_batches = 0
+        submitted_jobs = 0
+        for provider_name, entries in groups.items():
+            # Requests for the same document side by side (and in the same
+            # batch), so a document-first prefix is processed once and cached
+            entries.sort(key=lambda entry: digests.get(entry[0].job_id) or '')
+            backend_name = get_batch_backend_name(provider_name)
+            for start in range(0, len(entries), max_batch_size):
+                chunk = entries[start:start + max_batch_size]
+                batch_id = new_batch_id()
+                try:
+                    backend = get_batch_backend(backend_name)
+                    provider_batch_id = backend.submit(batch_id, provider_name, [request for _, request in chunk])
+                except Exception as e:
+                    # Jobs stay queued and are picked up by the next collection
+                    logger.error(f"Failed to submit {backend_name} batch for {provider_name}: {e}")
+                    continue
+
+                db.add(LlmBatch(
+                    batch_id=batch_id,
+                    provider_name=provider_name,
+                    backend=backend.name,
+                    provider_batch_id=provider_batch_id,
+                    status="submitted",
+                    request_count=len(chunk)
+                ))
+                for row, batch_request in chunk:
+                    row.status = "batched"
+                    row.batch_id = batch_id
+                    row.estimated_prompt_tokens = estimates.get(row.job_id)
+                    row.max_tokens = batch_request['max_tokens']
+                    row.started_at = datetime.utcnow()
+                db.commit()
+
+                submitted_batches += 1
+                submitted_jobs += len(chunk)
+                logger.info(f"Submitted batch {batch_id} ({len(chunk)} jobs) for {provider_name} via {backend.name}")
+
+        return {'batches': submitted_batches, 'jobs': submitted_jobs}
+    finally:
+        db.close()
+
+
+@celery_app.task(name='autoglean.poll_llm_batches')
+def poll_llm_batches_task() -> dict:
+    """
+    Poll submitted batches and fan finished results back out to their jobs.
+
+    Returns:
+        Number of batches completed and failed in this run
+    """
+    db = next(get_db())
+    completed = 0
+    failed = 0
+
+    try:
+        for batch in db.query(LlmBatch).filter(LlmBatch.status == "submitted").all():
+            try:
+                backend = get_batch_backend(batch.backend)
+                state = backend.poll(batch.provider_batch_id, batch.provider_name)
+                if state == 'in_progress':
+                    continue
+
+                results = {}
+                error = None
+                if state == 'completed':
+                    results = backend.fetch_results(batch.provider_batch_id, batch.provider_name)
+                else:
+                    error = f"Provider batch {batch.provider_batch_id} did not complete"
+            except Exception as e:
+                logger.error(f"Failed to poll batch {batch.batch_id}: {e}")
+                continue
+
+            for row in _query_deferred_rows(db, batch_id=batch.batch_id):
+                _finish_deferred_job(db, row, results.get(row.job_id), error)
+
+            batch.status = "completed" if error is None else "failed"
+            batch.error_message = error
+            batch.completed_at = datetime.utcnow()
+            db.commit()
+
+            if error is None:
+                completed += 1
+            else:
+                failed += 1
+            logger.info(f"Batch {batch.batch_id} finished: {batch.status}")
+
+        return {'completed': completed, 'failed': failed}
+    finally:
+        db.close()
@@ -4,7 +4,7 @@ import os
 import re
 import yaml
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 from threading import Lock
 
 class ConfigLoader:
@@ -14,7 +14,8 @@ class ConfigLoader:
         self.config_dir = Path(config_dir)
         self.lock = Lock()
         self._env_pattern = re.compile(r'\$\{([^}^{]+)\}')
-        self._cache: Dict[str, Any] = {}
+        # filename -> (file modification time, parsed config)
+        self._cache: Dict[str, Tuple[float, Any]] = {}
 
     def _substitute_env_vars(self, value: Any) -> Any:
         """Recursively substitute ${VAR:default} with environment variables."""
@@ -33,21 +34,31 @@ class ConfigLoader:
         return value
 
     def load_yaml(self, filename: str, use_cache: bool = True) -> Dict[str, Any]:
-        """Load YAML file with environment variable substitution."""
-        if use_cache and filename in self._cache:
-            return self._cache[filename]
+        """
+        Load YAML file with environment variable substitution.
 
+        Cached copies are re-read when the file changes on disk, so edits
+        made by another process (e.g. a prompt updated through the API)
+        reach Celery workers without a restart.
+        """
         filepath = self.config_dir / filename
-        if not filepath.exists():
+        try:
+            modified = filepath.stat().st_mtime
+        except FileNotFoundError:
             raise FileNotFoundError(f"Configuration file not found: {filepath}")
 
+        if use_cache and filename in self._cache:
+            cached_modified, cached = self._cache[filename]
+            if cached_modified == modified:
+                return cached
+
         with open(filepath, 'r') as f:
             config = yaml.safe_load(f) or {}
 
         config = self._substitute_env_vars(config)
 
         if use_cache:
-            self._cache[filename] = config
+            self._cache[filename] = (modified, config)
 
         return config
 
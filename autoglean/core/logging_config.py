@@ -0,0 +1,125 @@
+"""Structured, non-blocking logging setup.
+
+Records are handed to a QueueHandler so the calling thread never waits on
+log I/O; a QueueListener thread formats and writes them. Every record is
+tagged with the current job_id (see job_context) so per-call fields such as
+latency, tokens and model can be correlated with extraction jobs.
+"""
+
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import queue
+import random
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from pythonjsonlogger import jsonlogger
+    JSON_LOGGER_AVAILABLE = True
+except ImportError:
+    JSON_LOGGER_AVAILABLE = False
+
+from autoglean.core.config import get_config_loader
+
+_TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] [job=%(job_id)s] %(message)s"
+_JSON_FORMAT = "%(asctime)s %(levelname)s %(name)s %(job_id)s %(message)s"
+
+_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('job_id', default=None)
+
+# Global state
+_listener: Optional[logging.handlers.QueueListener] = None
+_payload_sample_rate = 0.0
+
+
+class JobContextFilter(logging.Filter):
+    """Attach the current job_id to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'job_id'):
+            record.job_id = _job_id.get()
+        return True
+
+
+@contextmanager
+def job_context(job_id: str) -> Iterator[None]:
+    """Tag all log records emitted inside the block with job_id."""
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+def should_log_payload() -> bool:
+    """Sampling decision for raw LLM request/response payloads (logged at DEBUG)."""
+    return _payload_sample_rate > 0 and random.random() < _payload_sample_rate
+
+
+def _build_formatter(fmt: str) -> logging.Formatter:
+    if fmt == 'json':
+        if JSON_LOGGER_AVAILABLE:
+            return jsonlogger.JsonFormatter(_JSON_FORMAT, rename_fields={'asctime': 'timestamp', 'levelname': 'level'})
+        logging.getLogger(__name__).warning("python-json-logger not installed, using text logs")
+    return logging.Formatter(_TEXT_FORMAT)
+
+
+def setup_logging(config: Optional[Dict[str, Any]] = None):
+    """
+    Configure root logging from the ``logging`` section of app.yaml.
+
+    Safe to call more than once; later calls replace the previous setup.
+
+    Args:
+        config: Optional logging config (defaults to app.yaml)
+    """
+    global _listener, _payload_sample_rate
+
+    if config is None:
+        config = get_config_loader().load_app_config().get('logging', {}) or {}
+
+    level = getattr(logging, str(config.get('level', 'INFO')).upper(), logging.INFO)
+    formatter = _build_formatter(config.get('format', 'json'))
+    _payload_sample_rate = float(config.get('payload_sample_rate', 0.0))
+
+    handlers = [logging.StreamHandler()]
+    if config.get('file'):
+        log_path = Path(config['file'])
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_path,
+            maxBytes=int(config.get('max_file_mb', 50)) * 1024 * 1024,
+            backupCount=int(config.get('backup_count', 5)),
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(JobContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # Third-party clients are chatty at INFO on every request
+    for noisy_logger in config.get('quiet_loggers', ['LiteLLM', 'httpx', 'httpcore']):
+        logging.getLogger(noisy_logger).setLevel(max(level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+@atexit.register
+def _stop_listener():
+    """Flush queued records on interpreter exit."""
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,67 @@
+"""Shared Redis connection for cross-process coordination."""
+
+import logging
+import os
+from typing import Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    logging.warning("redis not installed - falling back to in-process coordination")
+
+logger = logging.getLogger(__name__)
+
+# Defaults to the Celery broker so workers and the API share one instance
+REDIS_URL = os.environ.get(
+    'REDIS_URL',
+    os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6380/0')
+)
+
+
+# Global instance
+_redis_client = None
+_redis_checked = False
+
+
+def get_redis_client() -> Optional["redis.Redis"]:
+    """
+    Get or create the global Redis client.
+
+    Returns None when Redis is not installed or not reachable, so callers
+    can fall back to in-memory state on single-node runs.
+    """
+    global _redis_client, _redis_checked
+    if _redis_checked:
+        return _redis_client
+
+    _redis_checked = True
+    if not REDIS_AVAILABLE:
+        return None
+
+    try:
+        client = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        _redis_client = client
+        logger.info(f"Connected to Redis for coordination: {REDIS_URL}")
+    except Exception as e:
+        logger.warning(f"Redis not reachable ({e}), using in-memory fallback")
+        _redis_client = None
+
+    return _redis_client
+
+
+def get_async_redis_client() -> Optional["redis.asyncio.Redis"]:
+    """
+    Create an asyncio Redis client for the running event loop.
+
+    A new client is returned on every call (asyncio connections are bound to
+    their loop); callers should close it with ``await client.aclose()``.
+    Returns None when Redis is unavailable.
+    """
+    if get_redis_client() is None:
+        return None
+
+    import redis.asyncio
+    return redis.asyncio.Redis.from_url(REDIS_URL)
@@ -223,11 +223,21 @@ class ExtractionJob(Base):
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     is_cached_result: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # True if result was reused from cache
 
+    # Scheduling: interactive jobs run immediately, deferred jobs go through provider batch APIs
+    job_class: Mapped[str] = mapped_column(String(20), nullable=False, default="interactive", index=True)  # interactive, deferred
+    batch_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+
     # LLM Usage
     prompt_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     completion_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     total_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     cached_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Cached prompt tokens
+    estimated_prompt_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Pre-flight estimate
+    escalation_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Answers rejected by validation
+    escalation_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Tokens spent on rejected answers
+    continuation_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Extra completions after hitting max_tokens
+    max_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Completion limit a deferred request was sent with
+    message_layout: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)  # prompt_first or document_first
     model_used: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
     # Timing
@@ -345,9 +355,19 @@ class ApiExtractionJob(Base):
     completion_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     total_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     cached_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    estimated_prompt_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Pre-flight estimate
+    escalation_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Answers rejected by validation
+    escalation_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Tokens spent on rejected answers
+    continuation_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Extra completions after hitting max_tokens
+    max_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Completion limit a deferred request was sent with
+    message_layout: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)  # prompt_first or document_first
     model_used: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
     is_cached_result: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
+    # Scheduling
+    job_class: Mapped[str] = mapped_column(String(20), nullable=False, default="interactive", index=True)  # interactive, deferred
+    batch_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+
     # Timing
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
@@ -360,3 +380,64 @@ class ApiExtractionJob(Base):
 
     def __repr__(self):
         return f"<ApiExtractionJob(job_id='{self.job_id}', status='{self.status}', label='{self.request_label}')>"
+
+
+class LlmBatch(Base):
+    """LLM batches table - deferred jobs submitted together to a provider batch API."""
+    __tablename__ = "llm_batches"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    batch_id: Mapped[str] = mapped_column(String(100), unique=True, nullable=False, index=True)
+    provider_name: Mapped[str] = mapped_column(String(100), nullable=False)  # Provider name from llm.yaml
+    backend: Mapped[str] = mapped_column(String(50), nullable=False)  # openai, azure, vertex_ai, local
+    provider_batch_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    status: Mapped[str] = mapped_column(String(32), nullable=False, default="submitted", index=True)  # submitted, completed, failed
+    request_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Timing
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<LlmBatch(batch_id='{self.batch_id}', provider='{self.provider_name}', status='{self.status}')>"
+
+
+class ShadowRun(Base):
+    """Shadow runs table - completed jobs re-run on a candidate model for comparison."""
+    __tablename__ = "shadow_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[int] = mapped_column(Integer, ForeignKey("extraction_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    extractor_id: Mapped[int] = mapped_column(Integer, ForeignKey("extractors.id", ondelete="CASCADE"), nullable=False, index=True)
+    production_model: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)  # model_used of the job
+    candidate_model: Mapped[str] = mapped_column(String(100), nullable=False, index=True)  # Provider name from llm.yaml
+    status: Mapped[str] = mapped_column(String(32), nullable=False, default="completed")  # completed, failed
+
+    # Candidate output and its agreement with the production result (0-1)
+    result_content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    agreement: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Candidate latency, usage and cost (USD, None if the model is not priced)
+    latency_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    prompt_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    completion_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    total_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    cost: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # The production job's figures, for deltas without a join
+    production_latency_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    production_total_tokens: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    production_cost: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    job = relationship("ExtractionJob")
+
+    __table_args__ = (
+        Index("idx_shadow_extractor_candidate", "extractor_id", "candidate_model"),
+    )
+
+    def __repr__(self):
+        return f"<ShadowRun(job_id={self.job_id}, candidate='{self.candidate_model}', status='{self.status}')>"
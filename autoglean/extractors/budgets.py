@@ -0,0 +1,176 @@
+"""Learned max_tokens budgets per extractor.
+
+Static ``max_tokens`` values are either too small (the answer is cut off
+and the job fails as truncated) or much larger than answers ever get. The
+learner reads the completion tokens of each extractor's recent completed
+jobs and sets the budget to a high percentile of them times a safety
+margin, capped by the provider's ``max_output_tokens``. Extractors whose
+recent jobs were truncated get at least ``truncation_growth`` times their
+static budget, since the lost answers do not appear in the distribution.
+
+Learned budgets replace the static ones only with ``apply: true`` (under
+``token_budgets`` in extractors.yaml) and once an extractor has
+``min_samples`` jobs; GET /api/llm/token-budgets shows the recommendations
+either way.
+"""
+
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+
+logger = logging.getLogger(__name__)
+
+
+def get_budget_config() -> Dict[str, Any]:
+    """Get the ``token_budgets`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('token_budgets', {}) or {}
+
+
+def percentile(values: List[int], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class TokenBudgetLearner:
+    """Completion-token distributions per extractor and the budgets derived from them."""
+
+    def __init__(self):
+        self.config = get_budget_config()
+        self.apply = bool(self.config.get('apply', False))
+        self.percentile = float(self.config.get('percentile', 0.99))
+        self.margin = float(self.config.get('margin', 1.25))
+        self.min_samples = int(self.config.get('min_samples', 50))
+        self.min_tokens = int(self.config.get('min_tokens', 256))
+        self.truncation_growth = float(self.config.get('truncation_growth', 1.5))
+        self.window = int(self.config.get('window', 1000))
+        self.window_days = int(self.config.get('window_days', 30))
+        self.refresh_seconds = float(self.config.get('refresh_seconds', 600))
+
+        self._samples: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at = 0.0
+        self._lock = Lock()
+
+    # === History ===
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Completion tokens and truncation counts of recent jobs, per extractor ID."""
+        from autoglean.db.base import SessionLocal
+        from autoglean.db.models import ApiExtractionJob, ExtractionJob, Extractor
+
+        since = datetime.utcnow() - timedelta(days=self.window_days)
+        rows = []
+        db = SessionLocal()
+        try:
+            for model in (ExtractionJob, ApiExtractionJob):
+                rows.extend(db.query(
+                    model.created_at, Extractor.extractor_id, model.status,
+                    model.completion_tokens, model.error_message
+                ).join(Extractor, Extractor.id == model.extractor_id).filter(
+                    model.created_at >= since,
+                    model.is_cached_result == False
+                ).all())
+        finally:
+            db.close()
+
+        # Most recent first, so each extractor keeps its latest `window` samples
+        samples: Dict[str, Dict[str, Any]] = {}
+        for _, extractor_id, status, completion_tokens, error_message in sorted(rows, key=lambda row: row[0], reverse=True):
+            entry = samples.setdefault(extractor_id, {'tokens': [], 'truncated': 0})
+            if status == "completed" and completion_tokens and len(entry['tokens']) < self.window:
+                entry['tokens'].append(completion_tokens)
+            elif status == "failed" and error_message and 'truncated' in error_message:
+                entry['truncated'] += 1
+        return samples
+
+    def _history(self, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            if refresh or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                # Even a failed load waits for the next refresh, so a database
+                # outage does not add a connection attempt to every job
+                self._loaded_at = time.monotonic()
+                try:
+                    self._samples = self._load()
+                except Exception as e:
+                    logger.warning(f"Could not load completion history for token budgets: {e}")
+            return self._samples
+
+    # === Budgets ===
+
+    def recommend(
+        self,
+        extractor_id: str,
+        static_max_tokens: int,
+        max_output_tokens: Optional[int] = None,
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Recommended max_tokens for an extractor.
+
+        Args:
+            extractor_id: ID of the extractor
+            static_max_tokens: The extractor's configured max_tokens
+            max_output_tokens: The provider's output limit, if known
+            refresh: Reload the history from the database first
+
+        Returns:
+            Dictionary with samples, truncated, p50/p95/p99, the static and
+            recommended budgets and whether the recommendation is applied
+        """
+        history = self._history(refresh).get(extractor_id, {'tokens': [], 'truncated': 0})
+        tokens = history['tokens']
+        observed = percentile(tokens, self.percentile)
+
+        recommended = None
+        if len(tokens) >= self.min_samples:
+            recommended = max(self.min_tokens, math.ceil(observed * self.margin))
+            if history['truncated']:
+                recommended = max(recommended, math.ceil(static_max_tokens * self.truncation_growth))
+            if max_output_tokens:
+                recommended = min(recommended, int(max_output_tokens))
+
+        return {
+            'extractor_id': extractor_id,
+            'samples': len(tokens),
+            'truncated': history['truncated'],
+            'p50': percentile(tokens, 0.5),
+            'p95': percentile(tokens, 0.95),
+            'p99': percentile(tokens, 0.99),
+            'max': max(tokens) if tokens else None,
+            'static_max_tokens': static_max_tokens,
+            'recommended_max_tokens': recommended,
+            'applied': self.apply and recommended is not None
+        }
+
+    def max_tokens_for(
+        self,
+        extractor_id: str,
+        extractor_config: Dict[str, Any],
+        max_output_tokens: Optional[int] = None
+    ) -> int:
+        """Budget to send for an extractor: the learned one when applied, else the static one."""
+        static_max_tokens = int(extractor_config.get('max_tokens', 2000))
+        if not self.apply or extractor_config.get('learned_max_tokens') is False:
+            return static_max_tokens
+        recommendation = self.recommend(extractor_id, static_max_tokens, max_output_tokens)
+        return recommendation['recommended_max_tokens'] or static_max_tokens
+
+
+# Global instance
+_token_budget_learner: Optional[TokenBudgetLearner] = None
+
+
+def get_token_budgets() -> TokenBudgetLearner:
+    """Get or create global token budget learner."""
+    global _token_budget_learner
+    if _token_budget_learner is None:
+        _token_budget_learner = TokenBudgetLearner()
+    return _token_budget_learner
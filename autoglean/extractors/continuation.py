@@ -0,0 +1,246 @@
+"""Continuation of answers cut off at max_tokens.
+
+Large coordinate tables can need more output than one completion allows.
+When an answer stops because it hit its limit (``finish_reason`` "length",
+or completion tokens at max_tokens when the provider does not say), the
+extractor sends the conversation back with the partial answer as the
+assistant turn and asks the model to carry on, up to ``max_segments``
+completions in total (``continuation`` in extractors.yaml).
+
+Segments are stitched structurally rather than concatenated blindly:
+
+- The model is asked to restart the incomplete last line, so the partial
+  line of the previous segment is dropped when the new one repeats it;
+  text repeated at the seam is removed otherwise.
+- A markdown table header repeated at the start of a segment is dropped.
+- A segment that restarts the whole answer is merged into it: for JSON the
+  partial document is repaired to its last complete value and the lists
+  of both documents are merged without duplicates; for markdown the lines
+  already present are skipped.
+"""
+
+import json
+import logging
+import re
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+from autoglean.extractors.validation import parse_json_output
+
+logger = logging.getLogger(__name__)
+
+CONTINUE_PROMPT = (
+    "Your answer was cut off because it reached the output limit. Continue it from "
+    "where it stopped: first repeat the last, incomplete line in full, then carry on "
+    "to the end. Do not repeat anything before that line, do not start the answer "
+    "over and do not add any commentary."
+)
+
+_OPENING_FENCE = re.compile(r'^\s*```[\w-]*[ \t]*\n?')
+_TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$')
+
+# Longest text repeated at a seam that is looked for
+_MAX_OVERLAP = 500
+
+# Cut points tried (from the end) when repairing a truncated JSON document
+_MAX_REPAIR_ATTEMPTS = 50
+
+
+def get_continuation_config() -> Dict[str, Any]:
+    """Get the ``continuation`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('continuation', {}) or {}
+
+
+def is_truncated(response: Dict[str, Any], max_tokens: int) -> bool:
+    """Whether a completion stopped because it reached its max_tokens limit."""
+    finish_reason = response.get('finish_reason')
+    if finish_reason is not None:
+        return finish_reason in ('length', 'max_tokens')
+    completion_tokens = (response.get('usage') or {}).get('completion_tokens') or 0
+    return bool(max_tokens) and completion_tokens >= max_tokens - 10
+
+
+# === JSON ===
+
+def repair_json(text: str) -> Any:
+    """
+    Parse a JSON document that may be cut off, keeping its complete values.
+
+    The document is cut after the last complete nested value (or top-level
+    item) that still parses once the open arrays and objects are closed.
+
+    Returns:
+        The parsed document, or None if nothing can be recovered
+    """
+    text = _OPENING_FENCE.sub('', text or '', count=1)
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    if not starts:
+        return None
+    start = min(starts)
+
+    stack: List[str] = []
+    cuts = []
+    in_string = escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                try:
+                    return json.loads(text[start:index + 1])
+                except ValueError:
+                    return None
+            cuts.append((index + 1, ''.join(reversed(stack))))
+        elif char == ',' and len(stack) == 1:
+            # Deeper down a cut would keep a half-written item
+            cuts.append((index, ''.join(reversed(stack))))
+
+    for end, closers in reversed(cuts[-_MAX_REPAIR_ATTEMPTS:]):
+        try:
+            return json.loads(text[start:end] + closers)
+        except ValueError:
+            continue
+    return None
+
+
+def _item_key(item: Any) -> str:
+    return json.dumps(item, sort_keys=True, ensure_ascii=False)
+
+
+def merge_json(first: Any, second: Any) -> Any:
+    """
+    Merge two versions of a JSON answer.
+
+    Lists are concatenated without duplicate items, objects are merged key
+    by key (recursively) and anything else keeps the first value.
+    """
+    if isinstance(first, list) and isinstance(second, list):
+        seen = {_item_key(item) for item in first}
+        return first + [item for item in second if _item_key(item) not in seen]
+    if isinstance(first, dict) and isinstance(second, dict):
+        merged = dict(first)
+        for key, value in second.items():
+            merged[key] = merge_json(merged[key], value) if key in merged else value
+        return merged
+    return first
+
+
+def _restarts_json(accumulated: str, segment: str) -> bool:
+    """Whether a segment starts the JSON answer over instead of continuing it."""
+    first = _OPENING_FENCE.sub('', accumulated, count=1).lstrip()
+    second = _OPENING_FENCE.sub('', segment, count=1).lstrip()
+    if not first or not second or first[0] not in '{[' or first[0] != second[0]:
+        return False
+    first_data, second_data = repair_json(first), repair_json(second)
+    if isinstance(first_data, list) and isinstance(second_data, list):
+        # A continued row of an array of arrays parses as a list of values
+        return bool(first_data and second_data) and type(first_data[0]) is type(second_data[0])
+    # A continued object item has none of the document's top-level keys
+    return (
+        isinstance(first_data, dict) and isinstance(second_data, dict)
+        and bool(set(first_data) & set(second_data))
+    )
+
+
+def _merge_json_segments(accumulated: str, segment: str) -> Optional[str]:
+    first = repair_json(accumulated)
+    try:
+        second = parse_json_output(segment)
+    except ValueError:
+        second = repair_json(segment)
+    if first is None or second is None:
+        return None
+    return json.dumps(merge_json(first, second), ensure_ascii=False, indent=2)
+
+
+# === Text and markdown ===
+
+def _overlap(accumulated: str, segment: str) -> int:
+    """Length of the longest start of the segment that the accumulated text ends with."""
+    for length in range(min(len(segment), len(accumulated), _MAX_OVERLAP), 0, -1):
+        if accumulated.endswith(segment[:length]):
+            return length
+    return 0
+
+
+def _table_headers(text: str) -> set:
+    """Header rows (the line above a separator row) of the markdown tables in a text."""
+    lines = text.split('\n')
+    return {
+        lines[index - 1].strip()
+        for index in range(1, len(lines))
+        if _TABLE_SEPARATOR.match(lines[index]) and lines[index - 1].strip()
+    }
+
+
+def _drop_repeated_header(head: str, segment: str) -> str:
+    lines = segment.lstrip('\n').split('\n')
+    if len(lines) >= 2 and _TABLE_SEPARATOR.match(lines[1]) and lines[0].strip() in _table_headers(head):
+        return '\n'.join(lines[2:])
+    return segment
+
+
+def _merge_restarted_lines(head: str, segment: str) -> str:
+    """Append the lines of a restarted answer that the accumulated text does not have yet."""
+    seen = {line.strip() for line in head.split('\n') if line.strip()}
+    kept = [line for line in segment.split('\n') if not line.strip() or line.strip() not in seen]
+    # Skipped lines leave runs of blank lines behind
+    lines = [line for index, line in enumerate(kept) if line.strip() or (index and kept[index - 1].strip())]
+    return head.rstrip('\n') + '\n' + '\n'.join(lines).lstrip('\n')
+
+
+def _first_line(text: str) -> str:
+    return next((line.strip() for line in text.split('\n') if line.strip()), '')
+
+
+def _join_text(accumulated: str, segment: str) -> str:
+    """Join a continuation to the text so far at the line the model restarted from."""
+    if accumulated.count('```') % 2 == 1:
+        # Still inside the answer's code block: a new opening fence is a repeat
+        segment = _OPENING_FENCE.sub('', segment, count=1)
+
+    cut = accumulated.rfind('\n') + 1
+    head, partial = accumulated[:cut], accumulated[cut:]
+    if _first_line(head) and _first_line(segment) == _first_line(accumulated):
+        return _merge_restarted_lines(head, segment)
+    if not partial.strip() or segment.lstrip().startswith(partial.strip()):
+        # The incomplete line was repeated in full, as asked
+        return head + _drop_repeated_header(head, segment.lstrip('\n'))
+
+    # Continued mid-line: drop whatever the model repeated at the seam
+    return accumulated + segment[_overlap(accumulated, segment):]
+
+
+def stitch(accumulated: str, segment: str, output_format: Optional[str] = None) -> str:
+    """
+    Append a continuation segment to an answer that was cut off.
+
+    Args:
+        accumulated: The answer so far
+        segment: The next completion
+        output_format: The extractor's output_format ('json' enables the
+            structural JSON merge)
+
+    Returns:
+        The stitched answer
+    """
+    if not segment:
+        return accumulated
+    if output_format == 'json' and _restarts_json(accumulated, segment):
+        merged = _merge_json_segments(accumulated, segment)
+        if merged is not None:
+            return merged
+    return _join_text(accumulated, segment)
@@ -1,9 +1,9 @@
 """Document extraction logic with multimodal support."""
 
 import logging
-import time
+import re
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 from PIL import Image
 import io
 
@@ -15,14 +15,131 @@ except ImportError:
     logging.warning("pdf2image not installed - PDF support disabled")
 
 from autoglean.llm.client import get_llm_client
+from autoglean.llm.fallback import annotate_model_used
+from autoglean.llm.payload import ImagePayload, sniff_mime_type
+from autoglean.llm.tokens import get_token_estimator
 from autoglean.core.config import get_config_loader
 from autoglean.core.storage import get_storage_manager
+from autoglean.extractors.transcription import file_digest, get_pipeline_config, get_transcriber
+from autoglean.extractors.budgets import get_token_budgets
+from autoglean.extractors.encoding import PartialDecoder, decode_output, encoded_prompt, encoding_for
+from autoglean.extractors.continuation import CONTINUE_PROMPT, get_continuation_config, is_truncated, stitch
+from autoglean.extractors.layout import get_prefix_scheduler, layout_for
+from autoglean.extractors.local_ocr import get_local_ocr
+from autoglean.extractors.retrieval import select_excerpts
+from autoglean.extractors.routing import RoutingDecision, get_model_router
+from autoglean.extractors.validation import get_escalation_config, validate_output
 
 logger = logging.getLogger(__name__)
 
-# Global rate limiting
-_last_request_time = 0
-_MIN_REQUEST_INTERVAL = 2.0  # 2 seconds between requests
+# Formats sent to providers as-is; anything else is re-encoded
+_PROVIDER_IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/webp'}
+
+SYSTEM_MESSAGE = "You are a helpful assistant that extracts specific information from documents."
+
+# Document-first layout: the extractor prompt follows the document under this line
+INSTRUCTIONS_HEADER = "--- INSTRUCTIONS ---"
+
+# Combined mode: each extractor's answer starts with this line
+SECTION_HEADER = "=== RESULT: {key} ==="
+_SECTION_PATTERN = re.compile(r'^=== RESULT: (\S+) ===[ \t]*$', re.MULTILINE)
+
+
+def build_system_prompt(extractor_prompt: str) -> str:
+    """
+    Build the system message for an extractor.
+
+    The extractor prompt is sent first and is identical for every job, so
+    providers can serve it from their explicit or implicit prefix cache;
+    the document follows in the user message.
+    """
+    return f"{SYSTEM_MESSAGE}\n\n{extractor_prompt}"
+
+
+def build_messages(extractor_prompt: str, document_content: str, layout: str = 'prompt_first') -> List[Dict[str, Any]]:
+    """
+    Build the messages of an extraction request.
+
+    With ``prompt_first`` the extractor prompt is the system message and the
+    document follows. With ``document_first`` (see extractors.layout) the
+    document comes right after a generic system message and the extractor
+    prompt is the last message, so every extractor run on a document sends
+    the same prefix. The client attaches the image to the document message.
+    """
+    if layout == 'document_first':
+        return [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": document_content},
+            {"role": "user", "content": f"{INSTRUCTIONS_HEADER}\n{extractor_prompt}"}
+        ]
+    return [
+        {"role": "system", "content": build_system_prompt(extractor_prompt)},
+        {"role": "user", "content": document_content}
+    ]
+
+
+def build_combined_system_prompt(extractor_prompts: List[str]) -> str:
+    """
+    Build the system message for several extractors answered in one call.
+
+    Each prompt becomes a task with a short key (task1, task2, ...); the
+    model answers every task in its own section under SECTION_HEADER.
+    """
+    tasks = "\n\n".join(
+        f"{SECTION_HEADER.format(key=f'task{index}')}\n{prompt.strip()}"
+        for index, prompt in enumerate(extractor_prompts, start=1)
+    )
+    return (
+        f"{SYSTEM_MESSAGE}\n\n"
+        f"Perform each of the following {len(extractor_prompts)} extraction tasks on the same document. "
+        f"Answer every task, in order, in its own section that starts with the task's header line "
+        f"exactly as given (for example \"{SECTION_HEADER.format(key='task1')}\"), followed by the "
+        f"answer in the format that task asks for. Do not add text outside the sections.\n\n"
+        f"{tasks}"
+    )
+
+
+def split_sections(content: str) -> Dict[str, str]:
+    """Split a combined response into section contents keyed by task key."""
+    sections = {}
+    matches = list(_SECTION_PATTERN.finditer(content or ''))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(content)
+        text = content[match.end():end].strip()
+        if text:
+            sections[match.group(1)] = text
+    return sections
+
+
+def transcript_info(transcript: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Transcript details recorded with a result (without the text).
+
+    Stage 1 usage is reported only by the job that paid for the transcription.
+    """
+    if transcript is None:
+        return None
+    return {
+        'model': transcript.get('model'),
+        'cached': transcript.get('cached', True),
+        'truncated': transcript.get('truncated', False),
+        'confidence': transcript.get('confidence'),
+        'usage': None if transcript.get('cached', True) else transcript.get('usage')
+    }
+
+
+def _apportion(total: Optional[int], weights: List[float]) -> List[Optional[int]]:
+    """Split an integer total by weights (largest remainder), keeping the sum exact."""
+    if total is None:
+        return [None] * len(weights)
+    if not sum(weights):
+        weights = [1.0] * len(weights)
+    shares = [total * weight / sum(weights) for weight in weights]
+    parts = [int(share) for share in shares]
+    remainders = sorted(range(len(shares)), key=lambda i: shares[i] - parts[i], reverse=True)
+    for i in remainders[:total - sum(parts)]:
+        parts[i] += 1
+    return parts
 
 
 class DocumentExtractor:
@@ -32,6 +149,8 @@ class DocumentExtractor:
         self.llm_client = get_llm_client()
         self.config_loader = get_config_loader()
         self.storage_manager = get_storage_manager()
+        text_settings = (self.config_loader.load_app_config().get('processing', {}) or {}).get('text', {}) or {}
+        self.max_text_chars = int(text_settings.get('max_length_chars', 100000))
 
     def get_extractor_config(self, extractor_id: str) -> Dict[str, Any]:
         """Get configuration for a specific extractor."""
@@ -80,15 +199,15 @@ class DocumentExtractor:
         image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.pdf'}
         return Path(file_path).suffix.lower() in image_extensions
 
-    def convert_pdf_to_image(self, pdf_path: Union[str, Path]) -> Union[str, Path]:
+    def convert_pdf_to_image(self, pdf_path: Union[str, Path]) -> Image.Image:
         """
-        Convert first page of PDF to image.
+        Render the first page of a PDF in memory.
 
         Args:
             pdf_path: Path to PDF file
 
         Returns:
-            Path to converted image
+            PIL image of the first page
         """
         if not PDF_SUPPORT:
             raise RuntimeError("pdf2image not installed. Cannot convert PDF to image.")
@@ -98,54 +217,67 @@ class DocumentExtractor:
 
             # Convert first page only
             images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=200)
-
-            # Save as JPEG
-            output_path = Path(pdf_path).parent / f"{Path(pdf_path).stem}_page1.jpg"
-            images[0].save(output_path, 'JPEG', quality=90)
-
-            logger.info(f"PDF converted to: {output_path.name}")
-            return output_path
+            return images[0]
 
         except Exception as e:
             logger.error(f"Failed to convert PDF to image: {e}")
             raise
 
-    def optimize_image(self, image_path: Union[str, Path], max_width: int = 2048) -> Union[str, Path]:
+    def optimize_image(self, img: Image.Image, max_width: int = 2048) -> Image.Image:
         """
-        Optimize image size to reduce token usage.
+        Downscale an image to reduce token usage.
 
         Args:
-            image_path: Path to original image
+            img: Original image
             max_width: Maximum width in pixels (default 2048)
 
         Returns:
-            Path to optimized image (or original if optimization not needed)
+            Resized image (or the original if optimization not needed)
         """
-        try:
-            img = Image.open(image_path)
+        # Check if optimization is needed
+        if img.width <= max_width:
+            logger.debug(f"Image already optimized: {img.width}x{img.height}")
+            return img
 
-            # Check if optimization is needed
-            if img.width <= max_width:
-                logger.debug(f"Image already optimized: {img.width}x{img.height}")
-                return image_path
+        # Calculate new dimensions
+        ratio = max_width / img.width
+        new_height = int(img.height * ratio)
 
-            # Calculate new dimensions
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
+        logger.info(f"Optimized image: {img.width}x{img.height} -> {max_width}x{new_height}")
+        return img.resize((max_width, new_height), Image.Resampling.LANCZOS)
 
-            # Resize
-            img_resized = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+    def prepare_image(self, file_path: Union[str, Path], max_width: int = 2048) -> ImagePayload:
+        """
+        Prepare the image payload sent with a document.
 
-            # Save optimized version
-            optimized_path = Path(image_path).parent / f"{Path(image_path).stem}_optimized{Path(image_path).suffix}"
-            img_resized.save(optimized_path, quality=90, optimize=True)
+        Images that providers accept and that are already small enough are
+        sent byte-for-byte. PDFs, oversized images and other formats are
+        rendered/resized and encoded in memory, without temp files.
 
-            logger.info(f"Optimized image: {img.width}x{img.height} -> {max_width}x{new_height}")
-            return optimized_path
+        Args:
+            file_path: Path to an image or PDF
+            max_width: Maximum width in pixels (default 2048)
 
+        Returns:
+            ImagePayload reused for every attempt of the request
+        """
+        if Path(file_path).suffix.lower() == '.pdf':
+            img = self.convert_pdf_to_image(file_path)
+            return ImagePayload.from_image(self.optimize_image(img, max_width), 'JPEG')
+
+        with open(file_path, 'rb') as f:
+            mime_type = sniff_mime_type(f.read(16))
+
+        try:
+            with Image.open(file_path) as img:
+                if img.width <= max_width and mime_type in _PROVIDER_IMAGE_TYPES:
+                    return ImagePayload.from_path(file_path)
+                img.load()
+                image_format = 'PNG' if mime_type == 'image/png' else 'JPEG'
+                return ImagePayload.from_image(self.optimize_image(img, max_width), image_format)
         except Exception as e:
             logger.warning(f"Failed to optimize image: {e}, using original")
-            return image_path
+            return ImagePayload.from_path(file_path)
 
     def read_text_file(self, file_path: Union[str, Path]) -> str:
         """Read text content from file."""
@@ -157,97 +289,522 @@ class DocumentExtractor:
             with open(file_path, 'r', encoding='latin-1') as f:
                 return f.read()
 
-    def extract(
+    def _stream_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        models: List[str],
+        image: Optional[ImagePayload],
+        on_partial: Callable[[str], None],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Stream a completion, passing each piece of content to on_partial.
+
+        Fails over to the next provider in the chain only while nothing has
+        been streamed yet; after that a failure is final.
+        """
+        for index, provider_name in enumerate(models):
+            emitted = False
+            try:
+                for event in self.llm_client.stream(messages, provider_name, image, **kwargs):
+                    if event['type'] == 'delta':
+                        emitted = True
+                        on_partial(event['content'])
+                    else:
+                        response = event['result']
+                return annotate_model_used(response, models[0], provider_name, hedged=False)
+            except Exception as e:
+                if emitted or index == len(models) - 1:
+                    raise
+                logger.warning(f"Provider {provider_name} failed before streaming: {e}")
+
+    def pipeline_mode(self, extractor_config: Dict[str, Any]) -> str:
+        """An extractor's pipeline for images and PDFs: single, staged or local_ocr."""
+        return extractor_config.get('pipeline') or get_pipeline_config().get('default', 'single')
+
+    def uses_staged_pipeline(self, extractor_config: Dict[str, Any]) -> bool:
+        """Whether an extractor runs on the document's transcript (two-stage pipeline)."""
+        return self.pipeline_mode(extractor_config) == 'staged'
+
+    def _local_text_layer(
+        self,
+        file_path: Union[str, Path],
+        allow_transcribe: bool
+    ) -> Optional[Dict[str, Any]]:
+        """Tesseract text layer of a document if every page is confident, else None."""
+        local_ocr = get_local_ocr()
+        if not local_ocr.available:
+            logger.debug("pytesseract not installed, local OCR fast path disabled")
+            return None
+        try:
+            text_layer = local_ocr.transcribe(file_path) if allow_transcribe else local_ocr.get_cached(file_path)
+        except Exception as e:
+            logger.warning(f"Local OCR failed for {Path(file_path).name}, using the vision model: {e}")
+            return None
+        if text_layer is None or not text_layer['confident']:
+            return None
+        return text_layer
+
+    def _document_input(
+        self,
+        file_path: Union[str, Path],
+        extractor_config: Dict[str, Any],
+        allow_transcribe: bool = True
+    ) -> Dict[str, Any]:
+        """
+        User message content, image and model for a document.
+
+        With the staged pipeline, images and PDFs are replaced by their
+        transcript (transcribed now if allow_transcribe, otherwise only if
+        already stored) and the extractor runs on the text model. With the
+        local_ocr pipeline the same happens with a Tesseract text layer, as
+        long as every page meets the confidence threshold; otherwise the
+        image goes to the extractor's vision model.
+
+        Text files longer than processing.text.max_length_chars (app.yaml)
+        are cut to it, unless the extractor's retrieval query narrows them
+        to their relevant excerpts (see extractors.retrieval).
+
+        Returns:
+            Dictionary with 'content', 'image' (ImagePayload or None),
+            'model', 'transcript' (None unless text replaced the image) and,
+            for text files, 'retrieval' (None unless excerpts were selected)
+        """
+        model = extractor_config.get('llm', 'gemini-flash')
+
+        # Check if file is an image or text
+        if self.is_image_file(file_path):
+            pipeline = self.pipeline_mode(extractor_config)
+            if pipeline == 'local_ocr':
+                text_layer = self._local_text_layer(file_path, allow_transcribe)
+                if text_layer is not None:
+                    pipeline_config = get_pipeline_config()
+                    return {
+                        'content': f"--- DOCUMENT CONTENT (OCR) ---\n{text_layer['text']}",
+                        'image': None,
+                        'model': (
+                            extractor_config.get('text_llm')
+                            or (pipeline_config.get('local_ocr') or {}).get('text_model')
+                            or pipeline_config.get('text_model')
+                            or model
+                        ),
+                        'transcript': text_layer
+                    }
+            elif pipeline == 'staged':
+                transcriber = get_transcriber()
+                if allow_transcribe:
+                    transcript = transcriber.get_or_transcribe(file_path, self.prepare_image)
+                else:
+                    transcript = transcriber.get_cached(file_path)
+                if transcript is not None:
+                    return {
+                        'content': f"--- DOCUMENT CONTENT (transcribed) ---\n{transcript['text']}",
+                        'image': None,
+                        'model': extractor_config.get('text_llm') or get_pipeline_config().get('text_model') or model,
+                        'transcript': transcript
+                    }
+
+            # Rendered/resized in memory and encoded once for all attempts
+            return {
+                'content': "Extract the requested information from the attached document.",
+                'image': self.prepare_image(file_path, max_width=2048),
+                'model': model,
+                'transcript': None
+            }
+
+        # For text files, include content in prompt
+        try:
+            document_text = self.read_text_file(file_path)
+        except Exception as e:
+            logger.error(f"Failed to read text file: {e}")
+            raise
+
+        # Extractors with a retrieval query get only the relevant chunks of long texts
+        excerpts = None
+        if extractor_config.get('retrieval'):
+            excerpts = select_excerpts(document_text, extractor_config['retrieval'])
+        if excerpts is not None:
+            logger.info(
+                f"Sending {len(excerpts['selected'])} of {excerpts['chunks']} chunks of {Path(file_path).name} "
+                f"({excerpts['sent_chars']}/{excerpts['chars']} characters)",
+                extra={'event': 'retrieval', 'file_name': Path(file_path).name, 'chunks': excerpts['chunks'],
+                       'selected': len(excerpts['selected']), 'chars': excerpts['chars'],
+                       'sent_chars': excerpts['sent_chars']}
+            )
+            content = f"--- DOCUMENT CONTENT (relevant excerpts) ---\n{excerpts['text']}"
+        else:
+            if len(document_text) > self.max_text_chars:
+                logger.warning(
+                    f"{Path(file_path).name} has {len(document_text)} characters, "
+                    f"sending the first {self.max_text_chars}"
+                )
+                document_text = document_text[:self.max_text_chars]
+            content = f"--- DOCUMENT CONTENT ---\n{document_text}"
+        return {
+            'content': content,
+            'image': None,
+            'model': model,
+            'transcript': None,
+            'retrieval': {key: value for key, value in excerpts.items() if key != 'text'} if excerpts else None
+        }
+
+    def max_tokens_for(self, extractor_id: str, extractor_config: Dict[str, Any], model: str) -> int:
+        """Completion budget for an extractor on a model (learned or static, see extractors.budgets), capped at its max_output_tokens."""
+        max_output_tokens = self.llm_client.get_model_config(model).get('max_output_tokens')
+        max_tokens = get_token_budgets().max_tokens_for(extractor_id, extractor_config, max_output_tokens)
+        return min(max_tokens, max_output_tokens) if max_output_tokens else max_tokens
+
+    def _route(
         self,
         extractor_id: str,
+        extractor_config: Dict[str, Any],
         file_path: Union[str, Path],
-        job_id: str
+        document: Dict[str, Any]
+    ) -> Optional[RoutingDecision]:
+        """
+        Let the model router pick the model for a document.
+
+        Only applies to extractors with routing enabled, and only while the
+        document goes to the extractor's own llm (not a pipeline text model).
+        """
+        router = get_model_router()
+        if not router.applies_to(extractor_config) or document['model'] != extractor_config.get('llm', 'gemini-flash'):
+            return None
+        text = document['content'] if document['image'] is None else None
+        decision = router.route(extractor_id, extractor_config, file_path, text)
+        document['model'] = decision.model
+        return decision
+
+    def _complete_continuing(
+        self,
+        extractor_id: str,
+        request: Dict[str, Any],
+        response: Dict[str, Any],
+        models: List[str],
+        on_partial: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
         """
-        Extract information from document.
+        Continue an answer cut off at max_tokens until it finishes.
+
+        The partial answer goes back as the assistant turn with a request to
+        carry on; each segment is stitched onto the answer (see
+        extractors.continuation) and its tokens are added to the usage. With
+        on_partial, the segments stream too, so the preview can repeat the
+        line a segment restarts from; the stored result is the stitched one.
+
+        Returns:
+            The response with the stitched content, the summed usage,
+            'continuations' (extra segments made) and 'truncated' (still cut
+            off after max_segments)
+        """
+        extractor_config = request['extractor_config']
+        config = get_continuation_config()
+        enabled = extractor_config.get('continuation', config.get('enabled', False))
+        max_tokens = request['max_tokens']
+        if not enabled or not response.get('content') or not is_truncated(response, max_tokens):
+            return response
+
+        max_segments = int(config.get('max_segments', 4))
+        content = response['content']
+        usage = dict(response.get('usage') or {})
+        segments = 1
+        last = response
+        while is_truncated(last, max_tokens) and segments < max_segments:
+            logger.info(
+                f"Output of {extractor_id} hit max_tokens={max_tokens}, requesting segment {segments + 1}",
+                extra={'event': 'output_continuation', 'extractor_id': extractor_id, 'segment': segments + 1,
+                       'content_length': len(content)}
+            )
+            messages = request['messages'] + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": CONTINUE_PROMPT}
+            ]
+            if on_partial is not None:
+                if isinstance(on_partial, PartialDecoder):
+                    on_partial.new_segment()
+                last = self._stream_completion(
+                    messages=messages,
+                    models=models,
+                    image=request['image'],
+                    on_partial=on_partial,
+                    temperature=request['temperature'],
+                    max_tokens=max_tokens
+                )
+            else:
+                last = self.llm_client.complete_with_fallback(
+                    messages=messages,
+                    models=models,
+                    image=request['image'],
+                    hedge=extractor_config.get('hedge'),
+                    temperature=request['temperature'],
+                    max_tokens=max_tokens
+                )
+            segments += 1
+            for key, value in (last.get('usage') or {}).items():
+                if value is not None:
+                    usage[key] = (usage.get(key) or 0) + value
+            if not last.get('content'):
+                break
+            # Delimited encodings are stitched as text, json_rows as JSON
+            encoding = encoding_for(extractor_config)
+            output_format = 'json' if encoding and encoding['format'] == 'json_rows' else (
+                None if encoding else extractor_config.get('output_format')
+            )
+            content = stitch(content, last['content'], output_format)
+
+        truncated = is_truncated(last, max_tokens)
+        if truncated:
+            logger.warning(f"Output of {extractor_id} still cut off after {segments} segments")
+        return {
+            **response,
+            'content': content,
+            'usage': usage,
+            'finish_reason': last.get('finish_reason'),
+            'continuations': segments - 1,
+            'truncated': truncated
+        }
+
+    def continue_response(
+        self,
+        extractor_id: str,
+        file_path: Union[str, Path],
+        response: Dict[str, Any],
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        Continue a response cut off at max_tokens that was obtained outside extract().
+
+        Used for provider batch results: the request is rebuilt from the
+        document (stored transcripts are used, no OCR call is made) and the
+        further segments are requested interactively, on the extractor's
+        model and its fallback chain.
 
         Args:
-            extractor_id: ID of the extractor to use
+            extractor_id: ID of the extractor used
             file_path: Path to the document file
-            job_id: Unique job identifier
+            response: The response to continue
+            max_tokens: Completion limit the response was requested with
 
         Returns:
-            Dictionary with extraction results
+            The response, continued and stitched if it was cut off
         """
-        # Get extractor configuration
-        extractor_config = self.get_extractor_config(extractor_id)
-
-        # Build messages for LLM
-        system_message = "You are a helpful assistant that extracts specific information from documents."
-        user_prompt = extractor_config['prompt']
+        if not response.get('content') or not is_truncated(response, max_tokens):
+            return response
+        request = self.build_request(extractor_id, file_path, allow_transcribe=False)
+        request['max_tokens'] = max_tokens
+        models = self.llm_client.get_fallback_chain(request['model'], extractor_id)
+        return self._complete_continuing(extractor_id, request, response, models)
 
-        # Check if file is an image or text
-        is_image = self.is_image_file(file_path)
+    def escalation_ladder(self, extractor_config: Dict[str, Any], request: Dict[str, Any]) -> List[str]:
+        """
+        Models an extractor's answer escalates through, from the one to try first.
 
-        if is_image:
-            # Convert PDF to image if needed
-            if Path(file_path).suffix.lower() == '.pdf':
-                image_path = self.convert_pdf_to_image(file_path)
-            else:
-                image_path = file_path
+        JSON extractors escalate when escalation is enabled (others with
+        "escalation: true"). The extractor's own llm tops the default ladder,
+        so an answer is never from a stronger (and dearer) model than
+        configured; an extractor whose llm is not on the default ladder (a
+        local model, say) does not escalate. An extractor's own ladder is
+        used as given, with its llm added on top if missing. Empty when the
+        extractor does not escalate or runs on a pipeline text model.
+        """
+        setting = extractor_config.get('escalation')
+        config = get_escalation_config()
+        if setting is False or (isinstance(setting, dict) and not setting.get('enabled', True)):
+            return []
+        if not setting and not (config.get('enabled', False) and extractor_config.get('output_format') == 'json'):
+            return []
 
-            # For images, use multimodal
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_prompt}
-            ]
+        own_ladder = setting.get('ladder') if isinstance(setting, dict) else None
+        ladder = list(own_ladder or config.get('ladder') or [])
+        floor = extractor_config.get('llm', 'gemini-flash')
+        if own_ladder:
+            if floor not in ladder:
+                ladder.append(floor)
+        elif floor in ladder:
+            ladder = ladder[:ladder.index(floor) + 1]
         else:
-            # For text files, include content in prompt
+            return []
+        if request['model'] not in ladder:
+            return []
+
+        # A routed document starts at its routed tier, anything else at the bottom
+        start = ladder.index(request['model']) if request['routing'] else 0
+        return ladder[start:]
+
+    def _complete_escalating(
+        self,
+        extractor_id: str,
+        request: Dict[str, Any],
+        ladder: List[str],
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Call each model of the ladder until an answer passes validation.
+
+        Models below the top are called alone (a failure is an escalation,
+        not a failover); the top one gets its full fallback chain, and its
+        answer is kept even if it does not validate. Only the top one
+        streams to on_partial, since its answer is final either way. Each
+        model gets its own completion budget (see max_tokens_for).
+
+        Returns:
+            The accepted response, with 'escalations' (model, problems and
+            token usage of every rejected attempt), 'validation_problems'
+            and 'max_tokens' (the accepted model's completion budget)
+        """
+        extractor_config = request['extractor_config']
+        escalations = []
+        for rung, model in enumerate(ladder):
+            last = rung == len(ladder) - 1
+            models = self.llm_client.get_fallback_chain(model, extractor_id) if last else [model]
+            stream_to = on_partial if last else None
+            request = {**request, 'max_tokens': self.max_tokens_for(extractor_id, extractor_config, model)}
             try:
-                document_text = self.read_text_file(file_path)
-                full_prompt = f"{user_prompt}\n\n--- DOCUMENT CONTENT ---\n{document_text}"
-                messages = [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": full_prompt}
-                ]
-                image_path = None
+                if stream_to is not None:
+                    response = self._stream_completion(
+                        messages=request['messages'],
+                        models=models,
+                        image=request['image'],
+                        on_partial=stream_to,
+                        temperature=request['temperature'],
+                        max_tokens=request['max_tokens'],
+                        fitted=request['fitted']
+                    )
+                else:
+                    response = self.llm_client.complete_with_fallback(
+                        messages=request['messages'],
+                        models=models,
+                        image=request['image'],
+                        hedge=extractor_config.get('hedge'),
+                        temperature=request['temperature'],
+                        max_tokens=request['max_tokens'],
+                        fitted=request['fitted']
+                    )
+                response = self._complete_continuing(extractor_id, request, response, models, stream_to)
+                problems = validate_output(
+                    decode_output(response.get('content'), extractor_config),
+                    extractor_config.get('validation')
+                )
             except Exception as e:
-                logger.error(f"Failed to read text file: {e}")
-                raise
+                if last:
+                    raise
+                response, problems = {}, [f"{type(e).__name__}: {e}"]
 
-        # Get LLM model from config
-        model = extractor_config.get('llm', 'gemini-flash')
-        temperature = extractor_config.get('temperature', 0.7)
-        max_tokens = extractor_config.get('max_tokens', 2000)
-
-        # Optimize image if provided
-        if image_path:
-            image_path = self.optimize_image(image_path, max_width=2048)
-
-        # Rate limiting: wait if needed
-        global _last_request_time
-        current_time = time.time()
-        time_since_last = current_time - _last_request_time
-        if time_since_last < _MIN_REQUEST_INTERVAL:
-            wait_time = _MIN_REQUEST_INTERVAL - time_since_last
-            logger.info(f"Rate limiting: waiting {wait_time:.1f}s before next request")
-            time.sleep(wait_time)
-
-        # Call LLM
-        logger.info(f"Extracting with {extractor_id} from {Path(file_path).name}")
-        response = self.llm_client.complete(
-            messages=messages,
-            model=model,
-            image_path=image_path,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+            if not problems or last:
+                break
 
-        # Update last request time
-        _last_request_time = time.time()
+            usage = response.get('usage') or {}
+            escalation = {
+                'model': model,
+                'problems': problems,
+                'prompt_tokens': usage.get('prompt_tokens') or 0,
+                'completion_tokens': usage.get('completion_tokens') or 0,
+                'total_tokens': usage.get('total_tokens') or 0
+            }
+            escalations.append(escalation)
+            logger.info(
+                f"Escalating {extractor_id} from {model} to {ladder[rung + 1]}: {problems[0]}",
+                extra={'event': 'model_escalation', 'extractor_id': extractor_id, 'to_model': ladder[rung + 1], **escalation}
+            )
 
-        # Extract markdown content
-        markdown_content = response.get('content')
+        if problems:
+            logger.warning(f"Output of {extractor_id} from {ladder[-1]} still fails validation: {problems[0]}")
+        response['escalations'] = escalations
+        response['validation_problems'] = problems
+        response['max_tokens'] = request['max_tokens']
+        return response
+
+    def build_request(
+        self,
+        extractor_id: str,
+        file_path: Union[str, Path],
+        allow_transcribe: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Build the LLM request for a document without sending it.
+
+        Args:
+            extractor_id: ID of the extractor to use
+            file_path: Path to the document file
+            allow_transcribe: For staged extractors, transcribe the document
+                now if it has no stored transcript (otherwise the image is sent)
+
+        Returns:
+            Dictionary with messages, image (ImagePayload or None),
+            estimated_prompt_tokens, fitted (the FittedInput, passed on to the
+            client so it does not fit again), model, temperature, max_tokens, the
+            extractor config, the transcript used (None unless staged), the
+            routing decision (None unless routed), the retrieval summary
+            (None unless excerpts were sent), the message layout and the
+            document's digest (None unless laid out document first)
+
+        Raises:
+            InputTooLargeError: If the document cannot fit the model's input limit
+        """
+        # Get extractor configuration
+        extractor_config = self.get_extractor_config(extractor_id)
+
+        # Build messages for LLM: stable extractor prompt first, or the
+        # document first so that extractors share its prefix
+        layout = layout_for(extractor_config)
+        document = self._document_input(file_path, extractor_config, allow_transcribe)
+        routing = self._route(extractor_id, extractor_config, file_path, document)
+        messages = build_messages(encoded_prompt(extractor_config), document['content'], layout)
+
+        # Pre-flight: fit the input to the primary provider (downscale/trim)
+        # or reject it before any tokens are paid for
+        model = document['model']
+        fitted = self.llm_client.fit_input(messages, model, document['image'])
+
+        return {
+            'messages': fitted.messages,
+            'image': fitted.image,
+            'estimated_prompt_tokens': fitted.estimated_tokens,
+            'fitted': fitted,
+            'model': model,
+            'temperature': extractor_config.get('temperature', 0.7),
+            'max_tokens': self.max_tokens_for(extractor_id, extractor_config, model),
+            'extractor_config': extractor_config,
+            'transcript': document['transcript'],
+            'routing': routing,
+            'retrieval': document.get('retrieval'),
+            'layout': layout,
+            # Excerpts differ per extractor, so they share no document prefix
+            'document_digest': (
+                file_digest(file_path) if layout == 'document_first' and not document.get('retrieval') else None
+            )
+        }
+
+    def finalize_result(
+        self,
+        extractor_id: str,
+        file_path: Union[str, Path],
+        job_id: str,
+        response: Dict[str, Any],
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        Validate an LLM response and save it as the job's result.
+
+        Args:
+            extractor_id: ID of the extractor used
+            file_path: Path to the document file
+            job_id: Unique job identifier
+            response: Parsed LLM response (content, usage, model)
+            max_tokens: Completion limit the request was sent with
+
+        Returns:
+            Dictionary with extraction results
+        """
+        # Extract markdown content, expanded from the compact encoding if the
+        # extractor asks for one (see extractors.encoding)
+        extractor_config = self.get_extractor_config(extractor_id)
+        markdown_content = decode_output(response.get('content'), extractor_config)
+        encoding = encoding_for(extractor_config)
 
         if not markdown_content:
             # Check if response was truncated (max_tokens reached)
-            usage = response.get('usage', {})
-            if usage.get('completion_tokens', 0) >= max_tokens - 10:
+            if is_truncated(response, max_tokens):
                 error_msg = f"LLM response truncated (hit max_tokens={max_tokens}). Try increasing max_tokens in extractor config."
                 logger.error(error_msg)
                 raise ValueError(error_msg)
@@ -272,9 +829,246 @@ class DocumentExtractor:
             'result_content': markdown_content,
             'result_path': str(result_path),
             'usage': response['usage'],
-            'model': response['model']
+            'estimated_prompt_tokens': response.get('estimated_prompt_tokens'),
+            'model': response['model'],
+            'transcript': response.get('transcript'),
+            'routing': response.get('routing'),
+            'escalations': response.get('escalations', []),
+            'validation_problems': response.get('validation_problems'),
+            'continuations': response.get('continuations', 0),
+            'message_layout': response.get('layout'),
+            'output_encoding': encoding['format'] if encoding else None,
+            'retrieval': response.get('retrieval'),
+            'cache_hit': response.get('cache_hit', False)
         }
 
+    def extract(
+        self,
+        extractor_id: str,
+        file_path: Union[str, Path],
+        job_id: str,
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract information from document.
+
+        Args:
+            extractor_id: ID of the extractor to use
+            file_path: Path to the document file
+            job_id: Unique job identifier
+            on_partial: Optional callback receiving content as it streams in
+                (streaming skips hedging; escalating extractors do not stream)
+
+        Returns:
+            Dictionary with extraction results
+        """
+        request = self.build_request(extractor_id, file_path)
+        extractor_config = request['extractor_config']
+        max_tokens = request['max_tokens']
+
+        # Compact encodings are previewed in the output format, like the stored result
+        if on_partial is not None:
+            on_partial = PartialDecoder(extractor_config, on_partial)
+
+        # Call LLM (provider rate limits are enforced by the client),
+        # failing over along the configured provider chain
+        models = self.llm_client.get_fallback_chain(request['model'], extractor_id)
+        logger.info(f"Extracting with {extractor_id} from {Path(file_path).name}")
+        routing = request['routing']
+        ladder = self.escalation_ladder(extractor_config, request)
+
+        # Document-first requests line up behind the first one for the same
+        # document, which puts the shared prefix in the provider's cache
+        prefix = (ladder[0] if ladder else request['model'], request['document_digest'])
+        turn = get_prefix_scheduler().wait_turn(*prefix) if request['document_digest'] else None
+        try:
+            if ladder:
+                # Rejected answers must not reach the client, so only the top rung streams
+                response = self._complete_escalating(extractor_id, request, ladder, on_partial)
+                max_tokens = response.pop('max_tokens')
+            elif on_partial is not None:
+                response = self._stream_completion(
+                    messages=request['messages'],
+                    models=models,
+                    image=request['image'],
+                    on_partial=on_partial,
+                    temperature=request['temperature'],
+                    max_tokens=max_tokens,
+                    fitted=request['fitted']
+                )
+            else:
+                response = self.llm_client.complete_with_fallback(
+                    messages=request['messages'],
+                    models=models,
+                    image=request['image'],
+                    hedge=extractor_config.get('hedge'),
+                    temperature=request['temperature'],
+                    max_tokens=max_tokens,
+                    fitted=request['fitted']
+                )
+            if not ladder:
+                response = self._complete_continuing(extractor_id, request, response, models, on_partial)
+        except Exception:
+            if turn is not None:
+                get_prefix_scheduler().release(*prefix)
+            if routing:
+                get_model_router().record_outcome(extractor_id, routing.model, success=False)
+            raise
+
+        if on_partial is not None:
+            on_partial.flush()
+
+        if turn is not None:
+            get_prefix_scheduler().mark_warm(*prefix)
+            usage = response.get('usage') or {}
+            logger.info(
+                f"Document-first request for {extractor_id} ({turn}): "
+                f"{usage.get('cached_tokens') or 0}/{usage.get('prompt_tokens') or 0} prompt tokens cached",
+                extra={'event': 'prefix_cache', 'extractor_id': extractor_id, 'model': prefix[0], 'turn': turn,
+                       'cached_tokens': usage.get('cached_tokens'), 'prompt_tokens': usage.get('prompt_tokens')}
+            )
+
+        try:
+            response['transcript'] = transcript_info(request['transcript'])
+            response['routing'] = routing.as_dict() if routing else None
+            response['retrieval'] = request['retrieval']
+            response['layout'] = request['layout']
+            result = self.finalize_result(extractor_id, file_path, job_id, response, max_tokens)
+        except Exception:
+            if routing:
+                get_model_router().record_outcome(extractor_id, routing.model, success=False)
+            raise
+
+        if routing:
+            # Only a complete answer from the routed model itself counts for it: one
+            # served by a fallback or hedged provider, escalated, still cut off
+            # after continuation or failing validation counts against it
+            success = (
+                ' [' not in result['model']
+                and not result['escalations']
+                and not result.get('validation_problems')
+                and not is_truncated(response, max_tokens)
+            )
+            get_model_router().record_outcome(extractor_id, routing.model, success=success)
+        return result
+
+    def extract_combined(
+        self,
+        extractor_ids: List[str],
+        file_path: Union[str, Path],
+        job_ids: List[str]
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+        """
+        Run several extractors on one document in a single LLM call.
+
+        The document (and its image tokens) is sent once, with every
+        extractor prompt as a delimited task. The response is split back
+        into one result per extractor, saved under that extractor's job ID,
+        and the call's token usage is apportioned between them: prompt
+        tokens by each extractor's own prompt plus an equal share of the
+        document, completion tokens by the length of each section.
+        Extractors whose section is missing (or cut off by max_tokens) are
+        re-run on their own.
+
+        The call uses the first extractor's model (and pipeline and routing),
+        the lowest temperature and the sum of the max_tokens of all extractors.
+        Text documents are not narrowed by retrieval queries.
+
+        Args:
+            extractor_ids: IDs of the extractors to run
+            file_path: Path to the document file
+            job_ids: Job ID for each extractor, in the same order
+
+        Returns:
+            (results, errors): result dictionaries and exceptions, keyed by job ID
+        """
+        if len(extractor_ids) != len(job_ids):
+            raise ValueError("One job ID is required per extractor")
+
+        configs = [self.get_extractor_config(extractor_id) for extractor_id in extractor_ids]
+        # Every extractor answers from the same text, so none narrows it
+        document = self._document_input(file_path, {**configs[0], 'retrieval': None})
+        routing = self._route(extractor_ids[0], configs[0], file_path, document)
+        model = document['model']
+        temperature = min(config.get('temperature', 0.7) for config in configs)
+        budgets = [
+            self.max_tokens_for(extractor_id, config, model)
+            for extractor_id, config in zip(extractor_ids, configs)
+        ]
+        max_tokens = sum(budgets)
+        max_output_tokens = self.llm_client.get_model_config(model).get('max_output_tokens')
+        if max_output_tokens:
+            max_tokens = min(max_tokens, int(max_output_tokens))
+
+        messages = [
+            {"role": "system", "content": build_combined_system_prompt([encoded_prompt(config) for config in configs])},
+            {"role": "user", "content": document['content']}
+        ]
+        fitted = self.llm_client.fit_input(messages, model, document['image'])
+
+        logger.info(f"Extracting with {len(extractor_ids)} extractors in one call from {Path(file_path).name}")
+        response = self.llm_client.complete_with_fallback(
+            messages=fitted.messages,
+            models=self.llm_client.get_fallback_chain(model, extractor_ids[0]),
+            image=fitted.image,
+            hedge=configs[0].get('hedge'),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            fitted=fitted
+        )
+
+        sections = split_sections(response.get('content'))
+        keys = [f"task{index}" for index in range(1, len(extractor_ids) + 1)]
+        usage = response.get('usage') or {}
+        if is_truncated(response, max_tokens):
+            # Truncated: the last section present may be incomplete
+            present = [key for key in keys if key in sections]
+            if present:
+                sections.pop(present[-1])
+
+        # Apportion usage: own prompt plus an equal share of the rest; output by section length
+        estimator = get_token_estimator()
+        own_prompt = [estimator.text_tokens(model, len(encoded_prompt(config))) for config in configs]
+        shared_prompt = max(0, (usage.get('prompt_tokens') or 0) - sum(own_prompt))
+        prompt_weights = [own + shared_prompt / len(configs) for own in own_prompt]
+        output_weights = [len(sections.get(key, '')) for key in keys]
+        prompt_tokens = _apportion(usage.get('prompt_tokens'), prompt_weights)
+        cached_tokens = _apportion(usage.get('cached_tokens'), prompt_weights)
+        estimated_tokens = _apportion(response.get('estimated_prompt_tokens'), prompt_weights)
+        completion_tokens = _apportion(usage.get('completion_tokens'), output_weights)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, Exception] = {}
+        for index, (extractor_id, job_id, key) in enumerate(zip(extractor_ids, job_ids, keys)):
+            try:
+                if key not in sections:
+                    logger.warning(f"Combined response has no section for {extractor_id}, extracting it separately")
+                    results[job_id] = self.extract(extractor_id, file_path, job_id)
+                    continue
+
+                part = {
+                    'content': sections[key],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens[index],
+                        'completion_tokens': completion_tokens[index],
+                        'total_tokens': (prompt_tokens[index] or 0) + (completion_tokens[index] or 0),
+                        'cached_tokens': cached_tokens[index]
+                    },
+                    'estimated_prompt_tokens': estimated_tokens[index],
+                    'model': response['model'],
+                    'cache_hit': response.get('cache_hit', False),
+                    'transcript': transcript_info(document['transcript']),
+                    'routing': routing.as_dict() if routing else None
+                }
+                results[job_id] = self.finalize_result(
+                    extractor_id, file_path, job_id, part, budgets[index]
+                )
+            except Exception as e:
+                logger.error(f"Combined extraction failed for {extractor_id}: {e}")
+                errors[job_id] = e
+
+        return results, errors
+
 
 # Global instance
 _document_extractor: Optional[DocumentExtractor] = None
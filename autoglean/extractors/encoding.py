@@ -0,0 +1,369 @@
+"""Compact output encodings, expanded to the extractor's output format.
+
+Pretty-printed JSON repeats every key on every item, and markdown tables
+pad every cell; for long tables most output tokens (and most of the wall
+time) go to that. An extractor with an ``output_encoding`` block asks the
+model for a compact form instead, and the answer is expanded server-side
+to its ``output_format`` before it is validated and saved::
+
+    output_encoding:
+      format: tsv                 # tsv, csv or json_rows
+      columns: [point, latitude, longitude]
+      key: coordinates            # JSON output: {"coordinates": [...]} (a bare list without)
+
+Formats:
+
+- ``tsv`` / ``csv``: a header line, then one line per item.
+- ``json_rows``: ``{"columns": [...], "rows": [[...], ...]}``, keys sent once.
+
+JSON output becomes one object per row (empty fields left out), markdown
+output a table. A header line is recognised even when the model shortens
+or rewords the column names. An answer that ignored the encoding and is
+already in the output format is kept as it is.
+
+Streamed partial results are expanded line by line as well (see
+``PartialDecoder``), so the live preview has the stored result's format;
+json_rows answers are previewed as they are sent.
+"""
+
+import csv
+import io
+import json
+import logging
+import re
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ('tsv', 'csv', 'json_rows')
+
+_FENCE_PATTERN = re.compile(r'^\s*```[\w-]*[ \t]*\n(.*?)\n?```\s*$', re.DOTALL)
+
+_INSTRUCTIONS = {
+    'tsv': (
+        "OUTPUT ENCODING (this replaces the output format described above): answer with "
+        "tab-separated values. The first line is exactly this header:\n{header}\n"
+        "Then write one line per item with the fields in that order, separated by single tab "
+        "characters. Leave a field empty when it is unknown. Do not use code fences and do "
+        "not add any other text."
+    ),
+    'csv': (
+        "OUTPUT ENCODING (this replaces the output format described above): answer with "
+        "comma-separated values. The first line is exactly this header:\n{header}\n"
+        "Then write one line per item with the fields in that order. Quote a field with "
+        "double quotes when it contains a comma, a quote or a line break. Leave a field empty "
+        "when it is unknown. Do not use code fences and do not add any other text."
+    ),
+    'json_rows': (
+        "OUTPUT ENCODING (this replaces the output format described above): answer with one "
+        "compact JSON object of the form {{\"columns\": {columns}, \"rows\": [[...], ...]}}, "
+        "with one array per item holding the values in column order (null when unknown). "
+        "Do not repeat the column names in the rows, do not indent and do not use code fences."
+    )
+}
+
+
+def get_encoding_config() -> Dict[str, Any]:
+    """Get the ``output_encoding`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('output_encoding', {}) or {}
+
+
+def encoding_for(extractor_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """An extractor's output encoding, or None when it answers in its output format directly."""
+    encoding = extractor_config.get('output_encoding')
+    if not encoding or not get_encoding_config().get('enabled', True):
+        return None
+    if encoding.get('format') not in ENCODINGS or not encoding.get('columns'):
+        logger.warning(f"Ignoring invalid output_encoding {encoding!r}")
+        return None
+    return encoding
+
+
+def encoded_prompt(extractor_config: Dict[str, Any]) -> str:
+    """The extractor prompt, with the encoding instructions appended when it has an encoding."""
+    prompt = extractor_config['prompt']
+    encoding = encoding_for(extractor_config)
+    if encoding is None:
+        return prompt
+
+    columns = [str(column) for column in encoding['columns']]
+    if encoding['format'] == 'json_rows':
+        instructions = _INSTRUCTIONS['json_rows'].format(columns=json.dumps(columns, ensure_ascii=False))
+    else:
+        delimiter = '\t' if encoding['format'] == 'tsv' else ','
+        instructions = _INSTRUCTIONS[encoding['format']].format(header=delimiter.join(columns))
+    return f"{prompt.rstrip()}\n\n{instructions}"
+
+
+# === Decoding ===
+
+def _strip_fence(text: str) -> str:
+    fenced = _FENCE_PATTERN.match(text)
+    return fenced.group(1) if fenced else text
+
+
+def _numeric_columns(extractor_config: Dict[str, Any]) -> List[str]:
+    """Columns holding numbers (the encoding's ``numeric``, else the validation block's)."""
+    encoding = extractor_config.get('output_encoding') or {}
+    items = ((extractor_config.get('validation') or {}).get('items') or {})
+    return [str(column) for column in encoding.get('numeric') or items.get('numeric') or []]
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text.replace(',', ''))
+        return True
+    except ValueError:
+        return False
+
+
+def _name_key(text: str) -> str:
+    return re.sub(r'[\W_]+', '', text.lower())
+
+
+def _names_match(cell: str, column: str) -> bool:
+    """Whether a header cell names a column: same, abbreviated (Lat) or reworded slightly."""
+    cell, column = _name_key(cell), _name_key(column)
+    if not cell or not column:
+        return False
+    if cell == column:
+        return True
+    if min(len(cell), len(column)) >= 3 and (cell.startswith(column) or column.startswith(cell)):
+        return True
+    return SequenceMatcher(None, cell, column).ratio() >= 0.75
+
+
+def _is_header(cells: List[str], columns: List[str], numeric: List[str], next_row: Optional[List[str]] = None) -> bool:
+    """
+    Whether a row is a header line rather than data.
+
+    A row with one cell per column is a header when most cells name their
+    column, or when it has labels in the numeric columns and the row after
+    it has numbers there.
+    """
+    if len(cells) != len(columns):
+        return False
+    if sum(_names_match(cell, column) for cell, column in zip(cells, columns)) * 2 > len(columns):
+        return True
+
+    positions = [position for position, column in enumerate(columns) if column in numeric]
+    if not positions or not next_row:
+        return False
+    return (
+        all(cells[position] and not _is_number(cells[position]) for position in positions)
+        and any(position < len(next_row) and _is_number(next_row[position]) for position in positions)
+    )
+
+
+def _split_line(line: str, delimiter: str) -> List[str]:
+    # Quotes in TSV cells are literal text
+    row = next(csv.reader([line], delimiter=delimiter,
+                          quoting=csv.QUOTE_NONE if delimiter == '\t' else csv.QUOTE_MINIMAL), [])
+    return [cell.strip() for cell in row]
+
+
+def _parse_delimited(text: str, delimiter: str, columns: List[str], numeric: List[str]) -> Optional[List[List[str]]]:
+    """Rows of a TSV/CSV answer (header dropped), or None if it is not in that form."""
+    # Quotes in TSV cells are literal text
+    rows = [
+        [cell.strip() for cell in row]
+        for row in csv.reader(
+            io.StringIO(text.strip()),
+            delimiter=delimiter,
+            quoting=csv.QUOTE_NONE if delimiter == '\t' else csv.QUOTE_MINIMAL
+        )
+        if any(cell.strip() for cell in row)
+    ]
+    if not rows:
+        return None
+
+    if _is_header(rows[0], columns, numeric, rows[1] if len(rows) > 1 else None):
+        rows = rows[1:]
+    elif len(rows[0]) == 1 and len(columns) > 1:
+        # A single field per line: the answer is not delimited at all
+        return None
+    return rows
+
+
+def _parse_json_rows(text: str, columns: List[str]) -> Optional[List[List[Any]]]:
+    """Rows of a json_rows answer, reordered to the configured columns, or None."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('rows'), list):
+        return None
+
+    sent_columns = data.get('columns') or columns
+    rows = []
+    for row in data['rows']:
+        if not isinstance(row, list):
+            return None
+        values = dict(zip(sent_columns, row))
+        rows.append([values.get(column) for column in columns])
+    return rows
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _markdown_cell(value: Any) -> str:
+    text = '' if _is_empty(value) else str(value)
+    return text.replace('|', '\\|').replace('\n', ' ')
+
+
+def _markdown_header(columns: List[str]) -> List[str]:
+    return [
+        '| ' + ' | '.join(_markdown_cell(column) for column in columns) + ' |',
+        '|' + '|'.join('---' for _ in columns) + '|'
+    ]
+
+
+def _markdown_row(columns: List[str], row: List[Any]) -> str:
+    cells = (list(row) + [None] * len(columns))[:len(columns)]
+    return '| ' + ' | '.join(_markdown_cell(cell) for cell in cells) + ' |'
+
+
+def _json_item(columns: List[str], row: List[Any]) -> Dict[str, Any]:
+    return {column: value for column, value in zip(columns, row) if not _is_empty(value)}
+
+
+def _to_markdown(columns: List[str], rows: List[List[Any]]) -> str:
+    return '\n'.join(_markdown_header(columns) + [_markdown_row(columns, row) for row in rows])
+
+
+def _to_json(columns: List[str], rows: List[List[Any]], key: Optional[str]) -> str:
+    items = [_json_item(columns, row) for row in rows]
+    return json.dumps({key: items} if key else items, ensure_ascii=False, indent=2)
+
+
+def decode_output(content: Optional[str], extractor_config: Dict[str, Any]) -> Optional[str]:
+    """
+    Expand a compact answer into the extractor's output format.
+
+    Args:
+        content: The model's answer
+        extractor_config: The extractor's configuration
+
+    Returns:
+        The answer as JSON or a markdown table; unchanged when the extractor
+        has no encoding or the answer is not in the encoded form
+    """
+    encoding = encoding_for(extractor_config)
+    if encoding is None or not content:
+        return content
+
+    columns = [str(column) for column in encoding['columns']]
+    text = _strip_fence(content.strip())
+    if encoding['format'] == 'json_rows':
+        rows = _parse_json_rows(text, columns)
+    elif text.lstrip().startswith(('{', '[', '|')):
+        # Answered in the output format (JSON or a markdown table) after all
+        rows = None
+    else:
+        delimiter = '\t' if encoding['format'] == 'tsv' else ','
+        rows = _parse_delimited(text, delimiter, columns, _numeric_columns(extractor_config))
+
+    if rows is None:
+        logger.warning(f"Answer is not in the {encoding['format']} encoding, keeping it as it is")
+        return content
+
+    if extractor_config.get('output_format') == 'json':
+        return _to_json(columns, rows, encoding.get('key'))
+    return _to_markdown(columns, rows)
+
+
+# === Streaming ===
+
+class PartialDecoder:
+    """
+    Expand a streamed TSV/CSV answer line by line for the live preview.
+
+    Wraps an on_partial callback: complete lines are emitted as markdown
+    table rows or JSON items, header lines are dropped, and the incomplete
+    last line is held back. Answers in another form (and json_rows) are
+    passed through unchanged. Continuation segments restart the line they
+    were cut off in, so ``new_segment`` discards the held-back line.
+    """
+
+    def __init__(self, extractor_config: Dict[str, Any], on_partial: Callable[[str], None]):
+        self.on_partial = on_partial
+        encoding = encoding_for(extractor_config)
+        self.enabled = encoding is not None and encoding['format'] in ('tsv', 'csv')
+        if self.enabled:
+            self.columns = [str(column) for column in encoding['columns']]
+            self.delimiter = '\t' if encoding['format'] == 'tsv' else ','
+            self.json_output = extractor_config.get('output_format') == 'json'
+            self.key = encoding.get('key')
+        self.passthrough = not self.enabled
+        self.buffer = ''
+        self.started = False
+        self.rows = 0
+
+    def __call__(self, delta: str):
+        """Take a piece of streamed content."""
+        if self.passthrough:
+            self.on_partial(delta)
+            return
+        self.buffer += delta
+        if not self.started and self.buffer.lstrip().startswith(('{', '[', '|')):
+            # Answered in the output format after all
+            self.passthrough = True
+        while '\n' in self.buffer and not self.passthrough:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self._emit_line(line)
+        if self.passthrough and self.buffer:
+            self.on_partial(self.buffer)
+            self.buffer = ''
+
+    def new_segment(self):
+        """A continuation segment starts: it repeats the line the last one was cut off in."""
+        if not self.passthrough:
+            self.buffer = ''
+
+    def flush(self):
+        """Emit the last line and close the JSON document once the answer is complete."""
+        if self.passthrough:
+            return
+        if self.buffer.strip():
+            self._emit_line(self.buffer)
+        self.buffer = ''
+        if self.json_output and self.started:
+            self.on_partial('\n  ]\n}' if self.key else '\n]')
+
+    def _start(self):
+        if self.started:
+            return
+        self.started = True
+        if self.json_output:
+            self.on_partial(f"{{\n  {json.dumps(self.key)}: [\n" if self.key else '[\n')
+        else:
+            self.on_partial('\n'.join(_markdown_header(self.columns)) + '\n')
+
+    def _emit_line(self, line: str):
+        if not line.strip() or line.lstrip().startswith('```'):
+            return
+        cells = _split_line(line, self.delimiter)
+        if not self.started and (
+            line.lstrip().startswith(('{', '[', '|')) or (len(cells) == 1 and len(self.columns) > 1)
+        ):
+            # Not in the encoding (a fenced answer in the output format, or prose)
+            self.passthrough = True
+            self.on_partial(line + '\n')
+            return
+        # Headers are recognised by their names here, as the next row is not known yet
+        if _is_header(cells, self.columns, []):
+            self._start()
+            return
+        self._start()
+        if self.json_output:
+            indent = '    ' if self.key else '  '
+            separator = ',\n' if self.rows else ''
+            self.on_partial(f"{separator}{indent}{json.dumps(_json_item(self.columns, cells), ensure_ascii=False)}")
+        else:
+            self.on_partial(_markdown_row(self.columns, cells) + '\n')
+        self.rows += 1
@@ -0,0 +1,146 @@
+"""Message layouts and same-document scheduling for provider prefix caches.
+
+With the default ``prompt_first`` layout the extractor prompt is the system
+message and the document follows, so each extractor has its own stable
+prefix. With ``document_first`` (``message_layout`` in extractors.yaml, or
+per extractor) the request starts with a generic system message and the
+document (image or text), and the extractor instructions come last. Every
+extractor run on the same document then shares the expensive prefix, and
+the provider's implicit prefix cache can serve its tokens (reported as
+``cached_tokens`` on each job).
+
+An implicit cache only has the prefix once a request with it has been
+processed, so requests for the same document are lined up: the first one
+goes ahead, and the others sent while it is in flight wait (up to
+``warmup_wait_seconds``) until it has finished. Prefix state is kept in
+Redis so all workers line up together; without Redis it is per process.
+"""
+
+import logging
+import time
+from threading import Lock
+from typing import Dict, Any, Optional, Tuple
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "autoglean:prefix:"
+
+LAYOUTS = ('prompt_first', 'document_first')
+
+_PENDING = 'pending'
+_WARM = 'warm'
+
+
+def get_layout_config() -> Dict[str, Any]:
+    """Get the ``message_layout`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('message_layout', {}) or {}
+
+
+def layout_for(extractor_config: Dict[str, Any]) -> str:
+    """Message layout of an extractor (its own message_layout, else the default)."""
+    layout = extractor_config.get('message_layout') or get_layout_config().get('default', 'prompt_first')
+    if layout not in LAYOUTS:
+        logger.warning(f"Unknown message layout '{layout}', using prompt_first")
+        return 'prompt_first'
+    return layout
+
+
+class PrefixScheduler:
+    """Let the first request for a document prefix warm the provider cache before the rest."""
+
+    def __init__(self):
+        self.config = get_layout_config()
+        self.warmup_wait = float(self.config.get('warmup_wait_seconds', 15))
+        self.warm_seconds = int(self.config.get('warm_seconds', 300))
+        self.poll_interval = float(self.config.get('poll_interval_seconds', 0.25))
+
+        self.redis = get_redis_client()
+        self._state: Dict[str, Tuple[str, float]] = {}
+        self._lock = Lock()
+
+    def _key(self, model: str, digest: str) -> str:
+        return f"{_KEY_PREFIX}{model}:{digest}"
+
+    # === Shared state ===
+
+    def _claim(self, key: str) -> Optional[str]:
+        """Claim a prefix for a first request; returns None if claimed, else its current state."""
+        if self.redis is not None:
+            try:
+                if self.redis.set(key, _PENDING, nx=True, ex=max(1, int(self.warmup_wait))):
+                    return None
+                state = self.redis.get(key)
+                # Expired between the two calls: claim it on the next poll
+                return state.decode() if state else _PENDING
+            except Exception as e:
+                logger.warning(f"Redis prefix state failed, using in-memory state: {e}")
+        with self._lock:
+            state, expires_at = self._state.get(key, (None, 0.0))
+            if state is None or expires_at <= time.time():
+                self._state[key] = (_PENDING, time.time() + self.warmup_wait)
+                return None
+            return state
+
+    def _set(self, key: str, state: Optional[str], ttl: float = 0):
+        if self.redis is not None:
+            try:
+                if state is None:
+                    self.redis.delete(key)
+                else:
+                    self.redis.set(key, state, ex=max(1, int(ttl)))
+                return
+            except Exception as e:
+                logger.warning(f"Redis prefix state failed, using in-memory state: {e}")
+        with self._lock:
+            if state is None:
+                self._state.pop(key, None)
+            else:
+                self._state[key] = (state, time.time() + ttl)
+
+    # === Scheduling ===
+
+    def wait_turn(self, model: str, digest: str) -> str:
+        """
+        Wait until a request for a document prefix should be sent.
+
+        Returns:
+            'first' (no request with this prefix is in flight or recent),
+            'warm' (an earlier request has finished, so the prefix should be
+            cached) or 'timeout' (the earlier request took too long)
+        """
+        key = self._key(model, digest)
+        deadline = time.monotonic() + self.warmup_wait
+        while True:
+            state = self._claim(key)
+            if state is None:
+                return 'first'
+            if state == _WARM:
+                return 'warm'
+            if time.monotonic() >= deadline:
+                return 'timeout'
+            time.sleep(self.poll_interval)
+
+    def mark_warm(self, model: str, digest: str):
+        """Record that a request with this prefix has been processed."""
+        self._set(self._key(model, digest), _WARM, self.warm_seconds)
+
+    def release(self, model: str, digest: str):
+        """Let waiting requests go ahead after the first request failed."""
+        key = self._key(model, digest)
+        if self._claim(key) != _WARM:
+            self._set(key, None)
+
+
+# Global instance
+_prefix_scheduler: Optional[PrefixScheduler] = None
+
+
+def get_prefix_scheduler() -> PrefixScheduler:
+    """Get or create global prefix scheduler."""
+    global _prefix_scheduler
+    if _prefix_scheduler is None:
+        _prefix_scheduler = PrefixScheduler()
+    return _prefix_scheduler
@@ -0,0 +1,180 @@
+"""Local OCR fast path: a Tesseract text layer before any LLM call.
+
+Extractors with ``pipeline: local_ocr`` first run Tesseract (Arabic and
+English by default) on every page of the document. If each page reaches
+the configured mean word confidence, the extractor runs text-only on a
+cheap text model; otherwise the document goes to the vision model as
+usual. Results are stored next to the LLM transcripts, by file content
+hash, so a document is only OCRed once. Runs entirely offline.
+
+Each page is recognised by its own ``tesseract`` process (pytesseract
+spawns the binary); a small thread pool keeps several pages in flight.
+Celery's prefork children are daemonic and cannot start a multiprocessing
+pool of their own, so a thread pool is used to drive the subprocesses.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union
+
+from PIL import Image
+
+try:
+    import pytesseract
+    TESSERACT_AVAILABLE = True
+except ImportError:
+    TESSERACT_AVAILABLE = False
+
+try:
+    from pdf2image import convert_from_path
+    PDF_SUPPORT = True
+except ImportError:
+    PDF_SUPPORT = False
+
+from autoglean.extractors.transcription import file_digest, get_pipeline_config, get_transcriber
+
+logger = logging.getLogger(__name__)
+
+
+def recognize_page(img: Image.Image, languages: str, timeout: float = 0) -> Dict[str, Any]:
+    """
+    OCR one page with Tesseract.
+
+    Args:
+        img: Page image
+        languages: Tesseract language codes, e.g. "ara+eng"
+        timeout: Seconds before the tesseract process is killed (0 = none)
+
+    Returns:
+        Dictionary with 'text' (lines and paragraphs preserved), 'words'
+        and 'confidence' (mean word confidence, 0-100)
+    """
+    data = pytesseract.image_to_data(
+        img.convert('L'),
+        lang=languages,
+        output_type=pytesseract.Output.DICT,
+        timeout=timeout
+    )
+
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    for index, word in enumerate(data['text']):
+        confidence = float(data['conf'][index])
+        if confidence < 0 or not word.strip():
+            continue
+        confidences.append(confidence)
+        key = (data['block_num'][index], data['par_num'][index], data['line_num'][index])
+        lines.setdefault(key, []).append(word)
+
+    text_parts = []
+    previous_paragraph = None
+    for (block, paragraph, _), words in sorted(lines.items()):
+        if previous_paragraph is not None and (block, paragraph) != previous_paragraph:
+            text_parts.append('')
+        text_parts.append(' '.join(words))
+        previous_paragraph = (block, paragraph)
+
+    return {
+        'text': '\n'.join(text_parts),
+        'words': len(confidences),
+        'confidence': round(sum(confidences) / len(confidences), 1) if confidences else 0.0
+    }
+
+
+class LocalOCR:
+    """Tesseract text layers with per-page confidence, stored by content hash."""
+
+    def __init__(self):
+        self.config = get_pipeline_config().get('local_ocr', {}) or {}
+        self.languages = self.config.get('languages', 'ara+eng')
+        self.dpi = int(self.config.get('dpi', 300))
+        self.min_confidence = float(self.config.get('min_confidence', 80))
+        self.min_words = int(self.config.get('min_words', 20))
+        self.max_pages = int(self.config.get('max_pages', 20))
+        self.timeout = float(self.config.get('timeout_seconds', 60))
+        self.engine = f"{self.config.get('engine', 'tesseract')}-{self.languages.replace('+', '-')}"
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(self.config.get('max_workers', 2)),
+            thread_name_prefix="local-ocr"
+        )
+
+    @property
+    def available(self) -> bool:
+        return TESSERACT_AVAILABLE
+
+    def _load_pages(self, file_path: Union[str, Path]) -> List[Image.Image]:
+        if Path(file_path).suffix.lower() == '.pdf':
+            if not PDF_SUPPORT:
+                raise RuntimeError("pdf2image not installed. Cannot OCR PDF.")
+            return convert_from_path(file_path, dpi=self.dpi, first_page=1, last_page=self.max_pages)
+        with Image.open(file_path) as img:
+            img.load()
+            return [img.copy()]
+
+    def page_is_confident(self, page: Dict[str, Any]) -> bool:
+        """Whether a page's text layer is good enough to skip the vision model."""
+        return page['words'] >= self.min_words and page['confidence'] >= self.min_confidence
+
+    def get_cached(self, file_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Stored text layer of a document, or None if it has not been OCRed."""
+        stored = get_transcriber().read(file_digest(file_path), self.engine)
+        return {**stored, 'cached': True} if stored is not None else None
+
+    def transcribe(self, file_path: Union[str, Path]) -> Dict[str, Any]:
+        """
+        Get the text layer of a document, running Tesseract if it is not stored yet.
+
+        Returns:
+            Dictionary with 'text', 'model', 'pages' (words and confidence per
+            page), 'confident' (every page passed), 'confidence' (lowest page
+            confidence) and 'cached'
+        """
+        transcriber = get_transcriber()
+        digest = file_digest(file_path)
+        stored = transcriber.read(digest, self.engine)
+        if stored is not None:
+            return {**stored, 'cached': True}
+
+        pages = self._load_pages(file_path)
+        results = list(self._executor.map(
+            lambda img: recognize_page(img, self.languages, self.timeout),
+            pages
+        ))
+
+        confident = [self.page_is_confident(page) for page in results]
+        transcript = {
+            'text': '\n\n'.join(
+                f"--- Page {number} ---\n{page['text']}" if len(results) > 1 else page['text']
+                for number, page in enumerate(results, start=1)
+            ),
+            'digest': digest,
+            'model': self.engine,
+            'usage': None,
+            'truncated': False,
+            'pages': [{'words': page['words'], 'confidence': page['confidence']} for page in results],
+            'confident': all(confident),
+            'confidence': min((page['confidence'] for page in results), default=0.0),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        transcriber.write(digest, transcript, self.engine)
+
+        low = [str(number) for number, ok in enumerate(confident, start=1) if not ok]
+        if low:
+            logger.info(f"Local OCR of {Path(file_path).name}: low confidence on page(s) {', '.join(low)}")
+        else:
+            logger.info(f"Local OCR of {Path(file_path).name}: {len(results)} page(s), confidence {transcript['confidence']}")
+        return {**transcript, 'cached': False}
+
+
+# Global instance
+_local_ocr: Optional[LocalOCR] = None
+
+
+def get_local_ocr() -> LocalOCR:
+    """Get or create global local OCR engine."""
+    global _local_ocr
+    if _local_ocr is None:
+        _local_ocr = LocalOCR()
+    return _local_ocr
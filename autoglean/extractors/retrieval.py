@@ -0,0 +1,150 @@
+"""Retrieval-narrowed prompts for long text documents.
+
+Extractors that look for something specific (dates, entities) do not need
+a whole contract. An extractor with a ``retrieval`` block gets, for text
+documents longer than ``min_chars``, only the chunks most relevant to its
+query: the text is split into chunks of about ``chunk_chars`` at line
+breaks, the chunks are ranked with BM25 against the query terms (plus
+``patterns``, regexes for things words do not capture, such as numeric
+dates), and the ``top_k`` best are sent in document order. Example::
+
+    retrieval:
+      query: "date dated signed effective expiry"
+      patterns: ['\\d{1,4}[/.-]\\d{1,2}[/.-]\\d{1,4}']
+      top_k: 8
+
+Indexing is local and in memory; a 100k-character document takes a few
+milliseconds. If no chunk matches, the whole text is sent as before.
+"""
+
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+# Placed between excerpts that are not adjacent in the document
+EXCERPT_SEPARATOR = "\n[...]\n"
+
+
+def get_retrieval_config() -> Dict[str, Any]:
+    """Get the ``retrieval`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('retrieval', {}) or {}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens (Unicode letters and digits, so Arabic works too)."""
+    return [token.lower() for token in _TOKEN_PATTERN.findall(text)]
+
+
+def split_chunks(text: str, chunk_chars: int) -> List[str]:
+    """Split text into chunks of about chunk_chars characters, at line breaks where possible."""
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        # A single line longer than a chunk is cut into pieces
+        while len(line) > chunk_chars:
+            if current:
+                chunks.append(''.join(current))
+                current, size = [], 0
+            chunks.append(line[:chunk_chars])
+            line = line[chunk_chars:]
+        if current and size + len(line) > chunk_chars:
+            chunks.append(''.join(current))
+            current, size = [], 0
+        if line:
+            current.append(line)
+            size += len(line)
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a list of text chunks."""
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if chunks else 0.0
+
+        document_freqs: Counter = Counter()
+        for freqs in self.term_freqs:
+            document_freqs.update(freqs.keys())
+        count = len(chunks)
+        self.idf = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freqs.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """BM25 score of every chunk for a query."""
+        terms = set(tokenize(query))
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            scores.append(sum(
+                self.idf[term] * freqs[term] * (self.k1 + 1) / (freqs[term] + norm)
+                for term in terms if term in freqs
+            ))
+        return scores
+
+
+def select_excerpts(text: str, extractor_retrieval: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Narrow a long text to the chunks relevant to an extractor.
+
+    Args:
+        text: The document text
+        extractor_retrieval: The extractor's ``retrieval`` block
+
+    Returns:
+        Dictionary with 'text' (the selected chunks in document order),
+        'chunks', 'selected' (chunk indices), 'chars' and 'sent_chars'; None
+        when the text is short enough to send whole, nothing matches or
+        every chunk would be sent anyway
+    """
+    settings = {**get_retrieval_config(), **extractor_retrieval}
+    if not settings.get('enabled', True) or len(text) < int(settings.get('min_chars', 20000)):
+        return None
+
+    chunks = split_chunks(text, int(settings.get('chunk_chars', 1500)))
+    index = BM25Index(chunks, float(settings.get('k1', 1.5)), float(settings.get('b', 0.75)))
+    scores = index.scores(settings.get('query') or '')
+
+    patterns = [re.compile(pattern) for pattern in settings.get('patterns') or []]
+    if patterns:
+        pattern_weight = float(settings.get('pattern_weight', 2.0))
+        for position, chunk in enumerate(chunks):
+            matches = sum(len(pattern.findall(chunk)) for pattern in patterns)
+            scores[position] += pattern_weight * math.log1p(matches)
+
+    ranked = sorted((position for position in range(len(chunks)) if scores[position] > 0),
+                    key=lambda position: scores[position], reverse=True)
+    selected = sorted(ranked[:int(settings.get('top_k', 8))])
+    if not selected or len(selected) == len(chunks):
+        return None
+
+    parts = []
+    for number, position in enumerate(selected):
+        if number and position != selected[number - 1] + 1:
+            parts.append(EXCERPT_SEPARATOR)
+        parts.append(chunks[position])
+    excerpt_text = ''.join(parts)
+    return {
+        'text': excerpt_text,
+        'chunks': len(chunks),
+        'selected': selected,
+        'chars': len(text),
+        'sent_chars': len(excerpt_text)
+    }
@@ -12,6 +12,8 @@ from autoglean.db.models import (
     ExtractorRating, VisibilityEnum, Department, GeneralManagement
 )
 from autoglean.auth.dependencies import get_current_active_user
+from autoglean.extractors.document import build_system_prompt
+from autoglean.llm.context_cache import get_context_cache_manager
 from autoglean.extractors.schemas import (
     ExtractorCreateRequest, ExtractorUpdateRequest, ExtractorResponse,
     ExtractorShareRequest, ExtractorShareResponse,
@@ -401,12 +403,17 @@ async def update_extractor(
                 db.add(history)
 
         # Update fields
+        old_prompt = extractor.prompt
         for field, value in update_data.items():
             setattr(extractor, field, value)
 
         db.commit()
         db.refresh(extractor)
 
+        # Drop provider context caches built for the previous prompt
+        if extractor.prompt != old_prompt:
+            get_context_cache_manager().invalidate_prompt(build_system_prompt(old_prompt))
+
         # Get owner name, department and GM
         owner = db.query(User).filter(User.id == extractor.owner_id).first()
         department = db.query(Department).filter(Department.id == owner.department_id).first() if owner else None
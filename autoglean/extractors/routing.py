@@ -0,0 +1,323 @@
+"""Complexity-based model routing per document.
+
+Extractors normally name one ``llm``. With routing enabled, the router
+measures a few cheap signals of the document (page count, text density,
+image entropy, ruled tables) and picks the lowest tier of a model ladder
+(e.g. gemini-flash-lite -> gemini-flash -> gemini-pro) whose score band
+covers the document. If an extractor's success rate on the chosen
+model is below ``min_success_rate``, the next tier up is used instead.
+
+Outcomes (success, failure or failover away from the routed model) are
+counted per extractor and model in Redis, shared by all workers, with an
+in-memory fallback. Every decision is logged as a ``model_routing`` event
+and returned with the result so routing can be evaluated afterwards.
+"""
+
+import logging
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional, Union
+
+from PIL import Image
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    PDF_SUPPORT = True
+except ImportError:
+    PDF_SUPPORT = False
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "autoglean:routing:outcomes:"
+
+# Side of the grayscale thumbnail the image signals are measured on
+_THUMBNAIL_SIDE = 512
+
+
+def get_routing_config() -> Dict[str, Any]:
+    """Get the ``routing`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('routing', {}) or {}
+
+
+@dataclass
+class DocumentSignals:
+    """Cheap complexity signals of one document."""
+    pages: int = 1
+    text_chars: int = 0           # characters of text sent (0 for images)
+    image_entropy: float = 0.0    # grayscale entropy in bits (0-8)
+    table_score: float = 0.0      # 0-1, ruled lines or table-like text rows
+
+
+@dataclass
+class RoutingDecision:
+    """Model chosen for a document, with the inputs that led to it."""
+    model: str
+    tier: int
+    score: float
+    signals: DocumentSignals
+    reasons: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'model': self.model,
+            'tier': self.tier,
+            'score': self.score,
+            'signals': asdict(self.signals),
+            'reasons': self.reasons
+        }
+
+
+# === Signals ===
+
+def _ruled_line_score(img: Image.Image, darkness: float = 0.5) -> float:
+    """
+    Fraction of rows and columns of a grayscale image that are mostly dark.
+
+    Averaging the image down to one column (and one row) gives the mean
+    darkness of each pixel row (and column); table rulings show up as rows
+    and columns that are dark across most of their length.
+    """
+    inverted = img.point(lambda value: 255 - value)
+    row_means = list(inverted.resize((1, img.height), Image.Resampling.BOX).getdata())
+    column_means = list(inverted.resize((img.width, 1), Image.Resampling.BOX).getdata())
+    threshold = 255 * darkness
+    ruled_rows = sum(1 for value in row_means if value >= threshold)
+    ruled_columns = sum(1 for value in column_means if value >= threshold)
+    return (ruled_rows + ruled_columns) / max(1, img.height + img.width)
+
+
+def _text_table_score(text: str) -> float:
+    """Fraction of non-empty lines that look like table rows (pipes or tabs)."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+    table_lines = sum(1 for line in lines if line.count('|') >= 2 or line.count('\t') >= 2)
+    return table_lines / len(lines)
+
+
+def measure_signals(file_path: Union[str, Path], text: Optional[str] = None) -> DocumentSignals:
+    """
+    Measure a document's complexity signals.
+
+    Args:
+        file_path: Path to the document
+        text: Text sent instead of the image (text files and transcripts), if any
+
+    Returns:
+        DocumentSignals; signals that cannot be measured stay at their defaults
+    """
+    signals = DocumentSignals()
+    if text is not None:
+        signals.text_chars = len(text)
+        signals.table_score = round(_text_table_score(text), 3)
+        return signals
+
+    try:
+        if Path(file_path).suffix.lower() == '.pdf':
+            if not PDF_SUPPORT:
+                return signals
+            signals.pages = int(pdfinfo_from_path(str(file_path)).get('Pages', 1))
+            img = convert_from_path(file_path, first_page=1, last_page=1, dpi=50)[0]
+        else:
+            with Image.open(file_path) as opened:
+                signals.pages = getattr(opened, 'n_frames', 1)
+                opened.draft('L', (_THUMBNAIL_SIDE, _THUMBNAIL_SIDE))
+                img = opened.convert('L')
+
+        img = img.convert('L')
+        img.thumbnail((_THUMBNAIL_SIDE, _THUMBNAIL_SIDE))
+        signals.image_entropy = round(img.entropy(), 3)
+        # Ruled lines are a few pixels wide; counted over the thumbnail, a full
+        # table grid covers a few percent of rows and columns
+        signals.table_score = round(min(1.0, _ruled_line_score(img) * 20), 3)
+    except Exception as e:
+        logger.warning(f"Could not measure routing signals for {Path(file_path).name}: {e}")
+    return signals
+
+
+# === Outcomes ===
+
+class OutcomeTracker:
+    """Success and failure counts per extractor and model, shared through Redis."""
+
+    def __init__(self):
+        self.redis = get_redis_client()
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = Lock()
+
+    def record(self, extractor_id: str, model: str, success: bool):
+        """Count one outcome of an extraction routed to a model."""
+        field_name = f"{model}:{'ok' if success else 'failed'}"
+        if self.redis is not None:
+            try:
+                self.redis.hincrby(f"{_KEY_PREFIX}{extractor_id}", field_name, 1)
+                return
+            except Exception as e:
+                logger.warning(f"Redis routing outcome update failed, using in-memory counts: {e}")
+        with self._lock:
+            counts = self._counts.setdefault(extractor_id, {})
+            counts[field_name] = counts.get(field_name, 0) + 1
+
+    def counts(self, extractor_id: str) -> Dict[str, Dict[str, int]]:
+        """Outcome counts of an extractor by model: {model: {'ok': n, 'failed': n}}."""
+        raw: Dict[str, int] = {}
+        if self.redis is not None:
+            try:
+                raw = {
+                    key.decode(): int(value)
+                    for key, value in self.redis.hgetall(f"{_KEY_PREFIX}{extractor_id}").items()
+                }
+            except Exception as e:
+                logger.warning(f"Redis routing outcome read failed: {e}")
+        if not raw:
+            with self._lock:
+                raw = dict(self._counts.get(extractor_id, {}))
+
+        by_model: Dict[str, Dict[str, int]] = {}
+        for key, value in raw.items():
+            model, outcome = key.rsplit(':', 1)
+            by_model.setdefault(model, {'ok': 0, 'failed': 0})[outcome] = value
+        return by_model
+
+    def success_rate(self, extractor_id: str, model: str, min_samples: int) -> Optional[float]:
+        """Success rate of an extractor on a model, or None with fewer than min_samples outcomes."""
+        counts = self.counts(extractor_id).get(model)
+        if not counts:
+            return None
+        total = counts['ok'] + counts['failed']
+        if total < max(1, min_samples):
+            return None
+        return counts['ok'] / total
+
+
+# === Router ===
+
+class ModelRouter:
+    """Pick the fastest adequate model tier for a document."""
+
+    def __init__(self):
+        self.config = get_routing_config()
+        self.enabled = bool(self.config.get('enabled', False))
+        self.ladder: List[str] = list(self.config.get('ladder') or [])
+        self.thresholds: List[float] = [float(value) for value in self.config.get('thresholds') or []]
+        self.weights: Dict[str, float] = {
+            'pages': 0.3, 'text_density': 0.2, 'image_entropy': 0.3, 'tables': 0.2,
+            **(self.config.get('weights') or {})
+        }
+        self.max_pages = int(self.config.get('max_pages', 10))
+        self.dense_chars_per_page = int(self.config.get('dense_chars_per_page', 6000))
+        self.min_success_rate = float(self.config.get('min_success_rate', 0.9))
+        self.min_samples = int(self.config.get('min_samples', 20))
+        self.outcomes = OutcomeTracker()
+
+    def ladder_for(self, extractor_config: Dict[str, Any]) -> List[str]:
+        """Model ladder of an extractor (its own routing.ladder, else the global one)."""
+        setting = extractor_config.get('routing')
+        if isinstance(setting, dict) and setting.get('ladder'):
+            return list(setting['ladder'])
+        return self.ladder
+
+    def applies_to(self, extractor_config: Dict[str, Any]) -> bool:
+        """Whether an extractor's model is chosen by the router."""
+        setting = extractor_config.get('routing')
+        if setting is False:
+            return False
+        return (self.enabled or bool(setting)) and len(self.ladder_for(extractor_config)) > 1
+
+    def score(self, signals: DocumentSignals) -> float:
+        """Weighted complexity score of a document, 0 (trivial) to 1 (hardest)."""
+        components = {
+            'pages': min(1.0, (signals.pages - 1) / max(1, self.max_pages - 1)),
+            'text_density': min(1.0, signals.text_chars / signals.pages / self.dense_chars_per_page),
+            # Blank and clean scans sit around 1-4 bits; dense drawings and photos near 7-8
+            'image_entropy': min(1.0, max(0.0, (signals.image_entropy - 3.0) / 4.5)),
+            'tables': signals.table_score
+        }
+        total_weight = sum(self.weights.values()) or 1.0
+        return round(sum(self.weights[name] * value for name, value in components.items()) / total_weight, 3)
+
+    def route(
+        self,
+        extractor_id: str,
+        extractor_config: Dict[str, Any],
+        file_path: Union[str, Path],
+        text: Optional[str] = None
+    ) -> RoutingDecision:
+        """
+        Choose the model tier for a document.
+
+        Args:
+            extractor_id: ID of the extractor
+            extractor_config: The extractor's configuration
+            file_path: Path to the document
+            text: Text sent instead of the image, if any
+
+        Returns:
+            RoutingDecision (also logged as a model_routing event)
+        """
+        signals = measure_signals(file_path, text)
+        score = self.score(signals)
+        ladder = self.ladder_for(extractor_config)
+
+        tier = sum(1 for threshold in self.thresholds if score >= threshold)
+        tier = min(tier, len(ladder) - 1)
+        reasons = [f"score {score} -> tier {tier}"]
+
+        # Escalate past models this extractor has been failing on
+        while tier < len(ladder) - 1:
+            rate = self.outcomes.success_rate(extractor_id, ladder[tier], self.min_samples)
+            if rate is None or rate >= self.min_success_rate:
+                break
+            reasons.append(f"{ladder[tier]} success rate {rate:.2f} < {self.min_success_rate}")
+            tier += 1
+
+        decision = RoutingDecision(model=ladder[tier], tier=tier, score=score, signals=signals, reasons=reasons)
+        logger.info(
+            f"Routed {extractor_id} on {Path(file_path).name} to {decision.model} (score {score})",
+            extra={'event': 'model_routing', 'extractor_id': extractor_id, 'file_name': Path(file_path).name,
+                   **decision.as_dict()}
+        )
+        return decision
+
+    def record_outcome(self, extractor_id: str, model: str, success: bool):
+        """Record whether an extraction routed to a model succeeded on it."""
+        self.outcomes.record(extractor_id, model, success)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Ladder, thresholds and outcome counts per extractor."""
+        extractors = get_config_loader().load_extractors_config().get('extractors', {}) or {}
+        stats = {}
+        for extractor_id, extractor_config in extractors.items():
+            if not self.applies_to(extractor_config):
+                continue
+            stats[extractor_id] = {
+                model: {
+                    **counts,
+                    'success_rate': round(counts['ok'] / (counts['ok'] + counts['failed']), 3)
+                    if counts['ok'] + counts['failed'] else None
+                }
+                for model, counts in self.outcomes.counts(extractor_id).items()
+            }
+        return {
+            'enabled': self.enabled,
+            'ladder': self.ladder,
+            'thresholds': self.thresholds,
+            'min_success_rate': self.min_success_rate,
+            'extractors': stats
+        }
+
+
+# Global instance
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Get or create global model router."""
+    global _model_router
+    if _model_router is None:
+        _model_router = ModelRouter()
+    return _model_router
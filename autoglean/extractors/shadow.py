@@ -0,0 +1,314 @@
+"""Shadow evaluation of candidate models on live traffic.
+
+Before an extractor moves to a cheaper or newer model, it is worth knowing
+how that model does on the documents users actually send. With ``shadow``
+enabled in extractors.yaml, a ``sample_rate`` share of each extractor's
+completed jobs is re-run on every candidate model, in the background on
+its own low-priority Celery queue, so production jobs never wait for it.
+Candidates are listed per extractor, globally or in the extractor's own
+block::
+
+    shadow:
+      candidates: ["gemini-flash-lite"]
+      sample_rate: 0.1
+
+The candidate gets the same request as production (prompt, document,
+encoding, continuation) but no fallback, and its answer is neither cached
+nor saved as a result. Its output, latency, tokens and cost are stored in
+``shadow_runs`` next to the production job, with an agreement score: F1
+over the answer's items (JSON list items or object fields, markdown lines
+or table rows), normalized so that formatting differences do not count.
+GET /api/llm/shadow reports agreement and latency/cost deltas per
+extractor and candidate.
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+from autoglean.extractors.budgets import percentile
+from autoglean.extractors.validation import parse_json_output
+
+# Import litellm (model prices)
+try:
+    from litellm import cost_per_token
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_TABLE_SEPARATOR = re.compile(r'^[\s|:-]*-[\s|:-]*$')
+_LIST_MARKER = re.compile(r'^(?:[-*+]|\d+[.)])\s+')
+
+
+def get_shadow_config() -> Dict[str, Any]:
+    """Get the ``shadow`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('shadow', {}) or {}
+
+
+# === Agreement ===
+
+def _normalize(value: Any) -> Any:
+    """Normalize a JSON value: trimmed lowercase strings, numbers as floats."""
+    if isinstance(value, dict):
+        return {str(key).strip().lower(): _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    text = _WHITESPACE.sub(' ', str(value)).strip().lower()
+    try:
+        return round(float(text), 6)
+    except ValueError:
+        return text
+
+
+def _json_items(data: Any, path: str = '') -> List[str]:
+    """Comparable items of a JSON answer: list items, and scalar object fields."""
+    if isinstance(data, list):
+        return [f"{path}[]{json.dumps(item, sort_keys=True, ensure_ascii=False)}" for item in data]
+    if isinstance(data, dict):
+        items = []
+        for key, value in data.items():
+            if isinstance(value, (list, dict)):
+                items.extend(_json_items(value, f"{path}{key}."))
+            else:
+                items.append(f"{path}{key}={json.dumps(value, ensure_ascii=False)}")
+        return items
+    return [json.dumps(data, ensure_ascii=False)]
+
+
+def _text_items(text: str) -> List[str]:
+    """Comparable items of a text answer: its lines, with table cells and list markers normalized."""
+    items = []
+    for line in (text or '').split('\n'):
+        line = line.strip()
+        if not line or line.startswith('```') or _TABLE_SEPARATOR.match(line):
+            continue
+        if line.startswith('|'):
+            line = '|'.join(cell.strip() for cell in line.strip('|').split('|'))
+        line = _LIST_MARKER.sub('', line).replace('**', '')
+        items.append(_WHITESPACE.sub(' ', line).lower())
+    return items
+
+
+def agreement(production: Optional[str], candidate: Optional[str], output_format: Optional[str] = None) -> float:
+    """
+    How far a candidate answer agrees with the production answer.
+
+    Args:
+        production: The production answer
+        candidate: The candidate model's answer
+        output_format: The extractor's output_format ('json' compares items
+            structurally, anything else compares lines)
+
+    Returns:
+        F1 of the candidate's items against the production items, 0-1
+        (1.0 when both are empty)
+    """
+    expected = found = None
+    if output_format == 'json':
+        try:
+            expected = _json_items(_normalize(parse_json_output(production or '')))
+            found = _json_items(_normalize(parse_json_output(candidate or '')))
+        except ValueError:
+            expected = found = None
+    if expected is None:
+        expected, found = _text_items(production), _text_items(candidate)
+
+    expected_counts, found_counts = Counter(expected), Counter(found)
+    if not expected_counts and not found_counts:
+        return 1.0
+    overlap = sum((expected_counts & found_counts).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(found_counts.values())
+    recall = overlap / sum(expected_counts.values())
+    return round(2 * precision * recall / (precision + recall), 4)
+
+
+def completion_cost(model_name: Optional[str], prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Optional[float]:
+    """Cost in USD of a completion from LiteLLM's price list (None if the model is not priced)."""
+    if not LITELLM_AVAILABLE or not model_name:
+        return None
+    # Strip the fallback/hedging tag of a stored model_used
+    model_name = model_name.split(' [', 1)[0]
+    try:
+        prompt_cost, output_cost = cost_per_token(
+            model=model_name,
+            prompt_tokens=prompt_tokens or 0,
+            completion_tokens=completion_tokens or 0
+        )
+        return round(prompt_cost + output_cost, 6)
+    except Exception:
+        return None
+
+
+# === Evaluation ===
+
+class ShadowEvaluator:
+    """Sample completed jobs, re-run them on candidate models and report the comparison."""
+
+    def __init__(self):
+        self.config = get_shadow_config()
+        self.enabled = bool(self.config.get('enabled', False))
+        self.sample_rate = float(self.config.get('sample_rate', 0.05))
+        self.queue = self.config.get('queue', 'shadow')
+        self.delay_seconds = int(self.config.get('delay_seconds', 30))
+        self.agreement_threshold = float(self.config.get('agreement_threshold', 0.95))
+
+    def candidates_for(self, extractor_id: str, extractor_config: Dict[str, Any]) -> List[str]:
+        """Candidate models of an extractor (its own shadow block, else the global mapping)."""
+        own = extractor_config.get('shadow')
+        if own is False:
+            return []
+        if isinstance(own, dict) and own.get('candidates'):
+            candidates = own['candidates']
+        else:
+            candidates = (self.config.get('candidates') or {}).get(extractor_id) or []
+        production = extractor_config.get('llm')
+        return [candidate for candidate in candidates if candidate != production]
+
+    def sample(self, extractor_id: str, extractor_config: Dict[str, Any]) -> List[str]:
+        """Candidate models a completed job should be re-run on (empty for most jobs)."""
+        if not self.enabled:
+            return []
+        candidates = self.candidates_for(extractor_id, extractor_config)
+        own = extractor_config.get('shadow')
+        rate = float(own.get('sample_rate', self.sample_rate)) if isinstance(own, dict) else self.sample_rate
+        if not candidates or random.random() >= rate:
+            return []
+        return candidates
+
+    def run(self, extractor_id: str, file_path: str, candidate: str) -> Dict[str, Any]:
+        """
+        Run a job's extraction on a candidate model.
+
+        Args:
+            extractor_id: ID of the extractor used
+            file_path: Path to the document file
+            candidate: Provider name of the candidate model
+
+        Returns:
+            Dictionary with 'content' (decoded to the output format),
+            'output_format', 'usage', 'model', 'latency_ms' and 'truncated'
+        """
+        from autoglean.extractors.document import get_document_extractor
+        from autoglean.extractors.encoding import decode_output
+
+        extractor = get_document_extractor()
+        # Stored transcripts are reused, but a shadow run never transcribes
+        request = extractor.build_request(extractor_id, file_path, allow_transcribe=False)
+        request['max_tokens'] = extractor.max_tokens_for(extractor_id, request['extractor_config'], candidate)
+
+        started = time.monotonic()
+        response = extractor.llm_client.complete(
+            messages=request['messages'],
+            model=candidate,
+            image=request['image'],
+            temperature=request['temperature'],
+            max_tokens=request['max_tokens'],
+            use_cache=False
+        )
+        response = extractor._complete_continuing(extractor_id, request, response, [candidate])
+        latency_ms = round((time.monotonic() - started) * 1000)
+
+        return {
+            'content': decode_output(response.get('content'), request['extractor_config']),
+            'output_format': request['extractor_config'].get('output_format'),
+            'usage': response.get('usage') or {},
+            'model': response.get('model') or candidate,
+            'latency_ms': latency_ms,
+            'truncated': bool(response.get('truncated'))
+        }
+
+    def report(self, days: int = 7) -> List[Dict[str, Any]]:
+        """
+        Compare candidates with production over the recent shadow runs.
+
+        Args:
+            days: How many days of shadow runs to include
+
+        Returns:
+            One entry per extractor and candidate model with the run counts,
+            mean agreement, share of runs at agreement_threshold or above,
+            median latencies, mean tokens and mean costs (candidate and
+            production) and the relative deltas
+        """
+        from autoglean.db.base import SessionLocal
+        from autoglean.db.models import Extractor, ShadowRun
+
+        since = datetime.utcnow() - timedelta(days=days)
+        db = SessionLocal()
+        try:
+            rows = db.query(ShadowRun, Extractor.extractor_id).join(
+                Extractor, Extractor.id == ShadowRun.extractor_id
+            ).filter(ShadowRun.created_at >= since).all()
+        finally:
+            db.close()
+
+        groups: Dict[tuple, List[Any]] = {}
+        for run, extractor_id in rows:
+            groups.setdefault((extractor_id, run.candidate_model), []).append(run)
+
+        report = []
+        for (extractor_id, candidate), runs in sorted(groups.items()):
+            completed = [run for run in runs if run.status == "completed"]
+            scores = [run.agreement for run in completed if run.agreement is not None]
+            entry = {
+                'extractor_id': extractor_id,
+                'candidate_model': candidate,
+                'production_models': sorted({run.production_model for run in runs if run.production_model}),
+                'runs': len(runs),
+                'failed': len(runs) - len(completed),
+                'mean_agreement': round(sum(scores) / len(scores), 4) if scores else None,
+                'agreeing_share': (
+                    round(sum(score >= self.agreement_threshold for score in scores) / len(scores), 4)
+                    if scores else None
+                ),
+                'latency_ms_p50': percentile([run.latency_ms for run in completed if run.latency_ms], 0.5),
+                'production_latency_ms_p50': percentile(
+                    [run.production_latency_ms for run in completed if run.production_latency_ms], 0.5
+                ),
+                'tokens_mean': _mean([run.total_tokens for run in completed]),
+                'production_tokens_mean': _mean([run.production_total_tokens for run in completed]),
+                'cost_mean': _mean([run.cost for run in completed], 6),
+                'production_cost_mean': _mean([run.production_cost for run in completed], 6)
+            }
+            entry['latency_delta'] = _delta(entry['latency_ms_p50'], entry['production_latency_ms_p50'])
+            entry['tokens_delta'] = _delta(entry['tokens_mean'], entry['production_tokens_mean'])
+            entry['cost_delta'] = _delta(entry['cost_mean'], entry['production_cost_mean'])
+            report.append(entry)
+        return report
+
+
+def _mean(values: List[Optional[float]], digits: int = 1) -> Optional[float]:
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), digits) if values else None
+
+
+def _delta(candidate: Optional[float], production: Optional[float]) -> Optional[float]:
+    """Relative change from production to candidate (-0.4 = 40% less)."""
+    if candidate is None or not production:
+        return None
+    return round(candidate / production - 1, 4)
+
+
+# Global instance
+_shadow_evaluator: Optional[ShadowEvaluator] = None
+
+
+def get_shadow_evaluator() -> ShadowEvaluator:
+    """Get or create global shadow evaluator."""
+    global _shadow_evaluator
+    if _shadow_evaluator is None:
+        _shadow_evaluator = ShadowEvaluator()
+    return _shadow_evaluator
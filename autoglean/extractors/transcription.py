@@ -0,0 +1,176 @@
+"""Stage 1 of the two-stage pipeline: transcribe a document image once.
+
+The transcript of a document is stored on disk keyed by the SHA-256 of the
+file and the OCR model, so every extractor (and every re-upload of the same
+scan) reuses it as plain text instead of sending the image again. Workers
+take a lock file while transcribing, so a document is transcribed once even
+when several extractors start on it at the same time.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, Optional, Union
+
+from autoglean.core.config import get_config_loader
+from autoglean.llm.client import get_llm_client
+from autoglean.llm.payload import ImagePayload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OCR_PROMPT = (
+    "Transcribe all text in the attached document exactly as written, in reading order. "
+    "Keep tables as markdown tables and keep numbers, coordinates and dates unchanged. "
+    "Do not summarize, translate or add commentary."
+)
+
+
+def get_pipeline_config() -> Dict[str, Any]:
+    """Get the ``pipeline`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('pipeline', {}) or {}
+
+
+def file_digest(file_path: Union[str, Path]) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Transcriber:
+    """Transcribe document images with the OCR model and keep the text by content hash."""
+
+    def __init__(self):
+        self.llm_client = get_llm_client()
+        self.config = get_pipeline_config()
+        self.ocr_model = self.config.get('ocr_model', 'ollama-llava')
+        self.base_dir = Path(self.config.get('transcripts_dir', 'storage/transcripts'))
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_timeout = float(self.config.get('lock_timeout_seconds', 300))
+
+    def _path(self, digest: str, engine: Optional[str] = None) -> Path:
+        return self.base_dir / digest[:2] / f"{digest}_{engine or self.ocr_model}.json"
+
+    def read(self, digest: str, engine: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Stored transcript by file digest and engine (OCR model by default)."""
+        path = self._path(digest, engine)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable transcript {path.name}: {e}")
+            return None
+
+    def write(self, digest: str, transcript: Dict[str, Any], engine: Optional[str] = None):
+        """Store a transcript atomically."""
+        path = self._path(digest, engine)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(transcript, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get_cached(self, file_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Stored transcript of a document, or None if it has not been transcribed."""
+        return self.read(file_digest(file_path))
+
+    def get_or_transcribe(
+        self,
+        file_path: Union[str, Path],
+        load_image: Callable[[Union[str, Path]], ImagePayload]
+    ) -> Dict[str, Any]:
+        """
+        Get a document's transcript, transcribing it first if needed.
+
+        Args:
+            file_path: Path to an image or PDF
+            load_image: Builds the image payload (e.g. DocumentExtractor.prepare_image)
+
+        Returns:
+            Dictionary with 'text', 'model', 'usage', 'truncated' and
+            'cached' (False only for the call that paid for the transcription)
+        """
+        digest = file_digest(file_path)
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = path.with_suffix('.lock')
+
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            cached = self.read(digest)
+            if cached is not None:
+                return {**cached, 'cached': True}
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                break
+            except FileExistsError:
+                # Another worker is transcribing; take over if it seems to have died
+                if time.monotonic() > deadline or time.time() - lock_path.stat().st_mtime > self.lock_timeout:
+                    logger.warning(f"Stale transcription lock for {Path(file_path).name}, taking over")
+                    lock_path.unlink(missing_ok=True)
+                    continue
+                time.sleep(1)
+
+        try:
+            transcript = self._transcribe(file_path, digest, load_image)
+            self.write(digest, transcript)
+            return {**transcript, 'cached': False}
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    def _transcribe(
+        self,
+        file_path: Union[str, Path],
+        digest: str,
+        load_image: Callable[[Union[str, Path]], ImagePayload]
+    ) -> Dict[str, Any]:
+        max_tokens = int(self.config.get('ocr_max_tokens', 4000))
+        logger.info(f"Transcribing {Path(file_path).name} with {self.ocr_model}")
+
+        response = self.llm_client.complete_with_fallback(
+            messages=[
+                {"role": "system", "content": self.config.get('ocr_prompt') or DEFAULT_OCR_PROMPT},
+                {"role": "user", "content": "Transcribe the attached document."}
+            ],
+            models=self.llm_client.get_fallback_chain(self.ocr_model),
+            image=load_image(file_path),
+            temperature=0,
+            max_tokens=max_tokens
+        )
+        if not response.get('content'):
+            raise ValueError(f"OCR model returned no text for {Path(file_path).name}")
+
+        usage = response.get('usage') or {}
+        truncated = (usage.get('completion_tokens') or 0) >= max_tokens - 10
+        if truncated:
+            logger.warning(f"Transcript of {Path(file_path).name} hit ocr_max_tokens={max_tokens}")
+
+        return {
+            'text': response['content'],
+            'digest': digest,
+            'model': response['model'],
+            'usage': usage,
+            'truncated': truncated,
+            'created_at': datetime.utcnow().isoformat()
+        }
+
+
+# Global instance
+_transcriber: Optional[Transcriber] = None
+
+
+def get_transcriber() -> Transcriber:
+    """Get or create global transcriber."""
+    global _transcriber
+    if _transcriber is None:
+        _transcriber = Transcriber()
+    return _transcriber
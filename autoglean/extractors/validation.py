@@ -0,0 +1,121 @@
+"""Structural validation of JSON extractor output.
+
+Used by the escalation cascade (``escalation`` in extractors.yaml): JSON
+extractors are answered by the cheapest model of a ladder first, and the
+answer is accepted only if it parses as JSON and matches the extractor's
+``validation`` block; otherwise the next model up is tried. Example::
+
+    validation:
+      required_keys: [coordinates]      # top-level keys that must be present
+      items:
+        key: coordinates                # list to check item by item
+        min_items: 1
+        required: [point]               # keys every item must have
+        numeric: [latitude, longitude]  # keys that must be numbers (or numeric strings) when present
+"""
+
+import json
+import re
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+
+_FENCE_PATTERN = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+
+# Problems reported per answer; the rest are summarised
+_MAX_PROBLEMS = 10
+
+
+def get_escalation_config() -> Dict[str, Any]:
+    """Get the ``escalation`` section of extractors.yaml."""
+    return get_config_loader().load_extractors_config().get('escalation', {}) or {}
+
+
+def parse_json_output(content: Optional[str]) -> Any:
+    """
+    Parse a model's JSON answer, tolerating markdown code fences and surrounding text.
+
+    Raises:
+        ValueError: If no JSON document can be parsed
+    """
+    text = (content or '').strip()
+    fenced = _FENCE_PATTERN.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    # Prose around the object: take the outermost braces
+    start, end = text.find('{'), text.rfind('}')
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except ValueError as e:
+            raise ValueError(f"Output is not valid JSON: {e}") from e
+    raise ValueError("Output contains no JSON object")
+
+
+def _is_numeric(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    if isinstance(value, str):
+        try:
+            float(value.strip().replace(',', ''))
+            return True
+        except ValueError:
+            return False
+    return False
+
+
+def validate_output(content: Optional[str], schema: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Check an answer against an extractor's validation schema.
+
+    Args:
+        content: The model's answer
+        schema: The extractor's ``validation`` block (parseability only when None)
+
+    Returns:
+        List of problems; empty when the answer is valid
+    """
+    try:
+        data = parse_json_output(content)
+    except ValueError as e:
+        return [str(e)]
+
+    schema = schema or {}
+    problems = []
+    if schema.get('required_keys') and not isinstance(data, dict):
+        return [f"Expected a JSON object, got {type(data).__name__}"]
+    for key in schema.get('required_keys') or []:
+        if key not in data:
+            problems.append(f"Missing key '{key}'")
+
+    items_schema = schema.get('items')
+    if items_schema:
+        key = items_schema.get('key')
+        items = data.get(key) if key and isinstance(data, dict) else data
+        if not isinstance(items, list):
+            problems.append(f"'{key}' is not a list" if key else "Expected a JSON array")
+            return problems
+        if len(items) < int(items_schema.get('min_items', 0)):
+            problems.append(f"'{key}' has {len(items)} items, expected at least {items_schema['min_items']}")
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                problems.append(f"Item {index} is not an object")
+                continue
+            for required in items_schema.get('required') or []:
+                if item.get(required) in (None, ''):
+                    problems.append(f"Item {index} is missing '{required}'")
+            for numeric in items_schema.get('numeric') or []:
+                if item.get(numeric) not in (None, '') and not _is_numeric(item[numeric]):
+                    problems.append(f"Item {index} '{numeric}' is not numeric: {item[numeric]!r}")
+
+    if len(problems) > _MAX_PROBLEMS:
+        problems = problems[:_MAX_PROBLEMS] + [f"... and {len(problems) - _MAX_PROBLEMS} more"]
+    return problems
@@ -74,6 +74,10 @@ async def list_jobs(
                 completion_tokens=row.ExtractionJob.completion_tokens,
                 total_tokens=row.ExtractionJob.total_tokens,
                 cached_tokens=row.ExtractionJob.cached_tokens,
+                escalation_count=row.ExtractionJob.escalation_count,
+                escalation_tokens=row.ExtractionJob.escalation_tokens,
+                continuation_count=row.ExtractionJob.continuation_count,
+                message_layout=row.ExtractionJob.message_layout,
                 model_used=row.ExtractionJob.model_used,
                 is_cached_result=row.ExtractionJob.is_cached_result
             )
@@ -135,6 +139,10 @@ async def get_job(
             completion_tokens=result.ExtractionJob.completion_tokens,
             total_tokens=result.ExtractionJob.total_tokens,
             cached_tokens=result.ExtractionJob.cached_tokens,
+            escalation_count=result.ExtractionJob.escalation_count,
+            escalation_tokens=result.ExtractionJob.escalation_tokens,
+            continuation_count=result.ExtractionJob.continuation_count,
+            message_layout=result.ExtractionJob.message_layout,
             model_used=result.ExtractionJob.model_used,
             is_cached_result=result.ExtractionJob.is_cached_result
         )
@@ -24,6 +24,10 @@ class ExtractionJobResponse(BaseModel):
     completion_tokens: Optional[int] = None
     total_tokens: Optional[int] = None
     cached_tokens: Optional[int] = None
+    escalation_count: int = 0
+    escalation_tokens: int = 0
+    continuation_count: int = 0
+    message_layout: Optional[str] = None
     model_used: Optional[str] = None
     is_cached_result: bool = False
 
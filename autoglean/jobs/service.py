@@ -15,16 +15,18 @@ def create_extraction_job(
     user_id: int,
     extractor_id: int,
     file_name: str,
-    file_path: str
+    file_path: str,
+    job_class: str = "interactive"
 ) -> ExtractionJob:
-    """Create a new extraction job record."""
+    """Create a new extraction job record (deferred jobs start out queued for batching)."""
     job = ExtractionJob(
         job_id=job_id,
         user_id=user_id,
         extractor_id=extractor_id,
         file_name=file_name,
         file_path=file_path,
-        status="pending"
+        status="queued" if job_class == "deferred" else "pending",
+        job_class=job_class
     )
     db.add(job)
     db.commit()
@@ -0,0 +1,365 @@
+"""Offline batch submission for deferred (non-urgent) extraction jobs.
+
+Deferred jobs are collected into one batch per provider and submitted to
+the provider's batch API, which is billed at a discount and answers within
+the provider's completion window instead of competing with interactive
+traffic for rate limits.
+
+Backends:
+- ``openai`` / ``azure`` / ``vertex_ai``: LiteLLM's OpenAI-compatible batch
+  API (JSONL input file, one ``/v1/chat/completions`` request per line).
+- ``local``: stand-in for providers without a supported batch API. The batch
+  is stored under storage/temp/batches and run on a worker through the
+  regular client, one request at a time, for up to ``local_run_seconds``
+  per poll; results are appended as they arrive, so the next poll carries
+  on where the last one stopped.
+
+Every backend maps the batch's ``custom_id`` (the job_id) to a result in the
+same shape as ``LLMClient.complete``, or to ``{'error': ...}``.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+from autoglean.llm.client import get_llm_client
+from autoglean.llm.payload import ImagePayload
+
+try:
+    import litellm
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_CHAT_ENDPOINT = "/v1/chat/completions"
+
+# Provider batch states that will not change any more
+_FAILED_STATES = {'failed', 'expired', 'cancelled', 'cancelling'}
+
+
+def get_batch_config() -> Dict[str, Any]:
+    """Get the ``batch`` section of llm.yaml."""
+    return get_config_loader().load_llm_config().get('batch', {}) or {}
+
+
+def new_batch_id() -> str:
+    """Generate an internal batch identifier."""
+    return f"batch_{uuid.uuid4().hex}"
+
+
+def _parse_completion_body(body: Dict[str, Any], model_name: str, provider: str) -> Dict[str, Any]:
+    """Convert a chat completion JSON body into the client's result dictionary."""
+    usage = body.get('usage') or {}
+    details = usage.get('prompt_tokens_details') or {}
+    choice = (body.get('choices') or [{}])[0]
+    return {
+        'content': (choice.get('message') or {}).get('content'),
+        'usage': {
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'total_tokens': usage.get('total_tokens'),
+            'cached_tokens': details.get('cached_tokens')
+        },
+        'model': model_name,
+        'provider': provider,
+        'finish_reason': choice.get('finish_reason')
+    }
+
+
+def _request_image(request: Dict[str, Any]) -> Optional[ImagePayload]:
+    """Image payload of a persisted batch request."""
+    return ImagePayload.from_data_url(request['image_url']) if request.get('image_url') else None
+
+
+class BatchBackend:
+    """Submit a list of requests as one batch and collect the results."""
+
+    name = 'base'
+
+    def submit(self, batch_id: str, provider_name: str, requests: List[Dict[str, Any]]) -> str:
+        """
+        Submit requests as a batch.
+
+        Args:
+            batch_id: Internal batch identifier
+            provider_name: Provider name from config
+            requests: Dicts with custom_id, messages, image_url (a ``data:``
+                URL or None), temperature and max_tokens
+
+        Returns:
+            Provider-side batch identifier
+        """
+        raise NotImplementedError
+
+    def poll(self, provider_batch_id: str, provider_name: str) -> str:
+        """
+        Check a submitted batch.
+
+        Returns:
+            'in_progress', 'completed' or 'failed'
+        """
+        raise NotImplementedError
+
+    def fetch_results(self, provider_batch_id: str, provider_name: str) -> Dict[str, Dict[str, Any]]:
+        """Get results of a completed batch, keyed by custom_id."""
+        raise NotImplementedError
+
+
+class LiteLLMBatchBackend(BatchBackend):
+    """Provider batch API through LiteLLM (OpenAI-compatible JSONL batches)."""
+
+    def __init__(self, custom_llm_provider: str):
+        if not LITELLM_AVAILABLE:
+            raise RuntimeError("LiteLLM not available for batch submission")
+        self.name = custom_llm_provider
+        self.llm_client = get_llm_client()
+
+    def _credentials(self, provider_name: str) -> Dict[str, Any]:
+        provider_config = self.llm_client.get_model_config(provider_name)
+        params = {'custom_llm_provider': self.name}
+        if provider_config.get('api_key'):
+            params['api_key'] = provider_config['api_key']
+        if provider_config.get('api_base'):
+            params['api_base'] = provider_config['api_base']
+        return params
+
+    def submit(self, batch_id: str, provider_name: str, requests: List[Dict[str, Any]]) -> str:
+        lines = []
+        for request in requests:
+            built = self.llm_client._build_request(
+                request['messages'],
+                provider_name,
+                _request_image(request),
+                temperature=request.get('temperature', 0.7),
+                max_tokens=request.get('max_tokens', 2000)
+            )
+            # Batch bodies name the deployment without LiteLLM's provider prefix
+            model_name = built['model_name'].split('/', 1)[-1]
+            lines.append(json.dumps({
+                'custom_id': request['custom_id'],
+                'method': 'POST',
+                'url': _CHAT_ENDPOINT,
+                'body': {
+                    'model': model_name,
+                    'messages': built['messages'],
+                    'temperature': built['params']['temperature'],
+                    'max_tokens': built['params']['max_tokens']
+                }
+            }, ensure_ascii=False))
+
+        credentials = self._credentials(provider_name)
+        input_file = litellm.create_file(
+            file=(f"{batch_id}.jsonl", '\n'.join(lines).encode('utf-8')),
+            purpose='batch',
+            **credentials
+        )
+        batch = litellm.create_batch(
+            completion_window=get_batch_config().get('completion_window', '24h'),
+            endpoint=_CHAT_ENDPOINT,
+            input_file_id=input_file.id,
+            metadata={'autoglean_batch_id': batch_id},
+            **credentials
+        )
+        logger.info(f"Submitted {len(requests)} requests to {self.name} batch {batch.id}")
+        return batch.id
+
+    def poll(self, provider_batch_id: str, provider_name: str) -> str:
+        batch = litellm.retrieve_batch(provider_batch_id, **self._credentials(provider_name))
+        if batch.status == 'completed':
+            return 'completed'
+        if batch.status in _FAILED_STATES:
+            return 'failed'
+        return 'in_progress'
+
+    def _read_jsonl(self, file_id: Optional[str], provider_name: str) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        content = litellm.file_content(file_id, **self._credentials(provider_name))
+        return [json.loads(line) for line in content.content.decode('utf-8').splitlines() if line.strip()]
+
+    def fetch_results(self, provider_batch_id: str, provider_name: str) -> Dict[str, Dict[str, Any]]:
+        batch = litellm.retrieve_batch(provider_batch_id, **self._credentials(provider_name))
+        provider_config = self.llm_client.get_model_config(provider_name)
+
+        results = {}
+        for line in self._read_jsonl(batch.output_file_id, provider_name) + self._read_jsonl(batch.error_file_id, provider_name):
+            response = line.get('response') or {}
+            if line.get('error') or response.get('status_code', 200) >= 400:
+                error = line.get('error') or (response.get('body') or {}).get('error')
+                results[line['custom_id']] = {'error': str(error)}
+                continue
+            results[line['custom_id']] = _parse_completion_body(
+                response.get('body') or {},
+                provider_config['model'],
+                provider_config['provider']
+            )
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """Run a batch on a worker through the regular client."""
+
+    name = 'local'
+
+    def __init__(self, base_dir: str = "storage/temp/batches"):
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.llm_client = get_llm_client()
+        batch_config = get_batch_config()
+        self.run_seconds = float(batch_config.get('local_run_seconds', 600))
+        self.lock_seconds = float(batch_config.get('local_lock_seconds', 900))
+
+    def _batch_dir(self, provider_batch_id: str) -> Path:
+        return self.base_dir / provider_batch_id
+
+    def submit(self, batch_id: str, provider_name: str, requests: List[Dict[str, Any]]) -> str:
+        batch_dir = self._batch_dir(batch_id)
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        with open(batch_dir / "requests.json", 'w', encoding='utf-8') as f:
+            json.dump({'provider_name': provider_name, 'requests': requests}, f, ensure_ascii=False)
+        logger.info(f"Queued {len(requests)} requests in local batch {batch_id}")
+        return batch_id
+
+    def poll(self, provider_batch_id: str, provider_name: str) -> str:
+        batch_dir = self._batch_dir(provider_batch_id)
+        if (batch_dir / "results.json").exists():
+            return 'completed'
+        if not (batch_dir / "requests.json").exists():
+            return 'failed'
+
+        # Only one worker runs a given batch at a time
+        owner = self._claim(batch_dir)
+        if owner is None:
+            return 'in_progress'
+        try:
+            finished = self._run(batch_dir, owner)
+        finally:
+            self._release(batch_dir, owner)
+        return 'completed' if finished else 'in_progress'
+
+    # === Lock ===
+
+    def _claim(self, batch_dir: Path) -> Optional[str]:
+        """
+        Take a batch's lock, returning the owner token (None if another worker holds it).
+
+        The holder touches the lock after every request; a lock left alone
+        for lock_seconds (its worker was killed) is taken over.
+        """
+        lock_path = batch_dir / "running"
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    age = time.time() - lock_path.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if age < self.lock_seconds:
+                    return None
+                logger.warning(f"Taking over stale lock of local batch {batch_dir.name} ({age:.0f}s old)")
+                lock_path.unlink(missing_ok=True)
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(owner)
+            return owner
+        return None
+
+    def _owns(self, batch_dir: Path, owner: str) -> bool:
+        try:
+            return (batch_dir / "running").read_text() == owner
+        except FileNotFoundError:
+            return False
+
+    def _release(self, batch_dir: Path, owner: str):
+        if self._owns(batch_dir, owner):
+            (batch_dir / "running").unlink(missing_ok=True)
+
+    # === Running ===
+
+    def _load_partial(self, partial_path: Path) -> Dict[str, Dict[str, Any]]:
+        """Results saved by earlier polls (a line cut off by a killed worker is ignored)."""
+        results = {}
+        if not partial_path.exists():
+            return results
+        with open(partial_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                results[entry['custom_id']] = entry['result']
+        return results
+
+    def _run(self, batch_dir: Path, owner: str) -> bool:
+        """Run a batch's outstanding requests for up to run_seconds; True once every request has a result."""
+        with open(batch_dir / "requests.json", 'r', encoding='utf-8') as f:
+            batch = json.load(f)
+
+        partial_path = batch_dir / "partial.jsonl"
+        results = self._load_partial(partial_path)
+        deadline = time.monotonic() + self.run_seconds
+        with open(partial_path, 'a', encoding='utf-8') as partial:
+            for request in batch['requests']:
+                if request['custom_id'] in results:
+                    continue
+                if time.monotonic() >= deadline or not self._owns(batch_dir, owner):
+                    logger.info(
+                        f"Local batch {batch_dir.name}: {len(results)}/{len(batch['requests'])} requests done, "
+                        f"continuing on the next poll"
+                    )
+                    return False
+                try:
+                    result = self.llm_client.complete(
+                        messages=request['messages'],
+                        model=batch['provider_name'],
+                        image=_request_image(request),
+                        temperature=request.get('temperature', 0.7),
+                        max_tokens=request.get('max_tokens', 2000)
+                    )
+                except Exception as e:
+                    logger.error(f"Local batch request {request['custom_id']} failed: {e}")
+                    result = {'error': str(e)}
+
+                results[request['custom_id']] = result
+                partial.write(json.dumps({'custom_id': request['custom_id'], 'result': result}, ensure_ascii=False) + '\n')
+                partial.flush()
+                # Heartbeat: the lock stays ours while requests keep finishing
+                try:
+                    os.utime(batch_dir / "running")
+                except FileNotFoundError:
+                    pass
+
+        tmp_path = batch_dir / "results.json.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False)
+        os.replace(tmp_path, batch_dir / "results.json")
+        return True
+
+    def fetch_results(self, provider_batch_id: str, provider_name: str) -> Dict[str, Dict[str, Any]]:
+        with open(self._batch_dir(provider_batch_id) / "results.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def get_batch_backend_name(provider_name: str) -> str:
+    """Resolve which batch backend serves a provider."""
+    batch_config = get_batch_config()
+    provider_config = get_config_loader().load_llm_config().get('providers', {}).get(provider_name, {})
+    backends = batch_config.get('backends') or {}
+    return backends.get(provider_config.get('provider'), batch_config.get('default_backend', 'local'))
+
+
+def get_batch_backend(name: str) -> BatchBackend:
+    """Create the batch backend with the given name."""
+    if name == 'local' or get_llm_client().mock_mode:
+        return LocalBatchBackend()
+    return LiteLLMBatchBackend(name)
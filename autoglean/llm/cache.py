@@ -0,0 +1,330 @@
+"""Content-addressed cache for LLM responses with memory, disk and Redis tiers."""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    model_name: str,
+    messages: List[Dict[str, Any]],
+    image_digest: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None
+) -> str:
+    """
+    Build a content-addressed key for an LLM request.
+
+    The key depends only on what the provider sees (the image by the
+    SHA-256 of its bytes), so the same scan uploaded under a different file
+    name maps to the same entry.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        'model': model_name,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens
+    }, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    if image_digest:
+        digest.update(b'\0image\0')
+        digest.update(image_digest.encode('ascii'))
+    return digest.hexdigest()
+
+
+class MemoryCacheTier:
+    """In-process LRU tier bounded by entry count."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry['value']
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int):
+        with self._lock:
+            self._entries[key] = {'value': value, 'expires_at': time.time() + ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCacheTier:
+    """
+    On-disk tier bounded by total size.
+
+    Entries are JSON files sharded by key prefix. Reads touch the file's
+    mtime so eviction removes the least recently used entries first.
+
+    The total size is kept as a running count, updated on every write and
+    removal; the directory is only scanned when the count goes over the
+    limit, or every ``rescan_seconds`` to pick up entries written by other
+    processes sharing the directory.
+    """
+
+    name = 'disk'
+
+    def __init__(self, path: str = "storage/cache/llm", max_size_mb: int = 512, rescan_seconds: float = 600.0):
+        self.path = Path(path)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.rescan_seconds = rescan_seconds
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._total: Optional[int] = None
+        self._scanned_at = 0.0
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if entry['expires_at'] < time.time():
+            self._remove(entry_path)
+            return None
+
+        os.utime(entry_path)
+        return entry['value']
+
+    def _remove(self, entry_path: Path):
+        try:
+            size = entry_path.stat().st_size
+            entry_path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._total is not None:
+                self._total -= size
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int):
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'value': value, 'expires_at': time.time() + ttl}, f, ensure_ascii=False)
+        size = tmp_path.stat().st_size
+        try:
+            replaced = entry_path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            if self._total is not None:
+                self._total += size - replaced
+            if (
+                self._total is not None
+                and self._total <= self.max_size_bytes
+                and time.monotonic() - self._scanned_at < self.rescan_seconds
+            ):
+                return
+            self._evict()
+
+    def _evict(self):
+        """Rescan the entries and remove the least recently used while over the size limit (lock held)."""
+        files = []
+        total = 0
+        for entry_path in self.path.glob("*/*.json"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry_path))
+            total += stat.st_size
+
+        if total > self.max_size_bytes:
+            # Down to 90% of the limit, so the next few writes do not rescan
+            target = self.max_size_bytes * 0.9
+            files.sort()
+            for _, size, entry_path in files:
+                entry_path.unlink(missing_ok=True)
+                total -= size
+                if total <= target:
+                    break
+
+        self._total = total
+        self._scanned_at = time.monotonic()
+
+    def clear(self):
+        for entry_path in self.path.glob("*/*.json"):
+            entry_path.unlink(missing_ok=True)
+        with self._lock:
+            self._total = 0
+
+
+class RedisCacheTier:
+    """
+    Shared tier in Redis.
+
+    Entries expire with the TTL; size-based eviction is left to the
+    server's ``maxmemory-policy`` (``allkeys-lru`` recommended).
+    """
+
+    name = 'redis'
+    _prefix = "autoglean:llmcache:"
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._prefix + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int):
+        self.client.setex(self._prefix + key, ttl, json.dumps(value, ensure_ascii=False))
+
+    def clear(self):
+        for cache_key in self.client.scan_iter(match=self._prefix + '*'):
+            self.client.delete(cache_key)
+
+
+class ResponseCache:
+    """
+    Tiered LLM response cache configured by the ``cache`` section of llm.yaml.
+
+    Lookups go through the tiers in order and backfill faster tiers on a hit.
+    Tier errors are logged and treated as misses so the cache can never fail
+    an extraction.
+    """
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        cache_config = config_loader.load_llm_config().get('cache', {})
+
+        self.enabled = bool(cache_config.get('enabled', False))
+        self.ttl = int(cache_config.get('ttl_seconds', 7 * 24 * 3600))
+        self.tiers = []
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+        self._tier_hits: Dict[str, int] = {}
+        self._lock = Lock()
+
+        if not self.enabled:
+            return
+
+        for tier_name in cache_config.get('tiers', ['memory']):
+            tier_config = cache_config.get(tier_name) or {}
+            if tier_name == 'memory':
+                self.tiers.append(MemoryCacheTier(tier_config.get('max_entries', 256)))
+            elif tier_name == 'disk':
+                self.tiers.append(DiskCacheTier(
+                    tier_config.get('path', "storage/cache/llm"),
+                    tier_config.get('max_size_mb', 512),
+                    tier_config.get('rescan_seconds', 600)
+                ))
+            elif tier_name == 'redis':
+                client = get_redis_client()
+                if client is not None:
+                    self.tiers.append(RedisCacheTier(client))
+                else:
+                    logger.warning("Redis cache tier configured but Redis is unavailable, skipping")
+            else:
+                logger.warning(f"Unknown LLM cache tier '{tier_name}', skipping")
+
+        logger.info(f"LLM response cache enabled: {[tier.name for tier in self.tiers]}")
+
+    def _count(self, stat: str, tier_name: Optional[str] = None):
+        with self._lock:
+            self._stats[stat] += 1
+            if tier_name:
+                self._tier_hits[tier_name] = self._tier_hits.get(tier_name, 0) + 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached response, backfilling faster tiers on a hit."""
+        if not self.tiers:
+            return None
+
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache {tier.name} read failed: {e}")
+                self._count('errors')
+                continue
+
+            if value is not None:
+                for faster_tier in self.tiers[:index]:
+                    try:
+                        faster_tier.set(key, value, self.ttl)
+                    except Exception as e:
+                        logger.warning(f"LLM cache {faster_tier.name} backfill failed: {e}")
+                self._count('hits', tier.name)
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a response in every tier."""
+        if not self.tiers:
+            return
+
+        for tier in self.tiers:
+            try:
+                tier.set(key, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"LLM cache {tier.name} write failed: {e}")
+                self._count('errors')
+        self._count('stores')
+
+    def clear(self):
+        """Remove all entries from every tier."""
+        for tier in self.tiers:
+            tier.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for this process."""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'enabled': self.enabled,
+                'tiers': [tier.name for tier in self.tiers],
+                **self._stats,
+                'hits_by_tier': dict(self._tier_hits),
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else None
+            }
+
+
+# Global instance
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get or create global response cache."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,194 @@
+"""Per-provider circuit breaker, shared across workers via Redis.
+
+After ``failure_threshold`` outage errors (overload or timeout) within
+``window_seconds`` the provider's circuit opens: calls fail immediately
+with CircuitOpenError, so callers fail over or reschedule instead of
+waiting on a dead endpoint. Once ``open_seconds`` have passed, a single
+probe call is let through (half-open). Its success closes the circuit and
+its failure re-opens it.
+"""
+
+import logging
+import time
+from threading import Lock
+from typing import Dict, Any, Optional
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+from autoglean.llm.errors import OUTAGE_KINDS, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "autoglean:circuit:"
+
+# Count a failure and open the circuit when the threshold is reached.
+# A failure while the circuit has been open (i.e. a failed probe) re-opens it.
+_FAILURE_SCRIPT = """
+local now_t = redis.call('TIME')
+local now = tonumber(now_t[1]) + tonumber(now_t[2]) / 1000000
+local threshold = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local open_seconds = tonumber(ARGV[3])
+
+local opened_until = tonumber(redis.call('HGET', KEYS[1], 'opened_until'))
+local failures = redis.call('INCR', KEYS[2])
+if failures == 1 then redis.call('EXPIRE', KEYS[2], window) end
+
+if opened_until or failures >= threshold then
+    redis.call('HSET', KEYS[1], 'opened_until', tostring(now + open_seconds))
+    redis.call('EXPIRE', KEYS[1], math.ceil(open_seconds * 10))
+    redis.call('DEL', KEYS[2], KEYS[3])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitBreaker:
+    """Open/half-open/closed state per provider."""
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        self.llm_config = config_loader.load_llm_config()
+        settings = (self.llm_config.get('settings', {}) or {}).get('circuit_breaker', {}) or {}
+        self.enabled = settings.get('enabled', True)
+        self.failure_threshold = int(settings.get('failure_threshold', 5))
+        self.window_seconds = int(settings.get('window_seconds', 60))
+        self.open_seconds = float(settings.get('open_seconds', 30))
+        self.probe_timeout = int(settings.get('probe_timeout', 60))
+
+        self.redis = get_redis_client()
+        self._script = self.redis.register_script(_FAILURE_SCRIPT) if self.redis else None
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._lock = Lock()
+
+    def _keys(self, provider_name: str):
+        base = f"{_KEY_PREFIX}{provider_name}"
+        return base, f"{base}:failures", f"{base}:probe"
+
+    # === Checks ===
+
+    def before_call(self, provider_name: str):
+        """
+        Raise CircuitOpenError if the provider should not be called now.
+
+        While half-open, only one caller (across all workers) gets through.
+        """
+        if not self.enabled:
+            return
+
+        state_key, _, probe_key = self._keys(provider_name)
+        now = time.time()
+
+        if self.redis is not None:
+            try:
+                opened_until = self.redis.hget(state_key, 'opened_until')
+                if opened_until is None:
+                    return
+                opened_until = float(opened_until)
+                if now >= opened_until and self.redis.set(probe_key, 1, nx=True, ex=self.probe_timeout):
+                    logger.info(f"Circuit for {provider_name} half-open, sending probe")
+                    return
+                raise CircuitOpenError(provider_name, max(1.0, opened_until - now), 'circuit_open')
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis circuit breaker unavailable ({e}), using in-memory state")
+
+        with self._lock:
+            state = self._states.get(provider_name)
+            if not state or 'opened_until' not in state:
+                return
+            if now >= state['opened_until'] and state.get('probe_until', 0) <= now:
+                state['probe_until'] = now + self.probe_timeout
+                logger.info(f"Circuit for {provider_name} half-open, sending probe")
+                return
+            raise CircuitOpenError(provider_name, max(1.0, state['opened_until'] - now), 'circuit_open')
+
+    # === Outcomes ===
+
+    def record_success(self, provider_name: str):
+        """Close the circuit (a successful probe or any successful call)."""
+        if not self.enabled:
+            return
+
+        if self.redis is not None:
+            try:
+                self.redis.delete(*self._keys(provider_name))
+                return
+            except Exception as e:
+                logger.warning(f"Redis circuit breaker unavailable ({e}), using in-memory state")
+
+        with self._lock:
+            self._states.pop(provider_name, None)
+
+    def record_failure(self, provider_name: str, kind: str):
+        """Count a failed call; only outage errors (overload, timeout) count."""
+        if not self.enabled or kind not in OUTAGE_KINDS:
+            return
+
+        opened = False
+        if self._script is not None:
+            try:
+                opened = bool(self._script(
+                    keys=list(self._keys(provider_name)),
+                    args=[self.failure_threshold, self.window_seconds, self.open_seconds]
+                ))
+            except Exception as e:
+                logger.warning(f"Redis circuit breaker unavailable ({e}), using in-memory state")
+                opened = self._record_failure_memory(provider_name)
+        else:
+            opened = self._record_failure_memory(provider_name)
+
+        if opened:
+            logger.warning(f"Circuit for {provider_name} opened for {self.open_seconds:.0f}s after {kind} errors")
+
+    def _record_failure_memory(self, provider_name: str) -> bool:
+        now = time.time()
+        with self._lock:
+            state = self._states.setdefault(provider_name, {'failures': []})
+            state['failures'] = [ts for ts in state['failures'] if ts > now - self.window_seconds] + [now]
+            if 'opened_until' in state or len(state['failures']) >= self.failure_threshold:
+                state['opened_until'] = now + self.open_seconds
+                state['failures'] = []
+                state.pop('probe_until', None)
+                return True
+            return False
+
+    def get_state(self, provider_name: str) -> Dict[str, Any]:
+        """Get the circuit state of a provider: closed, open or half_open."""
+        opened_until = None
+        if self.redis is not None:
+            try:
+                value = self.redis.hget(self._keys(provider_name)[0], 'opened_until')
+                opened_until = float(value) if value is not None else None
+            except Exception:
+                pass
+        else:
+            with self._lock:
+                opened_until = (self._states.get(provider_name) or {}).get('opened_until')
+
+        if opened_until is None:
+            state = 'closed'
+        elif time.time() < opened_until:
+            state = 'open'
+        else:
+            state = 'half_open'
+        return {
+            'provider': provider_name,
+            'state': state,
+            'retry_after': max(0.0, opened_until - time.time()) if state == 'open' else None,
+            'backend': 'redis' if self._script is not None else 'memory'
+        }
+
+
+# Global instance
+_circuit_breaker: Optional[CircuitBreaker] = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get or create global circuit breaker."""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
@@ -1,17 +1,38 @@
 """LLM client with LiteLLM integration for multimodal document extraction."""
 
+import asyncio
+import copy
 import logging
 import os
+import random
 import time
-import base64
-from typing import Dict, Any, List, Optional, Union
+import weakref
+from typing import Dict, Any, Iterator, List, Optional, Union
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 from autoglean.core.config import get_config_loader
+from autoglean.core.logging_config import should_log_payload
+from autoglean.llm.cache import get_response_cache, make_cache_key
+from autoglean.llm.circuit_breaker import get_circuit_breaker
+from autoglean.llm.context_cache import get_context_cache_manager
+from autoglean.llm.errors import ProviderUnavailableError, backoff_delay, classify_error
+from autoglean.llm.fallback import (
+    annotate_model_used,
+    get_fallback_chain,
+    get_fallback_config,
+    get_latency_tracker
+)
+from autoglean.llm.http_pool import get_http_pool
+from autoglean.llm.key_pool import KeyLease, get_key_pool
+from autoglean.llm.payload import ImagePayload, as_image_payload, document_message_index
+from autoglean.llm.rate_limiter import get_rate_limiter
+from autoglean.llm.simulator import get_simulated_provider
+from autoglean.llm.tokens import FittedInput, get_token_estimator
 
 # Import litellm
 try:
-    from litellm import completion
+    from litellm import completion, acompletion, stream_chunk_builder
     LITELLM_AVAILABLE = True
 except ImportError:
     LITELLM_AVAILABLE = False
@@ -29,16 +50,25 @@ class LLMClient:
         self.llm_config = config_loader.load_llm_config()
         self._setup_environment()
 
-        # Check if mock mode is enabled
+        # Check if mock mode is enabled: provider calls go to the simulator
         self.mock_mode = os.environ.get('LLM_MOCK_MODE', 'false').lower() == 'true'
+        self.simulator = get_simulated_provider() if self.mock_mode else None
         if self.mock_mode:
-            logger.warning("⚠️ LLM CLIENT RUNNING IN MOCK MODE")
+            logger.warning("⚠️ LLM CLIENT RUNNING IN MOCK MODE (simulated provider)")
 
         if not LITELLM_AVAILABLE and not self.mock_mode:
             logger.warning("LiteLLM not available")
 
+        # Per-event-loop provider semaphores for acomplete()
+        self._semaphores = weakref.WeakKeyDictionary()
+
     def _setup_environment(self):
-        """Setup API keys in environment for LiteLLM."""
+        """
+        Setup API keys in environment for LiteLLM.
+
+        These are only defaults: every call passes the key leased for it from
+        the provider's key pool (see llm.key_pool).
+        """
         providers = self.llm_config.get('providers', {})
         for provider_name, provider_config in providers.items():
             if 'api_key' in provider_config and provider_config['api_key']:
@@ -55,37 +85,47 @@ class LLMClient:
             raise ValueError(f"Provider '{provider_name}' not found in configuration")
         return providers[provider_name]
 
-    def _encode_image(self, image_path: Union[str, Path]) -> str:
-        """Encode image to base64."""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def _get_semaphore(self, provider_name: str) -> asyncio.Semaphore:
+        """
+        Get the concurrency semaphore for a provider on the running event loop.
 
-    def complete(
+        Limits come from ``max_concurrent_requests`` on the provider entry in
+        llm.yaml, falling back to ``settings.max_concurrent_requests``.
+        Semaphores are bound to an event loop, so one set is kept per loop.
+        """
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+        if provider_name not in semaphores:
+            provider_config = self.get_model_config(provider_name)
+            settings = self.llm_config.get('settings', {})
+            limit = provider_config.get(
+                'max_concurrent_requests',
+                settings.get('max_concurrent_requests', 10)
+            )
+            semaphores[provider_name] = asyncio.Semaphore(limit)
+            logger.debug(f"Concurrency limit for {provider_name}: {limit}")
+        return semaphores[provider_name]
+
+    def _build_request(
         self,
         messages: List[Dict[str, Any]],
-        model: str = "gemini-flash",
-        image_path: Optional[Union[str, Path]] = None,
+        model: str,
+        image: Optional[ImagePayload] = None,
+        api_key: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
-        Generate completion using LiteLLM with optional image.
+        Build the LiteLLM call for a provider.
 
-        Args:
-            messages: List of message dicts with 'role' and 'content'
-            model: Provider name from config
-            image_path: Optional path to image file for multimodal models
-            **kwargs: Additional parameters (temperature, max_tokens, etc.)
+        The caller's messages are not modified, so the same list can be
+        reused for retries and fallback providers. ``api_key`` (a key leased
+        from the provider's pool) replaces the configured key; explicit
+        context caches belong to the configured key and are not used with
+        other keys.
 
         Returns:
-            Dictionary with 'content', 'usage', and 'model'
+            Dictionary with 'model_name', 'provider', 'messages' and 'params'
         """
-        # Mock mode
-        if self.mock_mode:
-            return self._get_mock_response(messages, image_path)
-
-        if not LITELLM_AVAILABLE:
-            raise RuntimeError("LiteLLM is not installed")
-
         provider_config = self.get_model_config(model)
 
         # Build full model name for LiteLLM
@@ -93,20 +133,17 @@ class LLMClient:
         model_name = provider_config['model']
 
         # Handle image for multimodal models
-        if image_path and provider_config.get('supports_vision', False):
-            # Add image to the last user message
-            if messages and messages[-1]['role'] == 'user':
-                # Convert to multimodal format
-                content = messages[-1]['content']
-                messages[-1]['content'] = [
-                    {"type": "text", "text": content},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{self._encode_image(image_path)}"
-                        }
-                    }
-                ]
+        if image and provider_config.get('supports_vision', False):
+            # Add image to (a copy of) the message that carries the document
+            index = document_message_index(messages)
+            if index is not None:
+                messages = messages[:index] + [{
+                    **messages[index],
+                    'content': [
+                        {"type": "text", "text": messages[index]['content']},
+                        {"type": "image_url", "image_url": {"url": image.data_url}}
+                    ]
+                }] + messages[index + 1:]
 
         # Get global settings
         settings = self.llm_config.get('settings', {})
@@ -123,140 +160,707 @@ class LLMClient:
             params['api_base'] = provider_config['api_base']
 
         # Add API key if specified
-        if 'api_key' in provider_config and provider_config['api_key']:
-            params['api_key'] = provider_config['api_key']
+        api_key = api_key or provider_config.get('api_key')
+        if api_key:
+            params['api_key'] = api_key
+
+        # Serve the stable system prompt from the provider's context cache
+        if not self.mock_mode and api_key == provider_config.get('api_key'):
+            messages = get_context_cache_manager().apply(model, messages, params)
+
+        return {
+            'model_name': model_name,
+            'provider': provider,
+            'messages': messages,
+            'params': params
+        }
+
+    def _leased_request(
+        self,
+        requests: Dict[tuple, Dict[str, Any]],
+        lease: KeyLease,
+        fitted: FittedInput,
+        messages: List[Dict[str, Any]],
+        image: Optional[ImagePayload],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Request for a leased provider and key, built once per pair and reused by retries.
+
+        The input was fitted to the requested provider; a lease on an
+        equivalent provider gets the caller's input fitted to that
+        provider's own limit. The fit used is returned under 'fitted'.
+        """
+        pair = (lease.provider, lease.api_key)
+        if pair not in requests:
+            if lease.provider != fitted.provider_name:
+                fitted = self._fit(messages, lease.provider, image)
+            requests[pair] = {
+                **self._build_request(fitted.messages, lease.provider, fitted.image, lease.api_key, **kwargs),
+                'fitted': fitted
+            }
+        return requests[pair]
+
+    def _get_cache_key(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        image: Optional[ImagePayload] = None,
+        **kwargs
+    ) -> Optional[str]:
+        """Build the response cache key, or None when caching is disabled."""
+        if not get_response_cache().enabled:
+            return None
+
+        provider_config = self.get_model_config(model)
+        image_digest = image.digest if image and provider_config.get('supports_vision', False) else None
+
+        return make_cache_key(
+            provider_config['model'],
+            messages,
+            image_digest,
+            kwargs.get('temperature', 0.7),
+            kwargs.get('max_tokens', 2000)
+        )
+
+    def _get_cached_result(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a cached response with zero billed tokens, if there is one."""
+        if cache_key is None:
+            return None
+
+        cached = get_response_cache().get(cache_key)
+        if cached is None:
+            return None
+
+        logger.info(f"LLM cache hit for {cached['model']} ({cache_key[:12]})")
+        return {
+            **cached,
+            'usage': {
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'total_tokens': 0,
+                'cached_tokens': 0
+            },
+            'cache_hit': True
+        }
+
+    def _store_result(self, cache_key: Optional[str], result: Dict[str, Any]):
+        """Store a successful response in the cache."""
+        if cache_key is None or not result.get('content'):
+            return
+        get_response_cache().set(cache_key, copy.deepcopy(result))
+
+    def fit_input(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        image: Optional[ImagePayload] = None
+    ) -> FittedInput:
+        """
+        Estimate the prompt for a provider and fit it to its input limit.
+
+        Raises:
+            InputTooLargeError: If the input cannot fit (see llm.tokens)
+        """
+        return get_token_estimator().fit(model, messages, image)
+
+    def _fit(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        image: Optional[ImagePayload],
+        fitted: Optional[FittedInput] = None
+    ) -> FittedInput:
+        """
+        Fit a request to a provider, reusing a fit the caller already made.
+
+        Extractors fit each request to its primary provider before sending
+        it; passing that FittedInput on (``fitted=``) saves estimating and
+        downscaling again. It is only reused for the same provider, messages
+        and image.
+        """
+        if (
+            fitted is not None and fitted.provider_name == model
+            and fitted.messages is messages and fitted.image is image
+        ):
+            return fitted
+        return self.fit_input(messages, model, image)
+
+    def _parse_response(
+        self,
+        response: Any,
+        model_name: str,
+        provider: str,
+        latency: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Convert a LiteLLM response into the client's result dictionary."""
+        # Raw payloads are large; only a configurable sample is logged, at DEBUG
+        if logger.isEnabledFor(logging.DEBUG) and should_log_payload():
+            logger.debug(f"Raw LLM response from {model_name}", extra={'raw_response': str(response)})
+
+        # Extract cached tokens if available
+        cached_tokens = None
+        if hasattr(response.usage, 'prompt_tokens_details') and response.usage.prompt_tokens_details:
+            if hasattr(response.usage.prompt_tokens_details, 'cached_tokens'):
+                cached_tokens = response.usage.prompt_tokens_details.cached_tokens
+
+        result = {
+            'content': response.choices[0].message.content,
+            'usage': {
+                'prompt_tokens': response.usage.prompt_tokens,
+                'completion_tokens': response.usage.completion_tokens,
+                'total_tokens': response.usage.total_tokens,
+                'cached_tokens': cached_tokens
+            },
+            'model': model_name,
+            'provider': provider,
+            'finish_reason': getattr(response.choices[0], 'finish_reason', None)
+        }
+
+        content_length = len(str(result['content'])) if result['content'] else 0
+        logger.info(
+            f"LLM response: {result['usage']['total_tokens']} tokens, content_length: {content_length}",
+            extra={
+                'event': 'llm_call',
+                'model': model_name,
+                'provider': provider,
+                'latency_ms': round(latency * 1000) if latency is not None else None,
+                'finish_reason': result['finish_reason'],
+                'content_length': content_length,
+                **result['usage']
+            }
+        )
+        return result
+
+    def _completion(self, provider_name: str, **kwargs) -> Any:
+        """
+        Call the provider through LiteLLM, or the simulator in mock mode.
+
+        LiteLLM calls go over the process's pooled keep-alive connection
+        to the provider (see llm.http_pool).
+        """
+        if self.simulator is not None:
+            return self.simulator.completion(provider_name=provider_name, **kwargs)
+        client = get_http_pool().litellm_client(provider_name, api_key=kwargs.get('api_key'))
+        if client is not None:
+            kwargs['client'] = client
+        return completion(**kwargs)
+
+    async def _acompletion(self, provider_name: str, **kwargs) -> Any:
+        """Async version of _completion()."""
+        if self.simulator is not None:
+            return await self.simulator.acompletion(provider_name=provider_name, **kwargs)
+        client = get_http_pool().litellm_client(provider_name, is_async=True, api_key=kwargs.get('api_key'))
+        if client is not None:
+            kwargs['client'] = client
+        return await acompletion(**kwargs)
+
+    def _build_stream_response(self, chunks: List[Any], messages: List[Dict[str, Any]], model_name: str) -> Any:
+        """Assemble streamed chunks into a complete response."""
+        if self.simulator is not None:
+            return self.simulator.build_stream_response(chunks, model_name)
+        return stream_chunk_builder(chunks, messages=messages)
+
+    def _handle_failure(self, provider_name: str, error: Exception, attempt: int, max_retries: int) -> float:
+        """
+        Classify a failed call and decide what happens next.
+
+        Server hints (Retry-After, retryDelay) are honoured; otherwise the
+        wait is a jittered (exponential) backoff.
+
+        Returns:
+            Seconds to wait before the next attempt
+
+        Raises:
+            The original error if it is not retriable, or
+            ProviderUnavailableError if retries are exhausted or the wait
+            would exceed max_retry_delay (callers fail over or reschedule)
+        """
+        if isinstance(error, ProviderUnavailableError):
+            raise error
+
+        failure = classify_error(error)
+        get_circuit_breaker().record_failure(provider_name, failure.kind)
+        if not failure.retriable:
+            logger.error(f"LLM call to {provider_name} failed ({failure.kind}): {error}")
+            raise error
+
+        settings = self.llm_config.get('settings', {})
+        max_delay = float(settings.get('max_retry_delay', 30))
+        if failure.retry_after is not None:
+            # Small jitter so workers told the same hint do not return in lockstep
+            wait = failure.retry_after + random.uniform(0, min(1.0, failure.retry_after * 0.1))
+        else:
+            wait = backoff_delay(
+                attempt,
+                float(settings.get('retry_delay', 2)),
+                settings.get('exponential_backoff', True),
+                max_delay
+            )
+
+        if attempt >= max_retries - 1 or wait > max_delay:
+            logger.error(f"LLM call to {provider_name} failed ({failure.kind}), giving up: {error}")
+            raise ProviderUnavailableError(provider_name, wait, failure.kind, f"{provider_name} {failure.kind}: {error}") from error
+
+        logger.warning(
+            f"{failure.kind} from {provider_name}, retrying in {wait:.1f}s (attempt {attempt + 1}/{max_retries})",
+            extra={'event': 'llm_retry', 'model': provider_name, 'error_kind': failure.kind, 'retry_in': round(wait, 2)}
+        )
+        return wait
+
+    def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gemini-flash",
+        image: Optional[Union[str, Path, ImagePayload]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate completion using LiteLLM with optional image.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Provider name from config
+            image: Optional image (prepared payload or file path) for multimodal models
+            **kwargs: Additional parameters (temperature, max_tokens, etc.);
+                pass use_cache=False to bypass the response cache,
+                max_retries to override the configured retry count or
+                fitted (the FittedInput of these messages) to skip fitting
+
+        Returns:
+            Dictionary with 'content', 'usage', 'model' and 'finish_reason'
+            ('cache_hit' is True when served from the response cache with
+            zero tokens billed)
+        """
+        if not LITELLM_AVAILABLE and not self.mock_mode:
+            raise RuntimeError("LiteLLM is not installed")
+
+        # Encoded once and reused by every attempt
+        image = as_image_payload(image)
+
+        # Pre-flight: estimate the prompt and fit it to the provider's input limit
+        fitted = self._fit(messages, model, image, kwargs.pop('fitted', None))
+
+        # Content-addressed response cache (off by default in mock mode so
+        # load tests reach the simulated provider)
+        use_cache = kwargs.pop('use_cache', not self.mock_mode)
+        max_retries = kwargs.pop('max_retries', None)
+        cache_key = self._get_cache_key(fitted.messages, model, fitted.image, **kwargs) if use_cache else None
+        cached = self._get_cached_result(cache_key)
+        if cached:
+            return cached
+
+        # Each attempt leases a provider/key pair from the pool; the shared
+        # RPM/TPM budget and circuit state are those of the leased pair
+        key_pool = get_key_pool()
+        rate_limiter = get_rate_limiter()
+        circuit_breaker = get_circuit_breaker()
+        requests = {}
 
         # Retry logic
-        max_retries = settings.get('max_retries', 3)
-        retry_delay = settings.get('retry_delay', 2)
+        max_retries = max_retries or self.llm_config.get('settings', {}).get('max_retries', 3)
 
         for attempt in range(max_retries):
+            lease = key_pool.lease(model)
             try:
+                request = self._leased_request(requests, lease, fitted, messages, image, **kwargs)
+                model_name = request['model_name']
+                reserved_tokens = request['fitted'].estimated_tokens + request['params']['max_tokens']
+                circuit_breaker.before_call(lease.provider)
+                rate_limiter.acquire(lease.provider, lease.api_key, reserved_tokens)
                 logger.debug(f"Calling LLM: {model_name} (attempt {attempt + 1}/{max_retries})")
 
-                response = completion(
+                started = time.monotonic()
+                response = self._completion(
+                    lease.provider,
                     model=model_name,
-                    messages=messages,
-                    **params
+                    messages=request['messages'],
+                    **request['params']
                 )
+                latency = time.monotonic() - started
+                get_latency_tracker().record(lease.provider, latency)
+                result = self._parse_response(response, model_name, request['provider'], latency)
+                result['estimated_prompt_tokens'] = request['fitted'].estimated_tokens
+                rate_limiter.record_usage(lease.provider, lease.api_key, (result['usage']['total_tokens'] or 0) - reserved_tokens)
+                circuit_breaker.record_success(lease.provider)
+                key_pool.release(lease)
+                self._store_result(cache_key, result)
+                return result
+
+            except Exception as e:
+                key_pool.release(lease, e)
+                wait = self._handle_failure(lease.provider, e, attempt, max_retries)
+                # A throttled key does not hold up the call while another one has headroom
+                time.sleep(0 if key_pool.can_rotate(model, lease, e) else wait)
+
+    async def acomplete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gemini-flash",
+        image: Optional[Union[str, Path, ImagePayload]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Async version of complete() using LiteLLM's async completion.
+
+        Calls are bounded by the provider's concurrency semaphore, so a single
+        event loop can keep many extractions in flight without exceeding the
+        limits configured in llm.yaml. Retry waits do not hold a slot.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Provider name from config
+            image: Optional image (prepared payload or file path) for multimodal models
+            **kwargs: Additional parameters (temperature, max_tokens, etc.);
+                pass use_cache=False to bypass the response cache or
+                max_retries to override the configured retry count
 
-                # Debug: Log raw response
-                logger.info(f"=== RAW GEMINI RESPONSE ===")
-                logger.info(f"Response object type: {type(response)}")
-                logger.info(f"Response: {response}")
-                logger.info(f"Choices: {response.choices}")
-                logger.info(f"Message: {response.choices[0].message}")
-                logger.info(f"Content: {response.choices[0].message.content}")
-                logger.info(f"Content type: {type(response.choices[0].message.content)}")
-                logger.info(f"Content length: {len(str(response.choices[0].message.content)) if response.choices[0].message.content else 0}")
-                logger.info(f"=== END RAW RESPONSE ===")
-
-                # Extract cached tokens if available
-                cached_tokens = None
-                if hasattr(response.usage, 'prompt_tokens_details') and response.usage.prompt_tokens_details:
-                    if hasattr(response.usage.prompt_tokens_details, 'cached_tokens'):
-                        cached_tokens = response.usage.prompt_tokens_details.cached_tokens
-
-                result = {
-                    'content': response.choices[0].message.content,
-                    'usage': {
-                        'prompt_tokens': response.usage.prompt_tokens,
-                        'completion_tokens': response.usage.completion_tokens,
-                        'total_tokens': response.usage.total_tokens,
-                        'cached_tokens': cached_tokens
-                    },
-                    'model': model_name,
-                    'provider': provider
-                }
-
-                logger.info(f"LLM response: {result['usage']['total_tokens']} tokens, content_length: {len(str(result['content'])) if result['content'] else 0}")
+        Returns:
+            Dictionary with 'content', 'usage', and 'model'
+        """
+        if not LITELLM_AVAILABLE and not self.mock_mode:
+            raise RuntimeError("LiteLLM is not installed")
+
+        # Encoded once and reused by every attempt
+        image = await asyncio.to_thread(as_image_payload, image)
+
+        # Pre-flight: estimate the prompt and fit it to the provider's input limit
+        fitted = await asyncio.to_thread(self._fit, messages, model, image, kwargs.pop('fitted', None))
+
+        # Content-addressed response cache (off by default in mock mode so
+        # load tests reach the simulated provider)
+        use_cache = kwargs.pop('use_cache', not self.mock_mode)
+        max_retries = kwargs.pop('max_retries', None)
+        cache_key = None
+        if use_cache:
+            cache_key = await asyncio.to_thread(self._get_cache_key, fitted.messages, model, fitted.image, **kwargs)
+            cached = await asyncio.to_thread(self._get_cached_result, cache_key)
+            if cached:
+                return cached
+
+        semaphore = self._get_semaphore(model)
+
+        # Each attempt leases a provider/key pair from the pool; the shared
+        # RPM/TPM budget and circuit state are those of the leased pair
+        key_pool = get_key_pool()
+        rate_limiter = get_rate_limiter()
+        circuit_breaker = get_circuit_breaker()
+        requests = {}
+
+        # Retry logic
+        max_retries = max_retries or self.llm_config.get('settings', {}).get('max_retries', 3)
+
+        for attempt in range(max_retries):
+            lease = await asyncio.to_thread(key_pool.lease, model)
+            try:
+                request = await asyncio.to_thread(self._leased_request, requests, lease, fitted, messages, image, **kwargs)
+                model_name = request['model_name']
+                reserved_tokens = request['fitted'].estimated_tokens + request['params']['max_tokens']
+                await asyncio.to_thread(circuit_breaker.before_call, lease.provider)
+                await rate_limiter.aacquire(lease.provider, lease.api_key, reserved_tokens)
+                logger.debug(f"Calling LLM async: {model_name} (attempt {attempt + 1}/{max_retries})")
+
+                async with semaphore:
+                    started = time.monotonic()
+                    response = await self._acompletion(
+                        lease.provider,
+                        model=model_name,
+                        messages=request['messages'],
+                        **request['params']
+                    )
+                latency = time.monotonic() - started
+                get_latency_tracker().record(lease.provider, latency)
+                result = self._parse_response(response, model_name, request['provider'], latency)
+                result['estimated_prompt_tokens'] = request['fitted'].estimated_tokens
+                await asyncio.to_thread(
+                    rate_limiter.record_usage, lease.provider, lease.api_key,
+                    (result['usage']['total_tokens'] or 0) - reserved_tokens
+                )
+                await asyncio.to_thread(circuit_breaker.record_success, lease.provider)
+                await asyncio.to_thread(key_pool.release, lease)
+                await asyncio.to_thread(self._store_result, cache_key, result)
                 return result
 
             except Exception as e:
-                error_str = str(e).lower()
-                is_quota_error = 'quota' in error_str or 'rate limit' in error_str
+                await asyncio.to_thread(key_pool.release, lease, e)
+                wait_time = await asyncio.to_thread(self._handle_failure, lease.provider, e, attempt, max_retries)
+                # A throttled key does not hold up the call while another one has headroom
+                if await asyncio.to_thread(key_pool.can_rotate, model, lease, e):
+                    wait_time = 0
+                await asyncio.sleep(wait_time)
+
+    def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gemini-flash",
+        image: Optional[Union[str, Path, ImagePayload]] = None,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generate completion, yielding content as it arrives.
 
-                if is_quota_error and attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    logger.warning(f"Quota error, retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"LLM completion failed: {e}")
+        Retries only happen before the first chunk has been yielded, so
+        consumers never see duplicated text.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Provider name from config
+            image: Optional image (prepared payload or file path) for multimodal models
+            **kwargs: Same as complete()
+
+        Yields:
+            {'type': 'delta', 'content': str} for each piece of text, then
+            {'type': 'done', 'result': dict} with what complete() would return
+        """
+        if not LITELLM_AVAILABLE and not self.mock_mode:
+            raise RuntimeError("LiteLLM is not installed")
+
+        # Encoded once and reused by every attempt
+        image = as_image_payload(image)
+
+        # Pre-flight: estimate the prompt and fit it to the provider's input limit
+        fitted = self._fit(messages, model, image, kwargs.pop('fitted', None))
+
+        # Content-addressed response cache (off by default in mock mode so
+        # load tests reach the simulated provider)
+        use_cache = kwargs.pop('use_cache', not self.mock_mode)
+        max_retries = kwargs.pop('max_retries', None)
+        cache_key = self._get_cache_key(fitted.messages, model, fitted.image, **kwargs) if use_cache else None
+        cached = self._get_cached_result(cache_key)
+        if cached:
+            yield {'type': 'delta', 'content': cached['content']}
+            yield {'type': 'done', 'result': cached}
+            return
+
+        # Each attempt leases a provider/key pair from the pool; the shared
+        # RPM/TPM budget and circuit state are those of the leased pair
+        key_pool = get_key_pool()
+        rate_limiter = get_rate_limiter()
+        circuit_breaker = get_circuit_breaker()
+        requests = {}
+
+        # Retry logic
+        max_retries = max_retries or self.llm_config.get('settings', {}).get('max_retries', 3)
+
+        for attempt in range(max_retries):
+            emitted = False
+            lease = key_pool.lease(model)
+            try:
+                request = self._leased_request(requests, lease, fitted, messages, image, **kwargs)
+                model_name = request['model_name']
+                reserved_tokens = request['fitted'].estimated_tokens + request['params']['max_tokens']
+                circuit_breaker.before_call(lease.provider)
+                rate_limiter.acquire(lease.provider, lease.api_key, reserved_tokens)
+                logger.debug(f"Streaming LLM: {model_name} (attempt {attempt + 1}/{max_retries})")
+
+                started = time.monotonic()
+                chunks = []
+                for chunk in self._completion(
+                    lease.provider,
+                    model=model_name,
+                    messages=request['messages'],
+                    stream=True,
+                    stream_options={'include_usage': True},
+                    **request['params']
+                ):
+                    chunks.append(chunk)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if not emitted:
+                            logger.info(f"First content from {model_name} after {time.monotonic() - started:.2f}s")
+                        emitted = True
+                        yield {'type': 'delta', 'content': delta}
+                latency = time.monotonic() - started
+                get_latency_tracker().record(lease.provider, latency)
+
+                response = self._build_stream_response(chunks, request['messages'], model_name)
+                result = self._parse_response(response, model_name, request['provider'], latency)
+                result['estimated_prompt_tokens'] = request['fitted'].estimated_tokens
+                rate_limiter.record_usage(lease.provider, lease.api_key, (result['usage']['total_tokens'] or 0) - reserved_tokens)
+                circuit_breaker.record_success(lease.provider)
+                key_pool.release(lease)
+                self._store_result(cache_key, result)
+                yield {'type': 'done', 'result': result}
+                return
+
+            except Exception as e:
+                key_pool.release(lease, e)
+                if emitted:
+                    # Content already went out; a retry would duplicate it
+                    get_circuit_breaker().record_failure(lease.provider, classify_error(e).kind)
+                    logger.error(f"LLM streaming failed: {e}")
                     raise
+                wait = self._handle_failure(lease.provider, e, attempt, max_retries)
+                time.sleep(0 if key_pool.can_rotate(model, lease, e) else wait)
+
+    def _use_hedging(self, hedge: Optional[bool]) -> bool:
+        """Resolve whether to hedge: explicit argument, else llm.yaml default."""
+        if hedge is not None:
+            return hedge
+        return bool((get_fallback_config().get('hedging') or {}).get('enabled', False))
 
-    def _get_mock_response(
+    def complete_with_fallback(
         self,
         messages: List[Dict[str, Any]],
-        image_path: Optional[Union[str, Path]] = None
+        models: List[str],
+        image: Optional[Union[str, Path, ImagePayload]] = None,
+        hedge: Optional[bool] = None,
+        **kwargs
     ) -> Dict[str, Any]:
-        """Generate mock response for testing."""
-        user_msg = messages[-1]['content'] if messages else ''
-        if isinstance(user_msg, list):
-            user_msg = ' '.join([
-                item.get('text', '') for item in user_msg if item.get('type') == 'text'
-            ])
-
-        user_msg_lower = user_msg.lower()
-
-        # Generate mock markdown response based on content
-        if 'coordinate' in user_msg_lower or 'location' in user_msg_lower:
-            mock_content = """# Extracted Coordinates
-
-| Location | Latitude | Longitude | Context |
-|----------|----------|-----------|---------|
-| City Center | 40.7128 | -74.0060 | Main office location |
-| Warehouse | 40.7589 | -73.9851 | Distribution center |
-
-**Note:** This is mock data for testing purposes.
-"""
-        elif 'date' in user_msg_lower:
-            mock_content = """# Extracted Dates
-
-| Original Format | ISO Format | Context |
-|-----------------|------------|---------|
-| Jan 15, 2024 | 2024-01-15 | Contract signing date |
-| 2024/03/20 | 2024-03-20 | Project deadline |
-| March 1st | 2024-03-01 | Meeting date |
-
-**Note:** This is mock data for testing purposes.
-"""
-        elif 'entit' in user_msg_lower or 'compan' in user_msg_lower:
-            mock_content = """# Extracted Entities
-
-## Companies
-- **Acme Corporation** - Technology company
-- **Global Industries Inc.** - Manufacturing organization
-
-## Organizations
-- **Tech Alliance** - Industry consortium
-- **Innovation Hub** - Research institution
-
-**Note:** This is mock data for testing purposes.
-"""
-        else:
-            mock_content = """# Extraction Results
+        """
+        Generate completion, failing over along a provider chain.
 
-The document has been processed and analyzed.
+        Each provider gets ``retries_before_fallback`` attempts before the next
+        one is tried. With hedging enabled, if the current provider has not
+        answered within its observed p95 latency, the next provider is called
+        in parallel and the first successful answer wins. The serving
+        provider is recorded in the result's 'model' and in 'routing'.
 
-## Key Information
-- Sample data point 1
-- Sample data point 2
-- Sample data point 3
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            models: Provider names in priority order (see get_fallback_chain)
+            image: Optional image (prepared payload or file path) for multimodal models
+            hedge: Override the hedging.enabled setting from llm.yaml
+            **kwargs: Additional parameters passed to complete()
 
-**Note:** This is mock data for testing purposes.
-"""
+        Returns:
+            Dictionary with 'content', 'usage', 'model' and 'routing'
+        """
+        if not models:
+            raise ValueError("At least one model is required")
+
+        hedge = self._use_hedging(hedge)
+        image = as_image_payload(image)
+        kwargs.setdefault('max_retries', get_fallback_config().get('retries_before_fallback') if len(models) > 1 else None)
+        latency_tracker = get_latency_tracker()
+        errors: List[str] = []
+        last_error: Optional[Exception] = None
+        hedged = False
+
+        # Requests abandoned by hedging finish in the background; their
+        # results still land in the response cache.
+        executor = ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="llm-fallback")
+        pending: Dict[Any, str] = {}
+        next_index = 0
+
+        def submit_next():
+            nonlocal next_index
+            provider_name = models[next_index]
+            next_index += 1
+            future = executor.submit(self.complete, messages, provider_name, image, **kwargs)
+            pending[future] = provider_name
+
+        try:
+            submit_next()
+            while pending:
+                timeout = None
+                if hedge and len(pending) == 1 and next_index < len(models):
+                    timeout = latency_tracker.get_hedge_delay(next(iter(pending.values())))
+
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging: {next(iter(pending.values()))} slower than {timeout:.1f}s, also trying {models[next_index]}")
+                    hedged = True
+                    submit_next()
+                    continue
 
-        return {
-            'content': mock_content,
-            'usage': {
-                'prompt_tokens': 100,
-                'completion_tokens': 150,
-                'total_tokens': 250
-            },
-            'model': 'mock-model',
-            'provider': 'mock'
-        }
+                for future in done:
+                    provider_name = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"Provider {provider_name} failed: {e}")
+                        errors.append(f"{provider_name}: {e}")
+                        last_error = e
+                        if not pending and next_index < len(models):
+                            submit_next()
+                        continue
+
+                    result['routing'] = {
+                        'primary': models[0],
+                        'served_by': provider_name,
+                        'hedged': hedged,
+                        'errors': errors
+                    }
+                    return annotate_model_used(result, models[0], provider_name, hedged)
+        finally:
+            executor.shutdown(wait=False)
+
+        logger.error(f"All providers failed: {errors}")
+        raise last_error
+
+    async def acomplete_with_fallback(
+        self,
+        messages: List[Dict[str, Any]],
+        models: List[str],
+        image: Optional[Union[str, Path, ImagePayload]] = None,
+        hedge: Optional[bool] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async version of complete_with_fallback(); losing hedged calls are cancelled."""
+        if not models:
+            raise ValueError("At least one model is required")
+
+        hedge = self._use_hedging(hedge)
+        image = await asyncio.to_thread(as_image_payload, image)
+        kwargs.setdefault('max_retries', get_fallback_config().get('retries_before_fallback') if len(models) > 1 else None)
+        latency_tracker = get_latency_tracker()
+        errors: List[str] = []
+        last_error: Optional[Exception] = None
+        hedged = False
+        pending: Dict[asyncio.Task, str] = {}
+        next_index = 0
+
+        def submit_next():
+            nonlocal next_index
+            provider_name = models[next_index]
+            next_index += 1
+            task = asyncio.create_task(self.acomplete(messages, provider_name, image, **kwargs))
+            pending[task] = provider_name
+
+        try:
+            submit_next()
+            while pending:
+                timeout = None
+                if hedge and len(pending) == 1 and next_index < len(models):
+                    timeout = latency_tracker.get_hedge_delay(next(iter(pending.values())))
+
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging: {next(iter(pending.values()))} slower than {timeout:.1f}s, also trying {models[next_index]}")
+                    hedged = True
+                    submit_next()
+                    continue
+
+                for task in done:
+                    provider_name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"Provider {provider_name} failed: {e}")
+                        errors.append(f"{provider_name}: {e}")
+                        last_error = e
+                        if not pending and next_index < len(models):
+                            submit_next()
+                        continue
+
+                    result['routing'] = {
+                        'primary': models[0],
+                        'served_by': provider_name,
+                        'hedged': hedged,
+                        'errors': errors
+                    }
+                    return annotate_model_used(result, models[0], provider_name, hedged)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        logger.error(f"All providers failed: {errors}")
+        raise last_error
+
+    def get_fallback_chain(self, model: str, extractor_id: Optional[str] = None) -> List[str]:
+        """Get the provider chain for a model/extractor (see llm.fallback)."""
+        return get_fallback_chain(model, extractor_id)
 
 
 # Global instance
@@ -0,0 +1,319 @@
+"""Explicit provider-side context caches for long, stable extractor prompts.
+
+Extractor prompts are identical for every job, so the provider can keep
+them as cached context and bill/process them at the cached-token rate.
+
+- Gemini: a ``cachedContents`` resource holding the system instruction is
+  created per (model, prompt hash), reused via LiteLLM's ``cached_content``
+  parameter, has its TTL refreshed before it expires, and is deleted when
+  the prompt changes. Creation and refresh run in a background thread over
+  the provider's pooled HTTP client, so a request never waits for them:
+  the first requests for a prompt go uncached until the cache exists.
+  Gemini only caches contexts of at least ``min_tokens`` (1024 tokens on
+  2.5 Flash, 4096 on Pro); shorter prompts are sent as they are.
+- Anthropic: the system prompt is marked with ``cache_control`` so the
+  provider's prompt cache is used.
+- Other providers rely on implicit prefix caching, which works because the
+  extractor prompt is always sent first (see DocumentExtractor).
+
+Cache names are shared across workers through Redis.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from threading import Lock, Thread
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+from autoglean.llm.http_pool import get_http_pool
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+_REGISTRY_PREFIX = "autoglean:ctxcache:"
+
+
+def prompt_hash(prompt: str) -> str:
+    """Stable hash of an extractor prompt."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class ContextCacheManager:
+    """Create, reuse, refresh and invalidate provider context caches."""
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        self.llm_config = config_loader.load_llm_config()
+        self.redis = get_redis_client()
+        self._registry: Dict[str, Dict[str, Any]] = {}
+        self._pending = set()
+        self._too_short = set()
+        self._lock = Lock()
+
+    def _get_settings(self, provider_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get context cache settings for a provider, or None if disabled."""
+        settings = provider_config.get('context_cache')
+        if not settings:
+            return None
+        if settings is True:
+            settings = {}
+        defaults = self.llm_config.get('settings', {}).get('context_cache', {}) or {}
+        return {**defaults, **settings}
+
+    # === Registry (Redis with in-memory fallback) ===
+
+    def _registry_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(_REGISTRY_PREFIX + key)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Context cache registry read failed: {e}")
+        with self._lock:
+            return self._registry.get(key)
+
+    def _registry_set(self, key: str, entry: Dict[str, Any]):
+        ttl = max(1, int(entry['expires_at'] - time.time()))
+        if self.redis is not None:
+            try:
+                self.redis.setex(_REGISTRY_PREFIX + key, ttl, json.dumps(entry))
+                self.redis.sadd(f"{_REGISTRY_PREFIX}prompt:{entry['prompt_hash']}", key)
+                return
+            except Exception as e:
+                logger.warning(f"Context cache registry write failed: {e}")
+        with self._lock:
+            self._registry[key] = entry
+
+    def _registry_keys_for_prompt(self, hash_value: str) -> List[str]:
+        if self.redis is not None:
+            try:
+                return [key.decode('utf-8') for key in self.redis.smembers(f"{_REGISTRY_PREFIX}prompt:{hash_value}")]
+            except Exception as e:
+                logger.warning(f"Context cache registry read failed: {e}")
+        with self._lock:
+            return [key for key, entry in self._registry.items() if entry['prompt_hash'] == hash_value]
+
+    def _registry_delete(self, key: str, hash_value: str):
+        if self.redis is not None:
+            try:
+                self.redis.delete(_REGISTRY_PREFIX + key)
+                self.redis.srem(f"{_REGISTRY_PREFIX}prompt:{hash_value}", key)
+            except Exception as e:
+                logger.warning(f"Context cache registry delete failed: {e}")
+        with self._lock:
+            self._registry.pop(key, None)
+
+    def _acquire_create_lock(self, key: str) -> bool:
+        """Only one worker creates a given cache; others go uncached meanwhile."""
+        if self.redis is None:
+            return True
+        try:
+            return bool(self.redis.set(f"{_REGISTRY_PREFIX}{key}:lock", 1, nx=True, ex=30))
+        except Exception:
+            return True
+
+    # === Gemini cachedContents API ===
+
+    def _gemini_model(self, model_name: str) -> str:
+        return "models/" + model_name.split('/', 1)[-1]
+
+    def _timeout(self) -> float:
+        return float((self.llm_config.get('settings', {}).get('context_cache', {}) or {}).get('timeout_seconds', 10))
+
+    def _gemini_create(
+        self,
+        provider_name: str,
+        model_name: str,
+        api_key: str,
+        system_prompt: str,
+        ttl: int,
+        display_name: str
+    ) -> Dict[str, Any]:
+        response = get_http_pool().get_client(provider_name).post(
+            f"{GEMINI_API_BASE}/cachedContents",
+            params={'key': api_key},
+            json={
+                'model': self._gemini_model(model_name),
+                'displayName': display_name,
+                'systemInstruction': {'parts': [{'text': system_prompt}]},
+                'ttl': f"{ttl}s"
+            },
+            timeout=self._timeout()
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _gemini_refresh(self, provider_name: str, name: str, api_key: str, ttl: int):
+        response = get_http_pool().get_client(provider_name).patch(
+            f"{GEMINI_API_BASE}/{name}",
+            params={'key': api_key, 'updateMask': 'ttl'},
+            json={'ttl': f"{ttl}s"},
+            timeout=self._timeout()
+        )
+        response.raise_for_status()
+
+    def _gemini_delete(self, provider_name: str, name: str, api_key: str):
+        response = get_http_pool().get_client(provider_name).delete(
+            f"{GEMINI_API_BASE}/{name}",
+            params={'key': api_key},
+            timeout=self._timeout()
+        )
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def _in_background(self, key: str, work):
+        """Run a cache creation or refresh off the request path (once per key at a time)."""
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        def run():
+            try:
+                work()
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        Thread(target=run, name="context-cache", daemon=True).start()
+
+    # === Public API ===
+
+    def get_cached_content(self, provider_name: str, system_prompt: str) -> Optional[str]:
+        """
+        Get a Gemini cached content name, starting its creation or refresh if due.
+
+        Args:
+            provider_name: Provider name from config
+            system_prompt: The stable system instruction to cache
+
+        Returns:
+            The ``cachedContents/...`` name, or None if caching does not apply
+            or the cache is still being created
+        """
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        settings = self._get_settings(provider_config)
+        if not settings or provider_config.get('provider') != 'gemini' or not provider_config.get('api_key'):
+            return None
+
+        model_name = provider_config['model']
+        hash_value = prompt_hash(system_prompt)
+        key = f"{model_name}:{hash_value}"
+
+        # Gemini rejects caches below a minimum size (~4 chars per token)
+        min_tokens = settings.get('min_tokens', 1024)
+        if len(system_prompt) // 4 < min_tokens:
+            if key not in self._too_short:
+                self._too_short.add(key)
+                logger.info(
+                    f"Prompt of ~{len(system_prompt) // 4} tokens is below the {min_tokens}-token "
+                    f"context cache minimum of {provider_name}, sending it uncached"
+                )
+            return None
+
+        api_key = provider_config['api_key']
+        ttl = int(settings.get('ttl_seconds', 3600))
+        entry = self._registry_get(key)
+        now = time.time()
+
+        if entry and entry['expires_at'] > now:
+            if entry['expires_at'] - now < settings.get('refresh_before_seconds', 300):
+                def refresh():
+                    try:
+                        self._gemini_refresh(provider_name, entry['name'], api_key, ttl)
+                        self._registry_set(key, {**entry, 'expires_at': time.time() + ttl})
+                        logger.info(f"Refreshed context cache {entry['name']} for {provider_name}")
+                    except Exception as e:
+                        # Caching is an optimisation; the next request recreates it
+                        logger.warning(f"Failed to refresh context cache {entry['name']} for {provider_name}: {e}")
+                        self._registry_delete(key, hash_value)
+
+                self._in_background(key, refresh)
+            return entry['name']
+
+        def create():
+            if not self._acquire_create_lock(key):
+                return
+            try:
+                created = self._gemini_create(
+                    provider_name, model_name, api_key, system_prompt, ttl, f"autoglean-{hash_value[:12]}"
+                )
+            except Exception as e:
+                logger.warning(f"Context cache unavailable for {provider_name}: {e}")
+                return
+            self._registry_set(key, {
+                'name': created['name'],
+                'prompt_hash': hash_value,
+                'provider': provider_name,
+                'expires_at': time.time() + ttl
+            })
+            logger.info(f"Created context cache {created['name']} for {provider_name}")
+
+        # This request goes uncached; later ones use the cache once it exists
+        self._in_background(key, create)
+        return None
+
+    def apply(self, provider_name: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Apply context caching to a request.
+
+        Returns:
+            Messages to send (the cached system message is removed for Gemini,
+            which does not accept a system instruction alongside cached content)
+        """
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        if not self._get_settings(provider_config):
+            return messages
+        if not messages or messages[0]['role'] != 'system' or not isinstance(messages[0]['content'], str):
+            return messages
+
+        system_prompt = messages[0]['content']
+        provider = provider_config.get('provider')
+
+        if provider == 'gemini':
+            cached_content = self.get_cached_content(provider_name, system_prompt)
+            if cached_content:
+                params['cached_content'] = cached_content
+                return messages[1:]
+        elif provider == 'anthropic':
+            return [{
+                'role': 'system',
+                'content': [{
+                    'type': 'text',
+                    'text': system_prompt,
+                    'cache_control': {'type': 'ephemeral'}
+                }]
+            }] + messages[1:]
+
+        return messages
+
+    def invalidate_prompt(self, prompt: str):
+        """Delete every provider cache created for a prompt (e.g. after it was edited)."""
+        hash_value = prompt_hash(prompt)
+        providers = self.llm_config.get('providers', {})
+        for key in self._registry_keys_for_prompt(hash_value):
+            entry = self._registry_get(key)
+            if entry:
+                api_key = providers.get(entry['provider'], {}).get('api_key')
+                try:
+                    self._gemini_delete(entry['provider'], entry['name'], api_key)
+                    logger.info(f"Deleted context cache {entry['name']}")
+                except Exception as e:
+                    logger.warning(f"Failed to delete context cache {entry['name']}: {e}")
+            self._registry_delete(key, hash_value)
+
+
+# Global instance
+_context_cache_manager: Optional[ContextCacheManager] = None
+
+
+def get_context_cache_manager() -> ContextCacheManager:
+    """Get or create global context cache manager."""
+    global _context_cache_manager
+    if _context_cache_manager is None:
+        _context_cache_manager = ContextCacheManager()
+    return _context_cache_manager
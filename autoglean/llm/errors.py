@@ -0,0 +1,183 @@
+"""Classification of provider errors and retry timing."""
+
+import email.utils
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    import litellm
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Error kinds
+RATE_LIMIT = 'rate_limit'
+OVERLOADED = 'overloaded'
+TIMEOUT = 'timeout'
+BAD_REQUEST = 'bad_request'
+AUTH = 'auth'
+UNKNOWN = 'unknown'
+
+# Kinds worth another attempt against the same provider
+RETRIABLE_KINDS = {RATE_LIMIT, OVERLOADED, TIMEOUT}
+
+# Kinds that indicate the provider itself is unhealthy (circuit breaker input)
+OUTAGE_KINDS = {OVERLOADED, TIMEOUT}
+
+# e.g. Gemini: "retryDelay": "17s", OpenAI: "Please try again in 6.5s"
+_RETRY_HINT_PATTERNS = (
+    re.compile(r'retry_?delay"?\s*[:=]\s*"?(\d+(?:\.\d+)?)s', re.IGNORECASE),
+    re.compile(r'(?:try|retry) again in (\d+(?:\.\d+)?)\s*(ms|s)', re.IGNORECASE),
+)
+
+
+class ProviderUnavailableError(Exception):
+    """A provider cannot serve requests for now (circuit open or long backoff)."""
+
+    def __init__(self, provider_name: str, retry_after: float, kind: str, message: str = ''):
+        super().__init__(message or f"Provider {provider_name} unavailable ({kind}), retry after {retry_after:.0f}s")
+        self.provider_name = provider_name
+        self.retry_after = retry_after
+        self.kind = kind
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """The provider's circuit breaker is open; the call was not attempted."""
+
+
+@dataclass
+class ProviderError:
+    """Structured view of a failed provider call."""
+
+    kind: str
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+
+    @property
+    def retriable(self) -> bool:
+        return self.kind in RETRIABLE_KINDS
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attr in ('status_code', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def _parse_retry_after_header(value: str) -> Optional[float]:
+    """Retry-After is either seconds or an HTTP date."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Extract a server retry hint from headers, attributes or the error text."""
+    explicit = getattr(error, 'retry_after', None)
+    if isinstance(explicit, (int, float)):
+        return float(explicit)
+
+    headers: Dict[str, Any] = {}
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'headers', None) is not None:
+        headers = response.headers
+    elif isinstance(getattr(error, 'headers', None), dict):
+        headers = error.headers
+
+    if headers:
+        if headers.get('retry-after-ms'):
+            try:
+                return float(headers['retry-after-ms']) / 1000
+            except ValueError:
+                pass
+        if headers.get('retry-after'):
+            parsed = _parse_retry_after_header(headers['retry-after'])
+            if parsed is not None:
+                return parsed
+
+    text = str(error)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            value = float(match.group(1))
+            unit = match.group(2) if pattern.groups > 1 else 's'
+            return value / 1000 if unit == 'ms' else value
+    return None
+
+
+def classify_error(error: Exception) -> ProviderError:
+    """
+    Classify a provider error by exception type, then status code, then text.
+
+    Args:
+        error: Exception raised by LiteLLM (or the simulated provider)
+
+    Returns:
+        ProviderError with kind, status code and any server retry hint
+    """
+    status_code = _status_code(error)
+    retry_after = _retry_after(error)
+
+    kind = None
+    if LITELLM_AVAILABLE:
+        if isinstance(error, litellm.RateLimitError):
+            kind = RATE_LIMIT
+        elif isinstance(error, (litellm.Timeout, litellm.APIConnectionError)):
+            kind = TIMEOUT
+        elif isinstance(error, (litellm.ServiceUnavailableError, litellm.InternalServerError)):
+            kind = OVERLOADED
+        elif isinstance(error, (litellm.AuthenticationError, litellm.PermissionDeniedError)):
+            kind = AUTH
+        elif isinstance(error, (litellm.BadRequestError, litellm.NotFoundError, litellm.UnprocessableEntityError)):
+            kind = BAD_REQUEST
+
+    if kind is None and status_code is not None:
+        if status_code == 429:
+            kind = RATE_LIMIT
+        elif status_code in (408, 504):
+            kind = TIMEOUT
+        elif status_code >= 500:
+            kind = OVERLOADED
+        elif status_code in (401, 403):
+            kind = AUTH
+        elif status_code >= 400:
+            kind = BAD_REQUEST
+
+    if kind is None:
+        text = str(error).lower()
+        if isinstance(error, TimeoutError) or 'timed out' in text or 'timeout' in text:
+            kind = TIMEOUT
+        elif 'quota' in text or 'rate limit' in text or 'resource_exhausted' in text:
+            kind = RATE_LIMIT
+        elif 'overloaded' in text or 'unavailable' in text:
+            kind = OVERLOADED
+        else:
+            kind = UNKNOWN
+
+    return ProviderError(kind=kind, status_code=status_code, retry_after=retry_after)
+
+
+def backoff_delay(attempt: int, base_delay: float, exponential: bool = True, max_delay: float = 60.0) -> float:
+    """
+    Jittered backoff for an attempt with no server hint.
+
+    Uses "equal jitter": half the (exponential) delay is fixed, half random,
+    so retries from many workers spread out instead of arriving together.
+    """
+    delay = min(max_delay, base_delay * (2 ** attempt if exponential else 1))
+    return delay / 2 + random.uniform(0, delay / 2)
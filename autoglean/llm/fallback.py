@@ -0,0 +1,121 @@
+"""Provider fallback chains and latency tracking for hedged requests."""
+
+import logging
+from collections import deque
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+from autoglean.core.config import get_config_loader
+
+logger = logging.getLogger(__name__)
+
+# model_used column width
+_MODEL_USED_MAX_LENGTH = 100
+
+
+def get_fallback_config() -> Dict[str, Any]:
+    """Get the ``fallbacks`` section of llm.yaml."""
+    return get_config_loader().load_llm_config().get('fallbacks', {}) or {}
+
+
+def get_fallback_chain(primary: str, extractor_id: Optional[str] = None) -> List[str]:
+    """
+    Resolve the ordered list of providers to try for a request.
+
+    An extractor-specific chain takes precedence over the chain configured
+    for the primary provider. Providers with an empty API key are skipped,
+    since they are not configured in this deployment. With fallbacks
+    disabled the chain is the primary alone.
+
+    Args:
+        primary: Provider name the extractor is configured with
+        extractor_id: Optional extractor ID for per-extractor chains
+
+    Returns:
+        Provider names, primary first
+    """
+    fallback_config = get_fallback_config()
+    if not fallback_config.get('enabled', False):
+        return [primary]
+    providers = get_config_loader().load_llm_config().get('providers', {})
+
+    fallbacks = None
+    if extractor_id:
+        fallbacks = (fallback_config.get('extractors') or {}).get(extractor_id)
+    if fallbacks is None:
+        fallbacks = (fallback_config.get('providers') or {}).get(primary, [])
+
+    chain = [primary]
+    for provider_name in fallbacks:
+        if provider_name in chain:
+            continue
+        provider_config = providers.get(provider_name)
+        if provider_config is None:
+            logger.warning(f"Fallback provider '{provider_name}' not found in configuration, skipping")
+            continue
+        if 'api_key' in provider_config and not provider_config['api_key']:
+            continue
+        chain.append(provider_name)
+    return chain
+
+
+def annotate_model_used(result: Dict[str, Any], primary: str, served_by: str, hedged: bool) -> Dict[str, Any]:
+    """
+    Record fallback/hedging in the result's model name (stored as model_used).
+
+    Example: ``gpt-4o [fallback:gemini-flash]`` or ``gpt-4o [hedged:gemini-flash]``.
+    """
+    if served_by == primary:
+        return result
+    tag = 'hedged' if hedged else 'fallback'
+    result['model'] = f"{result['model']} [{tag}:{primary}]"[:_MODEL_USED_MAX_LENGTH]
+    return result
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per provider (this process)."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = Lock()
+
+    def record(self, provider_name: str, seconds: float):
+        """Record the latency of a successful call."""
+        with self._lock:
+            samples = self._samples.setdefault(provider_name, deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def percentile(self, provider_name: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+        """Get a latency percentile, or None if there are too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(provider_name, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(percentile * (len(samples) - 1))))
+        return samples[index]
+
+    def get_hedge_delay(self, provider_name: str) -> float:
+        """Seconds to wait for a provider before hedging to the next one."""
+        hedging = get_fallback_config().get('hedging') or {}
+        observed = self.percentile(
+            provider_name,
+            hedging.get('percentile', 0.95),
+            hedging.get('min_samples', 20)
+        )
+        if observed is None:
+            return float(hedging.get('default_delay', 30))
+        return max(float(hedging.get('min_delay', 1)), observed)
+
+
+# Global instance
+_latency_tracker: Optional[LatencyTracker] = None
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Get or create global latency tracker."""
+    global _latency_tracker
+    if _latency_tracker is None:
+        hedging = get_fallback_config().get('hedging') or {}
+        _latency_tracker = LatencyTracker(hedging.get('window', 200))
+    return _latency_tracker
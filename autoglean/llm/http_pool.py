@@ -0,0 +1,305 @@
+"""Per-process pooled HTTP clients for provider calls.
+
+Each provider gets one keep-alive httpx client per process (and one async
+client per event loop), sized by ``http_pool`` in llm.yaml. The clients are
+handed to LiteLLM with every call, so TLS handshakes and connection setup
+are paid once per connection instead of once per request. HTTP/2 is used
+when the ``h2`` package is installed.
+
+Workers warm the pools up at start (see celery_app), opening a connection
+to each configured provider before the first job arrives.
+"""
+
+import asyncio
+import logging
+import weakref
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from autoglean.core.config import get_config_loader
+from autoglean.llm.key_pool import key_id
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import litellm
+    from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler, HTTPHandler
+    from openai import AsyncOpenAI, OpenAI
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# LiteLLM providers that take an OpenAI SDK client
+_OPENAI_SDK_PROVIDERS = {'openai', 'text-completion-openai'}
+
+# LiteLLM providers that take an HTTPHandler wrapping an httpx client
+_HTTPX_PROVIDERS = {'gemini', 'vertex_ai', 'vertex_ai_beta', 'anthropic', 'ollama', 'ollama_chat'}
+
+# Hosts to warm up for providers without an api_base
+_DEFAULT_HOSTS = {
+    'openai': 'https://api.openai.com',
+    'gemini': 'https://generativelanguage.googleapis.com',
+    'anthropic': 'https://api.anthropic.com',
+}
+
+
+class _PoolStats:
+    """
+    Request and connection counters of one pooled client.
+
+    Connections are told apart by the response's ``network_stream``
+    extension (one stream per connection), so no private httpx state is read.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self._seen = weakref.WeakSet()
+        self._lock = Lock()
+
+    def record(self, response: httpx.Response):
+        stream = response.extensions.get('network_stream')
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            try:
+                if stream in self._seen:
+                    return
+                self._seen.add(stream)
+            except TypeError:
+                # Not weak-referenceable: counted as a new connection
+                pass
+            self.connections_opened += 1
+
+
+def _pool_connections(client: httpx.Client) -> Optional[List[Any]]:
+    """Open connections of a client's pool, None if this httpx version does not expose them."""
+    try:
+        return list(client._transport._pool.connections)
+    except AttributeError:
+        return None
+
+
+class HttpPoolManager:
+    """Keep-alive HTTP clients per provider, shared by all calls in a process."""
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        self.llm_config = config_loader.load_llm_config()
+        self.settings = self.llm_config.get('http_pool', {}) or {}
+        self.enabled = self.settings.get('enabled', True) and LITELLM_AVAILABLE
+        self.http2 = bool(self.settings.get('http2', True))
+        if self.http2 and not HTTP2_AVAILABLE:
+            logger.info("h2 not installed, provider connections use HTTP/1.1")
+            self.http2 = False
+
+        self._clients: Dict[str, httpx.Client] = {}
+        self._litellm_clients: Dict[str, Any] = {}
+        # Async clients are bound to the event loop they were created on
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._stats: Dict[str, _PoolStats] = {}
+        # Default clients of async handlers being closed (tasks are only weakly referenced by the loop)
+        self._closing = set()
+        self._lock = Lock()
+
+    # === Configuration ===
+
+    def _pool_settings(self, provider_name: str) -> Dict[str, Any]:
+        """Global http_pool settings with the provider's http_pool overrides."""
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        return {**self.settings, **(provider_config.get('http_pool') or {})}
+
+    def _client_options(self, provider_name: str) -> Dict[str, Any]:
+        settings = self._pool_settings(provider_name)
+        timeout = float(self.llm_config.get('settings', {}).get('timeout', 120))
+        return {
+            'http2': self.http2,
+            'limits': httpx.Limits(
+                max_connections=int(settings.get('max_connections', 20)),
+                max_keepalive_connections=int(settings.get('max_keepalive_connections', 10)),
+                keepalive_expiry=float(settings.get('keepalive_expiry', 60))
+            ),
+            'timeout': httpx.Timeout(timeout, connect=float(settings.get('connect_timeout', 10))),
+            'follow_redirects': True
+        }
+
+    def _litellm_provider(self, provider_name: str) -> Optional[str]:
+        """LiteLLM's provider for a configured model (openai, gemini, ...)."""
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        try:
+            _, provider, _, _ = litellm.get_llm_provider(
+                model=provider_config['model'],
+                api_base=provider_config.get('api_base')
+            )
+            return provider
+        except Exception:
+            return None
+
+    def _stats_for(self, provider_name: str) -> _PoolStats:
+        with self._lock:
+            return self._stats.setdefault(provider_name, _PoolStats())
+
+    # === Clients ===
+
+    def get_client(self, provider_name: str) -> httpx.Client:
+        """Pooled sync client for a provider."""
+        with self._lock:
+            client = self._clients.get(provider_name)
+            if client is None:
+                stats = self._stats.setdefault(provider_name, _PoolStats())
+                client = httpx.Client(
+                    event_hooks={'response': [stats.record]},
+                    **self._client_options(provider_name)
+                )
+                self._clients[provider_name] = client
+                logger.debug(f"Created HTTP pool for {provider_name} (http2={self.http2})")
+            return client
+
+    def get_async_client(self, provider_name: str) -> httpx.AsyncClient:
+        """Pooled async client for a provider on the running event loop."""
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.setdefault(loop, {})
+        if provider_name not in clients:
+            stats = self._stats_for(provider_name)
+
+            async def record(response):
+                stats.record(response)
+
+            client = httpx.AsyncClient(
+                event_hooks={'response': [record]},
+                **self._client_options(provider_name)
+            )
+            clients[provider_name] = client
+        return clients[provider_name]
+
+    def litellm_client(self, provider_name: str, is_async: bool = False, api_key: Optional[str] = None) -> Optional[Any]:
+        """
+        Client object to pass to LiteLLM as ``client=`` for a provider.
+
+        OpenAI SDK clients carry their API key, so one is kept per key of the
+        provider's key pool; all of them share the provider's connection pool.
+
+        Returns:
+            An OpenAI SDK client or LiteLLM HTTP handler over the pooled
+            httpx client, or None if pooling is disabled or the provider
+            family does not accept an injected client
+        """
+        if not self.enabled:
+            return None
+
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        api_key = api_key or provider_config.get('api_key')
+        key_suffix = f":{key_id(api_key)}" if api_key and api_key != provider_config.get('api_key') else ""
+        if is_async:
+            loop = asyncio.get_running_loop()
+            cache = self._async_clients.setdefault(loop, {})
+            key = f"litellm:{provider_name}{key_suffix}"
+        else:
+            cache = self._litellm_clients
+            key = f"{provider_name}{key_suffix}"
+        if key in cache:
+            return cache[key]
+
+        provider = self._litellm_provider(provider_name)
+        client = None
+        try:
+            if provider in _OPENAI_SDK_PROVIDERS:
+                # Retries are handled by LLMClient, not the SDK
+                sdk_class = AsyncOpenAI if is_async else OpenAI
+                http_client = self.get_async_client(provider_name) if is_async else self.get_client(provider_name)
+                client = sdk_class(
+                    api_key=api_key or None,
+                    base_url=provider_config.get('api_base'),
+                    http_client=http_client,
+                    max_retries=0
+                )
+            elif provider in _HTTPX_PROVIDERS:
+                if is_async:
+                    # AsyncHTTPHandler always builds a client of its own; swap
+                    # in the pooled one and close the default instead of leaking it
+                    client = AsyncHTTPHandler()
+                    default_client, client.client = client.client, self.get_async_client(provider_name)
+                    closing = asyncio.get_running_loop().create_task(default_client.aclose())
+                    self._closing.add(closing)
+                    closing.add_done_callback(self._closing.discard)
+                else:
+                    client = HTTPHandler(client=self.get_client(provider_name))
+        except Exception as e:
+            # e.g. no API key configured: let LiteLLM report it on the call
+            logger.debug(f"No pooled client for {provider_name}: {e}")
+            return None
+
+        cache[key] = client
+        return client
+
+    # === Warm-up and stats ===
+
+    def warm_up(self):
+        """Open a connection to every configured provider with credentials."""
+        if not self.enabled or not self.settings.get('warm_up', True):
+            return
+
+        for provider_name, provider_config in self.llm_config.get('providers', {}).items():
+            if 'api_key' in provider_config and not provider_config['api_key']:
+                continue
+            url = provider_config.get('api_base') or _DEFAULT_HOSTS.get(provider_config.get('provider'))
+            if not url:
+                continue
+            try:
+                # Any answer will do: the point is the TCP/TLS handshake
+                self.get_client(provider_name).head(url, timeout=5)
+                logger.debug(f"Warmed up HTTP pool for {provider_name} ({url})")
+            except Exception as e:
+                logger.debug(f"HTTP pool warm-up for {provider_name} failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request, connection and reuse counters per provider for this process."""
+        providers = {}
+        for provider_name, stats in list(self._stats.items()):
+            client = self._clients.get(provider_name)
+            connections = _pool_connections(client) if client is not None else []
+            limits = self._client_options(provider_name)['limits']
+            providers[provider_name] = {
+                'requests': stats.requests,
+                'connections_opened': stats.connections_opened,
+                'reuse_ratio': round(1 - stats.connections_opened / stats.requests, 3) if stats.requests else None,
+                # None when the pool's connections cannot be inspected
+                'open_connections': len(connections) if connections is not None else None,
+                'idle_connections': (
+                    sum(1 for connection in connections if connection.is_idle()) if connections is not None else None
+                ),
+                'max_connections': limits.max_connections,
+                'max_keepalive_connections': limits.max_keepalive_connections
+            }
+        return {'enabled': self.enabled, 'http2': self.http2, 'providers': providers}
+
+    def close(self):
+        """Close the sync clients (async clients close with their event loop)."""
+        if self._stats:
+            logger.info("HTTP pool stats at shutdown", extra={'event': 'http_pool_stats', **self.get_stats()})
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._litellm_clients.clear()
+
+
+# Global instance
+_http_pool_manager: Optional[HttpPoolManager] = None
+
+
+def get_http_pool() -> HttpPoolManager:
+    """Get or create global HTTP pool manager."""
+    global _http_pool_manager
+    if _http_pool_manager is None:
+        _http_pool_manager = HttpPoolManager()
+    return _http_pool_manager
@@ -0,0 +1,276 @@
+"""API-key pools with headroom-aware load balancing.
+
+A provider can list several API keys (``api_keys`` next to ``api_key`` in
+llm.yaml) and equivalent providers serving the same model (``equivalents``,
+e.g. the same Gemini model under another project or through Vertex). Each
+(provider, key) pair has its own RPM/TPM buckets in the rate limiter, so the
+usable throughput is the sum of all of them.
+
+For every call attempt a pair is leased: pairs cooling down after a 429 and
+providers with an open circuit are skipped, and one of the rest is chosen at
+random, weighted by its remaining RPM/TPM headroom, its observed latency and
+the leases it already has in flight. Cooldowns, in-flight counts and latency
+averages live in Redis so all workers balance together; without Redis they
+are kept per process.
+"""
+
+import hashlib
+import logging
+import random
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+from autoglean.llm.circuit_breaker import get_circuit_breaker
+from autoglean.llm.errors import classify_error
+from autoglean.llm.rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "autoglean:keypool:"
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Short, non-reversible identifier of an API key for keys and logs."""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12]
+
+
+@dataclass
+class KeyLease:
+    """A (provider, API key) pair leased for one call attempt."""
+    provider: str
+    api_key: Optional[str]
+    key_id: str
+    started: float = 0.0
+    pooled: bool = False          # chosen from several pairs (state is tracked)
+
+
+class KeyPool:
+    """Choose a provider and API key for each call from the configured pools."""
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        self.llm_config = config_loader.load_llm_config()
+        self.settings = self.llm_config.get('key_pool', {}) or {}
+        self.enabled = self.settings.get('enabled', True)
+        self.default_cooldown = float(self.settings.get('cooldown_seconds', 30))
+        self.lease_ttl = int(self.settings.get('lease_ttl_seconds', 300))
+        self.latency_reference = float(self.settings.get('latency_reference_seconds', 10))
+        self.latency_alpha = float(self.settings.get('latency_alpha', 0.2))
+        self.equivalent_weight = float(self.settings.get('equivalent_weight', 0.5))
+
+        self.redis = get_redis_client()
+        self._state: Dict[str, Dict[str, float]] = {}
+        self._lock = Lock()
+
+    # === Configuration ===
+
+    def _keys_of(self, provider_name: str) -> List[Optional[str]]:
+        """API keys of a provider (None for providers that take no key)."""
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        keys = [provider_config.get('api_key')] + list(provider_config.get('api_keys') or [])
+        keys = list(dict.fromkeys(key for key in keys if key))
+        if keys:
+            return keys
+        # A provider that declares an empty key has no credentials at all
+        return [] if 'api_key' in provider_config else [None]
+
+    def candidates(self, provider_name: str) -> List[Tuple[str, Optional[str]]]:
+        """(provider, key) pairs that can serve a call to a provider."""
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        if not self.enabled:
+            return [(provider_name, provider_config.get('api_key'))]
+
+        providers = [provider_name] + [
+            name for name in provider_config.get('equivalents') or []
+            if name in self.llm_config.get('providers', {})
+        ]
+        pairs = [(name, api_key) for name in providers for api_key in self._keys_of(name)]
+        # Without any credentials, let the call go ahead and report it
+        return pairs or [(provider_name, provider_config.get('api_key'))]
+
+    # === Shared state ===
+
+    def _redis_key(self, provider_name: str, api_key: Optional[str]) -> str:
+        return f"{_KEY_PREFIX}{provider_name}:{key_id(api_key)}"
+
+    def _read(self, provider_name: str, api_key: Optional[str]) -> Dict[str, float]:
+        """Cooldown deadline, in-flight leases and latency average of a pair."""
+        if self.redis is not None:
+            try:
+                raw = self.redis.hgetall(self._redis_key(provider_name, api_key))
+                return {key.decode(): float(value) for key, value in raw.items()}
+            except Exception as e:
+                logger.warning(f"Redis key pool read failed, using in-memory state: {e}")
+        with self._lock:
+            return dict(self._state.get(self._redis_key(provider_name, api_key), {}))
+
+    def _update(self, provider_name: str, api_key: Optional[str], inflight: int = 0, **fields: float):
+        """Add to the in-flight count and set other fields of a pair."""
+        key = self._redis_key(provider_name, api_key)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                if inflight:
+                    pipe.hincrby(key, 'inflight', inflight)
+                if fields:
+                    pipe.hset(key, mapping={name: str(value) for name, value in fields.items()})
+                # Leases of crashed workers stop counting once the key expires
+                pipe.expire(key, self.lease_ttl)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Redis key pool update failed, using in-memory state: {e}")
+        with self._lock:
+            state = self._state.setdefault(key, {})
+            state['inflight'] = max(0, state.get('inflight', 0) + inflight)
+            state.update(fields)
+
+    # === Leasing ===
+
+    def _headroom(self, provider_name: str, api_key: Optional[str]) -> float:
+        """Fraction (0-1) of the pair's RPM/TPM budget still available (1 if unlimited)."""
+        rate_limiter = get_rate_limiter()
+        if not rate_limiter.is_limited(provider_name):
+            return 1.0
+        headroom = rate_limiter.get_headroom(provider_name, api_key)
+        fractions = [
+            headroom[remaining] / headroom[limit]
+            for remaining, limit in (('requests_remaining', 'rpm_limit'), ('tokens_remaining', 'tpm_limit'))
+            if headroom[limit]
+        ]
+        return max(0.0, min(fractions)) if fractions else 1.0
+
+    def _score(self, provider_name: str, api_key: Optional[str], state: Dict[str, float]) -> float:
+        latency = state.get('latency')
+        latency_factor = 1.0 / (1.0 + latency / self.latency_reference) if latency else 1.0
+        inflight_factor = 1.0 / (1.0 + max(0.0, state.get('inflight', 0)))
+        # A small floor keeps an exhausted pair eligible when nothing is better
+        return (0.05 + self._headroom(provider_name, api_key)) * latency_factor * inflight_factor
+
+    def lease(self, provider_name: str) -> KeyLease:
+        """
+        Lease the best (provider, key) pair for one call attempt to a provider.
+
+        Returns:
+            KeyLease; pass it to release() when the attempt ends
+        """
+        pairs = self.candidates(provider_name)
+        if len(pairs) == 1:
+            provider, api_key = pairs[0]
+            return KeyLease(provider, api_key, key_id(api_key), time.monotonic())
+
+        now = time.time()
+        circuit_breaker = get_circuit_breaker()
+        open_providers = {
+            name for name in {provider for provider, _ in pairs}
+            if circuit_breaker.get_state(name)['state'] == 'open'
+        }
+        if len(open_providers) == len({provider for provider, _ in pairs}):
+            # All open: let the call fail fast on the requested provider
+            open_providers.discard(provider_name)
+
+        scored = []
+        for provider, api_key in pairs:
+            if provider in open_providers:
+                continue
+            state = self._read(provider, api_key)
+            if state.get('cooldown_until', 0) > now:
+                continue
+            weight = 1.0 if provider == provider_name else self.equivalent_weight
+            scored.append(((provider, api_key), weight * self._score(provider, api_key, state)))
+
+        if scored:
+            pairs_left, weights = zip(*scored)
+            provider, api_key = random.choices(pairs_left, weights=weights)[0]
+        else:
+            # Everything is cooling down: take the pair that recovers first
+            provider, api_key = min(pairs, key=lambda pair: self._read(*pair).get('cooldown_until', 0))
+
+        self._update(provider, api_key, inflight=1)
+        logger.debug(f"Leased {provider} key {key_id(api_key)} for a call to {provider_name}")
+        return KeyLease(provider, api_key, key_id(api_key), time.monotonic(), pooled=True)
+
+    def release(self, lease: KeyLease, error: Optional[Exception] = None):
+        """
+        End a lease, recording the call's latency or putting a throttled key on cooldown.
+
+        Args:
+            lease: The lease returned by lease()
+            error: The exception the call failed with, if any
+        """
+        if not lease.pooled:
+            return
+
+        fields: Dict[str, float] = {}
+        if error is None:
+            latency = time.monotonic() - lease.started
+            previous = self._read(lease.provider, lease.api_key).get('latency')
+            fields['latency'] = latency if previous is None else (
+                self.latency_alpha * latency + (1 - self.latency_alpha) * previous
+            )
+        else:
+            failure = classify_error(error)
+            if failure.kind == 'rate_limit':
+                cooldown = failure.retry_after or self.default_cooldown
+                fields['cooldown_until'] = time.time() + cooldown
+                logger.info(
+                    f"Key {lease.key_id} of {lease.provider} throttled, cooling down for {cooldown:.0f}s",
+                    extra={'event': 'key_cooldown', 'model': lease.provider, 'key_id': lease.key_id,
+                           'cooldown': round(cooldown, 1)}
+                )
+        self._update(lease.provider, lease.api_key, inflight=-1, **fields)
+
+    def can_rotate(self, provider_name: str, lease: KeyLease, error: Exception) -> bool:
+        """Whether a throttled attempt can be retried at once on another pair instead of waiting."""
+        if not lease.pooled or classify_error(error).kind != 'rate_limit':
+            return False
+        now = time.time()
+        return any(
+            pair != (lease.provider, lease.api_key) and self._read(*pair).get('cooldown_until', 0) <= now
+            for pair in self.candidates(provider_name)
+        )
+
+    # === Stats ===
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-pair headroom, cooldown, in-flight leases and latency of every pooled provider."""
+        now = time.time()
+        providers = {}
+        for provider_name in self.llm_config.get('providers', {}):
+            pairs = self.candidates(provider_name)
+            if len(pairs) == 1:
+                continue
+            entries = []
+            for provider, api_key in pairs:
+                state = self._read(provider, api_key)
+                cooldown = state.get('cooldown_until', 0) - now
+                entries.append({
+                    'provider': provider,
+                    'key_id': key_id(api_key),
+                    'headroom': round(self._headroom(provider, api_key), 3),
+                    'cooldown_remaining': round(cooldown, 1) if cooldown > 0 else None,
+                    'inflight': int(state.get('inflight', 0)),
+                    'latency': round(state['latency'], 3) if 'latency' in state else None
+                })
+            providers[provider_name] = entries
+        return {
+            'enabled': self.enabled,
+            'backend': 'redis' if self.redis is not None else 'memory',
+            'providers': providers
+        }
+
+
+# Global instance
+_key_pool: Optional[KeyPool] = None
+
+
+def get_key_pool() -> KeyPool:
+    """Get or create global key pool."""
+    global _key_pool
+    if _key_pool is None:
+        _key_pool = KeyPool()
+    return _key_pool
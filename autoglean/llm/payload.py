@@ -0,0 +1,163 @@
+"""Prepared image payloads for multimodal requests.
+
+An ImagePayload is built once per job and handed to the client, which
+reuses it for every retry, fallback provider and cache lookup. The image
+is never written to a temp file, its MIME type is sniffed from the bytes,
+and the base64 data URL is encoded on first use. After that the raw bytes
+are released, so only one encoded copy of a scan is held.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the image formats providers accept
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+)
+
+_PIL_FORMATS = {
+    'image/jpeg': 'JPEG',
+    'image/png': 'PNG',
+    'image/gif': 'GIF',
+    'image/bmp': 'BMP',
+    'image/tiff': 'TIFF',
+    'image/webp': 'WEBP',
+}
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """Detect an image MIME type from its leading bytes."""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class ImagePayload:
+    """Encoded image bytes shared by all attempts of one request."""
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None, size: Optional[Tuple[int, int]] = None):
+        """
+        Args:
+            data: Encoded image bytes (JPEG, PNG, ...)
+            mime_type: MIME type; sniffed from the bytes when omitted
+            size: (width, height) if already known
+        """
+        self.mime_type = mime_type or sniff_mime_type(data) or 'image/jpeg'
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.byte_size = len(data)
+        self.size = size
+        if self.size is None and PIL_AVAILABLE:
+            try:
+                # Reads only the header
+                with Image.open(io.BytesIO(data)) as img:
+                    self.size = img.size
+            except Exception:
+                pass
+        self._data: Optional[bytes] = data
+        self._data_url: Optional[str] = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> "ImagePayload":
+        """Load an image file as-is (no re-encoding)."""
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    @classmethod
+    def from_image(cls, img: "Image.Image", image_format: str = 'JPEG', quality: int = 90) -> "ImagePayload":
+        """Encode a PIL image in memory."""
+        if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, image_format, quality=quality, optimize=True)
+        mime_type = next((mime for mime, fmt in _PIL_FORMATS.items() if fmt == image_format), None)
+        return cls(buffer.getvalue(), mime_type, img.size)
+
+    @classmethod
+    def from_data_url(cls, url: str) -> "ImagePayload":
+        """Rebuild a payload from a ``data:`` URL (e.g. a persisted batch request)."""
+        header, encoded = url.split(',', 1)
+        mime_type = header[len('data:'):].split(';', 1)[0] or None
+        payload = cls(base64.b64decode(encoded), mime_type)
+        payload._data_url = url
+        payload._data = None
+        return payload
+
+    @property
+    def pil_format(self) -> str:
+        """PIL format name matching the MIME type."""
+        return _PIL_FORMATS.get(self.mime_type, 'JPEG')
+
+    @property
+    def data_url(self) -> str:
+        """Base64 ``data:`` URL, encoded once and then reused."""
+        with self._lock:
+            if self._data_url is None:
+                self._data_url = f"data:{self.mime_type};base64,{base64.b64encode(self._data).decode('ascii')}"
+                # The encoded copy is all that is needed from here on
+                self._data = None
+            return self._data_url
+
+    def resized(self, max_side: int) -> "ImagePayload":
+        """
+        Downscaled copy whose longest side is at most max_side pixels.
+
+        Returns self when the image is already small enough.
+        """
+        if self.size and max(self.size) <= max_side:
+            return self
+        if not PIL_AVAILABLE:
+            raise RuntimeError("Pillow is required to resize images")
+
+        with self._lock:
+            data = self._data
+            if data is None:
+                data = base64.b64decode(self._data_url.split(',', 1)[1])
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            image_format = self.pil_format if self.pil_format in ('JPEG', 'PNG', 'WEBP') else 'JPEG'
+            return ImagePayload.from_image(img, image_format)
+
+    def __repr__(self):
+        return f"<ImagePayload({self.mime_type}, {self.byte_size} bytes, size={self.size})>"
+
+
+def as_image_payload(image: Union[str, Path, ImagePayload, None]) -> Optional[ImagePayload]:
+    """Accept a prepared payload or an image path."""
+    if image is None or isinstance(image, ImagePayload):
+        return image
+    return ImagePayload.from_path(image)
+
+
+def document_message_index(messages: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Index of the message that carries the document (the first user message).
+
+    The image is attached to it and its text is what gets trimmed, whether
+    the extractor prompt comes before the document or after it, and with
+    continuation turns appended.
+    """
+    return next((index for index, message in enumerate(messages) if message.get('role') == 'user'), None)
@@ -0,0 +1,227 @@
+"""Token-bucket rate limiting for LLM providers, shared across workers via Redis."""
+
+import asyncio
+import hashlib
+import logging
+import time
+from threading import Lock
+from typing import Dict, Any, Optional, Tuple
+
+from autoglean.core.config import get_config_loader
+from autoglean.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Bucket state expires after this many idle seconds (a full refill takes 60s)
+_BUCKET_TTL = 120
+
+# Atomically refill both buckets and then acquire, debit or peek.
+# Uses the Redis server clock so workers on different hosts agree on time.
+_BUCKET_SCRIPT = """
+local now_t = redis.call('TIME')
+local now = tonumber(now_t[1]) + tonumber(now_t[2]) / 1000000
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local req = tonumber(ARGV[3])
+local tok = tonumber(ARGV[4])
+local mode = ARGV[5]
+
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local ts = tonumber(state[3]) or now
+local elapsed = math.max(0, now - ts)
+
+if rpm > 0 then requests = math.min(rpm, requests + elapsed * rpm / 60) end
+if tpm > 0 then tokens = math.min(tpm, tokens + elapsed * tpm / 60) end
+
+local wait = 0
+if mode == 'acquire' then
+    if rpm > 0 and requests < req then wait = math.max(wait, (req - requests) * 60 / rpm) end
+    if tpm > 0 and tokens < tok then wait = math.max(wait, (tok - tokens) * 60 / tpm) end
+end
+
+if mode == 'debit' or (mode == 'acquire' and wait == 0) then
+    if rpm > 0 then requests = requests - req end
+    if tpm > 0 then tokens = tokens - tok end
+end
+
+redis.call('HSET', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return {tostring(wait), tostring(requests), tostring(tokens)}
+"""
+
+
+def _apply_bucket(
+    state: Dict[str, float],
+    now: float,
+    rpm: int,
+    tpm: int,
+    requests: float,
+    tokens: float,
+    mode: str
+) -> float:
+    """In-memory equivalent of _BUCKET_SCRIPT. Mutates state, returns wait seconds."""
+    elapsed = max(0.0, now - state.get('ts', now))
+    if rpm > 0:
+        state['requests'] = min(rpm, state.get('requests', rpm) + elapsed * rpm / 60)
+    if tpm > 0:
+        state['tokens'] = min(tpm, state.get('tokens', tpm) + elapsed * tpm / 60)
+    state['ts'] = now
+
+    wait = 0.0
+    if mode == 'acquire':
+        if rpm > 0 and state['requests'] < requests:
+            wait = max(wait, (requests - state['requests']) * 60 / rpm)
+        if tpm > 0 and state['tokens'] < tokens:
+            wait = max(wait, (tokens - state['tokens']) * 60 / tpm)
+
+    if mode == 'debit' or (mode == 'acquire' and wait == 0):
+        if rpm > 0:
+            state['requests'] -= requests
+        if tpm > 0:
+            state['tokens'] -= tokens
+
+    return wait
+
+
+class RateLimiter:
+    """
+    RPM/TPM token buckets keyed per provider and API key.
+
+    Budgets are declared per provider in llm.yaml under ``rate_limits``
+    (``rpm`` and ``tpm``). Buckets live in Redis so every Celery worker and
+    the API draw from the same budget; without Redis they are kept in
+    process memory, which is correct for single-node runs.
+    """
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        self.llm_config = config_loader.load_llm_config()
+        self.redis = get_redis_client()
+        self._script = self.redis.register_script(_BUCKET_SCRIPT) if self.redis else None
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        self._lock = Lock()
+
+    def get_limits(self, provider_name: str) -> Tuple[int, int]:
+        """Get (rpm, tpm) for a provider. 0 means unlimited."""
+        provider_config = self.llm_config.get('providers', {}).get(provider_name, {})
+        limits = provider_config.get('rate_limits') or {}
+        return int(limits.get('rpm') or 0), int(limits.get('tpm') or 0)
+
+    def _bucket_key(self, provider_name: str, api_key: Optional[str]) -> str:
+        """Build the bucket key without exposing the API key itself."""
+        key_hash = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12]
+        return f"autoglean:ratelimit:{provider_name}:{key_hash}"
+
+    def _run(
+        self,
+        provider_name: str,
+        api_key: Optional[str],
+        requests: float,
+        tokens: float,
+        mode: str
+    ) -> Tuple[float, float, float]:
+        """Run a bucket operation. Returns (wait, requests_left, tokens_left)."""
+        rpm, tpm = self.get_limits(provider_name)
+        # A request larger than the whole bucket could never be granted
+        if tpm > 0 and mode == 'acquire':
+            tokens = min(tokens, tpm)
+        key = self._bucket_key(provider_name, api_key)
+
+        if self._script is not None:
+            try:
+                wait, requests_left, tokens_left = self._script(
+                    keys=[key],
+                    args=[rpm, tpm, requests, tokens, mode, _BUCKET_TTL]
+                )
+                return float(wait), float(requests_left), float(tokens_left)
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable ({e}), using in-memory buckets")
+
+        with self._lock:
+            state = self._buckets.setdefault(key, {})
+            wait = _apply_bucket(state, time.time(), rpm, tpm, requests, tokens, mode)
+            return wait, state.get('requests', 0.0), state.get('tokens', 0.0)
+
+    def is_limited(self, provider_name: str) -> bool:
+        """Check whether a provider has any budget configured."""
+        return any(self.get_limits(provider_name))
+
+    def try_acquire(self, provider_name: str, api_key: Optional[str], tokens: int) -> float:
+        """
+        Try to take one request and ``tokens`` tokens from the buckets.
+
+        Returns:
+            0 if granted, otherwise seconds to wait before trying again
+        """
+        if not self.is_limited(provider_name):
+            return 0.0
+        wait, _, _ = self._run(provider_name, api_key, 1, tokens, 'acquire')
+        return wait
+
+    def acquire(self, provider_name: str, api_key: Optional[str], tokens: int):
+        """Block until the provider's buckets can cover the request."""
+        while True:
+            wait = self.try_acquire(provider_name, api_key, tokens)
+            if wait <= 0:
+                return
+            logger.info(f"Rate limiting {provider_name}: waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    async def aacquire(self, provider_name: str, api_key: Optional[str], tokens: int):
+        """Async version of acquire() that yields the event loop while waiting."""
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, provider_name, api_key, tokens)
+            if wait <= 0:
+                return
+            logger.info(f"Rate limiting {provider_name}: waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    def record_usage(self, provider_name: str, api_key: Optional[str], token_delta: int):
+        """
+        Reconcile the token bucket once actual usage is known.
+
+        Args:
+            provider_name: Provider name from config
+            api_key: API key the request was made with
+            token_delta: Actual tokens minus the tokens reserved at acquire time
+                (negative values refund the difference)
+        """
+        if not token_delta or not self.get_limits(provider_name)[1]:
+            return
+        self._run(provider_name, api_key, 0, token_delta, 'debit')
+
+    def get_headroom(self, provider_name: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+        """Get the remaining request and token budget for a provider."""
+        rpm, tpm = self.get_limits(provider_name)
+        if api_key is None:
+            api_key = self.llm_config.get('providers', {}).get(provider_name, {}).get('api_key')
+
+        headroom = {
+            'provider': provider_name,
+            'rpm_limit': rpm or None,
+            'tpm_limit': tpm or None,
+            'requests_remaining': None,
+            'tokens_remaining': None,
+            'backend': 'redis' if self._script is not None else 'memory'
+        }
+        if rpm or tpm:
+            _, requests_left, tokens_left = self._run(provider_name, api_key, 0, 0, 'peek')
+            if rpm:
+                headroom['requests_remaining'] = max(0, int(requests_left))
+            if tpm:
+                headroom['tokens_remaining'] = max(0, int(tokens_left))
+        return headroom
+
+
+# Global instance
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get or create global rate limiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,463 @@
+"""Simulated LLM provider for load testing.
+
+Replaces the provider call (not the client) so rate limiting, retries,
+fallback and latency tracking behave as in production. Each request samples:
+
+- time to first token (lognormal) and output speed (normal tokens/second)
+- prompt tokens from text length and image dimensions (per-tile cost)
+- completion tokens proportional to the prompt, capped by max_tokens
+  (finish_reason "length" when capped)
+- injected rate-limit (429 with Retry-After), server and timeout errors
+
+Settings come from the ``simulation`` section of llm.yaml. In-process it is
+used when LLM_MOCK_MODE=true; it can also run as an OpenAI-compatible HTTP
+stand-in (see the ``simulated`` provider in llm.yaml):
+
+    python -m autoglean.llm.simulator --port 8089
+"""
+
+import asyncio
+import base64
+import io
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Dict, Any, Iterator, List, Optional
+
+from autoglean.core.config import get_config_loader
+
+try:
+    import httpx
+    import litellm
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Characters streamed per chunk (~5 tokens)
+_CHUNK_CHARS = 20
+
+_TEMPLATES = {
+    'coordinates': """# Extracted Coordinates
+
+| Location | Latitude | Longitude | Context |
+|----------|----------|-----------|---------|
+| City Center | 40.7128 | -74.0060 | Main office location |
+| Warehouse | 40.7589 | -73.9851 | Distribution center |
+""",
+    'dates': """# Extracted Dates
+
+| Original Format | ISO Format | Context |
+|-----------------|------------|---------|
+| Jan 15, 2024 | 2024-01-15 | Contract signing date |
+| 2024/03/20 | 2024-03-20 | Project deadline |
+| March 1st | 2024-03-01 | Meeting date |
+""",
+    'entities': """# Extracted Entities
+
+| Name | Type | Context |
+|------|------|---------|
+| Acme Corporation | Company | Technology company |
+| Tech Alliance | Organization | Industry consortium |
+""",
+    'default': """# Extraction Results
+
+| Field | Value | Context |
+|-------|-------|---------|
+| Sample field | Sample value | Sample context |
+"""
+}
+
+
+class SimulatedProviderError(Exception):
+    """Injected error when LiteLLM's exception types are not available."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get('content')
+    if isinstance(content, list):
+        return ' '.join(item.get('text', '') for item in content if item.get('type') == 'text')
+    return str(content or '')
+
+
+def _message_images(message: Dict[str, Any]) -> List[str]:
+    content = message.get('content')
+    if not isinstance(content, list):
+        return []
+    return [
+        item['image_url']['url'] for item in content
+        if item.get('type') == 'image_url' and isinstance(item.get('image_url'), dict)
+    ]
+
+
+class SimulatedProvider:
+    """Sample realistic latencies, token counts and failures for fake completions."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: Simulation settings (defaults to the ``simulation`` section of llm.yaml)
+        """
+        if config is None:
+            config = get_config_loader().load_llm_config().get('simulation', {}) or {}
+        self.config = config
+        self.random = random.Random(config.get('seed'))
+
+    def _profile(self, provider_name: Optional[str]) -> Dict[str, Any]:
+        """Settings for a provider: global settings with per-provider overrides."""
+        profile = {key: value for key, value in self.config.items() if key != 'providers'}
+        overrides = (self.config.get('providers') or {}).get(provider_name) or {}
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(profile.get(key), dict):
+                profile[key] = {**profile[key], **value}
+            else:
+                profile[key] = value
+        return profile
+
+    # === Sampling ===
+
+    def _image_tokens(self, url: str, profile: Dict[str, Any]) -> int:
+        """Token cost of an image: a fixed cost per tile, from its dimensions."""
+        settings = profile.get('image_tokens') or {}
+        tile_size = settings.get('tile_size', 768)
+        per_tile = settings.get('per_tile', 258)
+        width = height = tile_size
+        if PIL_AVAILABLE and url.startswith('data:'):
+            try:
+                with Image.open(io.BytesIO(base64.b64decode(url.split(',', 1)[1]))) as img:
+                    width, height = img.size
+            except Exception:
+                pass
+        return per_tile * math.ceil(width / tile_size) * math.ceil(height / tile_size)
+
+    def count_prompt_tokens(self, messages: List[Dict[str, Any]], provider_name: Optional[str] = None) -> int:
+        """Prompt tokens for messages (~4 characters per token plus image tiles)."""
+        profile = self._profile(provider_name)
+        tokens = 0
+        for message in messages:
+            tokens += len(_message_text(message)) // 4 + 4
+            for url in _message_images(message):
+                tokens += self._image_tokens(url, profile)
+        return tokens
+
+    def _sample_error(self, profile: Dict[str, Any]) -> Optional[str]:
+        errors = profile.get('errors') or {}
+        roll = self.random.random()
+        for kind in ('rate_limit', 'server_error', 'timeout'):
+            rate = float(errors.get(kind, 0))
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    def _generate_content(self, messages: List[Dict[str, Any]], tokens: int) -> str:
+        """Markdown table of roughly the requested number of tokens."""
+        text = ' '.join(_message_text(message) for message in messages).lower()
+        if 'coordinate' in text or 'location' in text:
+            content = _TEMPLATES['coordinates']
+        elif 'date' in text:
+            content = _TEMPLATES['dates']
+        elif 'entit' in text or 'compan' in text:
+            content = _TEMPLATES['entities']
+        else:
+            content = _TEMPLATES['default']
+
+        row = 1
+        rows = []
+        length = len(content)
+        while length < tokens * 4:
+            line = f"| Simulated item {row} | Value {self.random.randint(1000, 9999)} | Generated for load testing |\n"
+            rows.append(line)
+            length += len(line)
+            row += 1
+        return content + ''.join(rows)
+
+    def plan(
+        self,
+        provider_name: Optional[str],
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Sample the outcome of one request.
+
+        Returns:
+            Dictionary with error (None, 'rate_limit', 'server_error' or
+            'timeout'), ttft and seconds_per_token (unscaled), prompt and
+            completion tokens, content, finish_reason and retry_after
+        """
+        profile = self._profile(provider_name)
+        time_scale = float(profile.get('time_scale', 1.0))
+
+        ttft = profile.get('ttft_ms') or {}
+        ttft_seconds = self.random.lognormvariate(
+            math.log(ttft.get('median', 800) / 1000),
+            ttft.get('sigma', 0.5)
+        )
+        speed = profile.get('tokens_per_second') or {}
+        tokens_per_second = max(
+            speed.get('min', 5),
+            self.random.gauss(speed.get('mean', 60), speed.get('stddev', 15))
+        )
+
+        prompt_tokens = self.count_prompt_tokens(messages, provider_name)
+        output = profile.get('output_tokens') or {}
+        completion_tokens = prompt_tokens * output.get('ratio', 0.3)
+        completion_tokens *= max(0.0, self.random.gauss(1.0, output.get('jitter', 0.25)))
+        completion_tokens = int(min(output.get('max', 1500), max(output.get('min', 50), completion_tokens)))
+
+        finish_reason = 'stop'
+        if max_tokens and completion_tokens > max_tokens:
+            completion_tokens = max_tokens
+            finish_reason = 'length'
+
+        content = self._generate_content(messages, completion_tokens)[:completion_tokens * 4]
+
+        return {
+            'error': self._sample_error(profile),
+            'retry_after': float((profile.get('errors') or {}).get('retry_after_seconds', 2)),
+            'time_scale': time_scale,
+            'ttft': ttft_seconds,
+            'seconds_per_token': 1.0 / tokens_per_second,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'content': content,
+            'finish_reason': finish_reason
+        }
+
+    # === In-process completion (LiteLLM call signature) ===
+
+    def _error_delay(self, plan: Dict[str, Any], timeout: float) -> float:
+        if plan['error'] == 'timeout':
+            return timeout * plan['time_scale']
+        if plan['error'] == 'server_error':
+            return plan['ttft'] * plan['time_scale']
+        return 0.0
+
+    def _exception(self, plan: Dict[str, Any], model: str) -> Exception:
+        kind = plan['error']
+        if kind == 'rate_limit':
+            message = "Simulated rate limit exceeded (quota)"
+            if LITELLM_AVAILABLE:
+                return litellm.RateLimitError(
+                    message=message,
+                    llm_provider='simulated',
+                    model=model,
+                    response=httpx.Response(
+                        429,
+                        headers={'retry-after': str(plan['retry_after'])},
+                        request=httpx.Request('POST', 'http://simulated/v1/chat/completions')
+                    )
+                )
+            return SimulatedProviderError(message, 429, plan['retry_after'])
+        if kind == 'timeout':
+            message = "Simulated request timeout"
+            if LITELLM_AVAILABLE:
+                return litellm.Timeout(message=message, model=model, llm_provider='simulated')
+            return SimulatedProviderError(message, 408)
+        message = "Simulated provider overloaded"
+        if LITELLM_AVAILABLE:
+            return litellm.ServiceUnavailableError(message=message, llm_provider='simulated', model=model)
+        return SimulatedProviderError(message, 503)
+
+    def _response(self, plan: Dict[str, Any], model: str) -> SimpleNamespace:
+        return SimpleNamespace(
+            id=f"chatcmpl-sim-{uuid.uuid4().hex[:12]}",
+            model=model,
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(role='assistant', content=plan['content']),
+                finish_reason=plan['finish_reason']
+            )],
+            usage=SimpleNamespace(
+                prompt_tokens=plan['prompt_tokens'],
+                completion_tokens=plan['completion_tokens'],
+                total_tokens=plan['prompt_tokens'] + plan['completion_tokens'],
+                prompt_tokens_details=None
+            )
+        )
+
+    def _chunks(self, plan: Dict[str, Any]) -> Iterator[tuple]:
+        """(delay before chunk, chunk) pairs for a streamed response."""
+        content = plan['content']
+        per_chunk = plan['seconds_per_token'] * (_CHUNK_CHARS / 4) * plan['time_scale']
+        delay = plan['ttft'] * plan['time_scale']
+        for start in range(0, len(content), _CHUNK_CHARS):
+            yield delay, SimpleNamespace(choices=[SimpleNamespace(
+                delta=SimpleNamespace(content=content[start:start + _CHUNK_CHARS]),
+                finish_reason=None
+            )])
+            delay = per_chunk
+        yield 0.0, SimpleNamespace(choices=[], usage=self._response(plan, '').usage, plan=plan)
+
+    def completion(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        provider_name: Optional[str] = None,
+        stream: bool = False,
+        **params
+    ) -> Any:
+        """
+        Blocking stand-in for ``litellm.completion``.
+
+        Returns:
+            A response (or, with stream=True, an iterator of chunks) with the
+            attributes the client reads from LiteLLM objects
+        """
+        plan = self.plan(provider_name, messages, params.get('max_tokens'))
+        if plan['error']:
+            time.sleep(self._error_delay(plan, params.get('timeout', 120)))
+            raise self._exception(plan, model)
+
+        if stream:
+            def iterate():
+                for delay, chunk in self._chunks(plan):
+                    time.sleep(delay)
+                    yield chunk
+            return iterate()
+
+        time.sleep((plan['ttft'] + plan['completion_tokens'] * plan['seconds_per_token']) * plan['time_scale'])
+        return self._response(plan, model)
+
+    async def acompletion(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        provider_name: Optional[str] = None,
+        **params
+    ) -> Any:
+        """Async stand-in for ``litellm.acompletion`` (non-streaming)."""
+        plan = self.plan(provider_name, messages, params.get('max_tokens'))
+        if plan['error']:
+            await asyncio.sleep(self._error_delay(plan, params.get('timeout', 120)))
+            raise self._exception(plan, model)
+
+        await asyncio.sleep((plan['ttft'] + plan['completion_tokens'] * plan['seconds_per_token']) * plan['time_scale'])
+        return self._response(plan, model)
+
+    def build_stream_response(self, chunks: List[Any], model: str) -> Any:
+        """Assemble streamed chunks into a response (like ``litellm.stream_chunk_builder``)."""
+        return self._response(chunks[-1].plan, model)
+
+
+# === OpenAI-compatible HTTP stand-in ===
+
+def create_app(simulator: Optional[SimulatedProvider] = None):
+    """
+    Create a FastAPI app serving ``POST /v1/chat/completions``.
+
+    The request's ``model`` selects per-provider overrides from the
+    simulation config, so e.g. ``openai/gemini-flash`` behaves like the
+    gemini-flash profile.
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    simulator = simulator or SimulatedProvider()
+    app = FastAPI(title="AutoGlean simulated LLM provider")
+
+    @app.get("/v1/models")
+    async def list_models():
+        profiles = list((simulator.config.get('providers') or {}).keys())
+        return {'object': 'list', 'data': [{'id': name, 'object': 'model'} for name in ['simulated'] + profiles]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get('model', 'simulated')
+        plan = simulator.plan(model, body.get('messages', []), body.get('max_tokens'))
+
+        if plan['error'] == 'rate_limit':
+            return JSONResponse(
+                status_code=429,
+                headers={'Retry-After': str(int(math.ceil(plan['retry_after'])))},
+                content={'error': {'message': "Simulated rate limit exceeded (quota)", 'type': 'rate_limit_exceeded'}}
+            )
+        if plan['error'] == 'server_error':
+            await asyncio.sleep(plan['ttft'] * plan['time_scale'])
+            return JSONResponse(
+                status_code=503,
+                content={'error': {'message': "Simulated provider overloaded", 'type': 'server_error'}}
+            )
+        if plan['error'] == 'timeout':
+            # Hang until the client gives up
+            hang = float((simulator.config.get('errors') or {}).get('hang_seconds', 600))
+            await asyncio.sleep(hang)
+
+        completion_id = f"chatcmpl-sim-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {
+            'prompt_tokens': plan['prompt_tokens'],
+            'completion_tokens': plan['completion_tokens'],
+            'total_tokens': plan['prompt_tokens'] + plan['completion_tokens']
+        }
+
+        if body.get('stream'):
+            async def events():
+                for delay, chunk in simulator._chunks(plan):
+                    await asyncio.sleep(delay)
+                    data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model}
+                    if chunk.choices:
+                        data['choices'] = [{'index': 0, 'delta': {'content': chunk.choices[0].delta.content}, 'finish_reason': None}]
+                    else:
+                        data['choices'] = [{'index': 0, 'delta': {}, 'finish_reason': plan['finish_reason']}]
+                        data['usage'] = usage
+                    yield f"data: {json.dumps(data)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep((plan['ttft'] + plan['completion_tokens'] * plan['seconds_per_token']) * plan['time_scale'])
+        return {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': plan['content']},
+                'finish_reason': plan['finish_reason']
+            }],
+            'usage': usage
+        }
+
+    return app
+
+
+# Global instance
+_simulated_provider: Optional[SimulatedProvider] = None
+
+
+def get_simulated_provider() -> SimulatedProvider:
+    """Get or create global simulated provider."""
+    global _simulated_provider
+    if _simulated_provider is None:
+        _simulated_provider = SimulatedProvider()
+    return _simulated_provider
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the simulated OpenAI-compatible LLM provider")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,333 @@
+"""Pre-flight prompt token estimation and input fitting.
+
+Before a call, the prompt is estimated for the target provider: text at
+``chars_per_token`` (scaled by a per-provider calibration factor), and
+images by the tiling formula of the provider family, from the image
+dimensions. The estimate is checked against the provider's
+``max_input_tokens``. Inputs that do not fit are downscaled (images) and
+trimmed (document text), or rejected with InputTooLargeError before any
+tokens are paid for.
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from autoglean.core.config import get_config_loader
+from autoglean.llm.payload import ImagePayload, document_message_index
+
+try:
+    import litellm
+    LITELLM_AVAILABLE = True
+except ImportError:
+    LITELLM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = "\n\n[... document truncated to fit the model's context window ...]"
+
+# Used when an image's dimensions are unknown
+_DEFAULT_IMAGE_SIZE = (1024, 1024)
+
+# Per provider family; overridable under token_estimation.image_tokens
+_DEFAULT_IMAGE_FORMULAS = {
+    # High detail: fit in 2048x2048, shortest side to 768, 170 per 512px tile + 85
+    'openai': {'method': 'tiles', 'tile_size': 512, 'per_tile': 170, 'base': 85, 'max_side': 2048, 'short_side': 768},
+    # (width * height) / 750 after the long edge is scaled to 1568
+    'anthropic': {'method': 'area', 'pixels_per_token': 750, 'max_side': 1568},
+    # 258 for images within 384x384, else 258 per 768px tile
+    'gemini': {'method': 'tiles', 'tile_size': 768, 'per_tile': 258, 'small_side': 384},
+    # LLaVA: fixed 576 patch embeddings
+    'ollama': {'method': 'fixed', 'tokens': 576},
+    'default': {'method': 'tiles', 'tile_size': 768, 'per_tile': 258},
+}
+
+
+class InputTooLargeError(ValueError):
+    """The prompt cannot be made to fit the provider's input limit."""
+
+    def __init__(self, provider_name: str, estimated_tokens: int, max_input_tokens: int, message: str = ''):
+        super().__init__(message or (
+            f"Input too large for {provider_name}: ~{estimated_tokens} prompt tokens, "
+            f"limit {max_input_tokens}"
+        ))
+        self.provider_name = provider_name
+        self.estimated_tokens = estimated_tokens
+        self.max_input_tokens = max_input_tokens
+
+
+@dataclass
+class FittedInput:
+    """Messages and image as they will be sent, with their estimated size."""
+
+    messages: List[Dict[str, Any]]
+    image: Optional[ImagePayload]
+    estimated_tokens: int
+    max_input_tokens: Optional[int] = None
+    adjustments: List[str] = field(default_factory=list)
+    provider_name: Optional[str] = None  # Provider the input was fitted to
+
+
+def _scale_to(width: float, height: float, max_side: Optional[float]) -> Tuple[float, float]:
+    """Scale dimensions down (never up) so the longest side is at most max_side."""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return width * scale, height * scale
+
+
+def image_tokens(formula: Dict[str, Any], size: Optional[Tuple[int, int]]) -> int:
+    """
+    Prompt tokens of an image under a provider formula.
+
+    Args:
+        formula: Dict with 'method' (tiles, area or fixed) and its parameters
+        size: (width, height) in pixels, or None if unknown
+
+    Returns:
+        Estimated tokens
+    """
+    method = formula.get('method', 'tiles')
+    if method == 'fixed':
+        return int(formula.get('tokens', 258))
+
+    width, height = size or _DEFAULT_IMAGE_SIZE
+    width, height = _scale_to(width, height, formula.get('max_side'))
+
+    if method == 'area':
+        return math.ceil(width * height / float(formula.get('pixels_per_token', 750)))
+
+    short_side = formula.get('short_side')
+    if short_side and min(width, height) > short_side:
+        scale = short_side / min(width, height)
+        width, height = width * scale, height * scale
+
+    per_tile = int(formula.get('per_tile', 258))
+    small_side = formula.get('small_side')
+    if small_side and width <= small_side and height <= small_side:
+        tiles = 1
+    else:
+        tile_size = float(formula.get('tile_size', 768))
+        tiles = math.ceil(width / tile_size) * math.ceil(height / tile_size)
+    return int(formula.get('base', 0)) + per_tile * tiles
+
+
+class TokenEstimator:
+    """Estimate prompt sizes per provider and fit inputs to their limits."""
+
+    def __init__(self):
+        config_loader = get_config_loader()
+        self.llm_config = config_loader.load_llm_config()
+        settings = self.llm_config.get('token_estimation', {}) or {}
+        self.enabled = settings.get('enabled', True)
+        self.chars_per_token = float(settings.get('chars_per_token', 4))
+        self.message_overhead = int(settings.get('message_overhead', 4))
+        self.safety_margin = float(settings.get('safety_margin', 0.05))
+        self.on_overflow = settings.get('on_overflow', 'fit')
+        self.min_image_side = int(settings.get('min_image_side', 512))
+        self.token_scale: Dict[str, float] = settings.get('token_scale', {}) or {}
+        self.image_formulas = {**_DEFAULT_IMAGE_FORMULAS, **(settings.get('image_tokens', {}) or {})}
+
+    def _provider_config(self, provider_name: str) -> Dict[str, Any]:
+        return self.llm_config.get('providers', {}).get(provider_name, {})
+
+    def max_input_tokens(self, provider_name: str) -> Optional[int]:
+        """Input limit from llm.yaml, else LiteLLM's model info, else None (unknown)."""
+        provider_config = self._provider_config(provider_name)
+        if provider_config.get('max_input_tokens'):
+            return int(provider_config['max_input_tokens'])
+        if LITELLM_AVAILABLE and provider_config.get('model'):
+            try:
+                return litellm.get_model_info(provider_config['model']).get('max_input_tokens')
+            except Exception:
+                return None
+        return None
+
+    def image_formula(self, provider_name: str) -> Dict[str, Any]:
+        """Image token formula for a provider: its own image_tokens, else its family's."""
+        provider_config = self._provider_config(provider_name)
+        if provider_config.get('image_tokens'):
+            return provider_config['image_tokens']
+        return self.image_formulas.get(provider_config.get('provider'), self.image_formulas['default'])
+
+    def text_tokens(self, provider_name: str, chars: int) -> int:
+        """Estimated tokens for a number of characters of text."""
+        return math.ceil(chars / self.chars_per_token * float(self.token_scale.get(provider_name, 1.0)))
+
+    def estimate(
+        self,
+        provider_name: str,
+        messages: List[Dict[str, Any]],
+        image: Optional[ImagePayload] = None
+    ) -> Dict[str, int]:
+        """
+        Estimate the prompt tokens of a request.
+
+        Args:
+            provider_name: Provider name from config
+            messages: Messages without the image part
+            image: Image attached to the document message, if any
+
+        Returns:
+            Dictionary with 'text', 'image' and 'total' token estimates
+        """
+        chars = 0
+        images = 0
+        for message in messages:
+            content = message.get('content')
+            if isinstance(content, list):
+                for part in content:
+                    if part.get('type') == 'text':
+                        chars += len(part.get('text', ''))
+                    else:
+                        images += 1
+            elif content:
+                chars += len(str(content))
+
+        text = self.text_tokens(provider_name, chars) + self.message_overhead * len(messages)
+        image_total = 0
+        if self._provider_config(provider_name).get('supports_vision', False):
+            formula = self.image_formula(provider_name)
+            image_total = images * image_tokens(formula, None)
+            if image is not None:
+                image_total += image_tokens(formula, image.size)
+        return {'text': text, 'image': image_total, 'total': text + image_total}
+
+    def fit(
+        self,
+        provider_name: str,
+        messages: List[Dict[str, Any]],
+        image: Optional[ImagePayload] = None
+    ) -> FittedInput:
+        """
+        Make a request fit the provider's input limit.
+
+        Images are downscaled first (not below min_image_side), then the
+        document text (the first user message) is trimmed. The caller's
+        messages and image are not modified.
+
+        Raises:
+            InputTooLargeError: If the request cannot fit, or does not fit
+                and on_overflow is 'reject'
+        """
+        estimate = self.estimate(provider_name, messages, image)
+        limit = self.max_input_tokens(provider_name)
+        fitted = FittedInput(messages, image, estimate['total'], limit, provider_name=provider_name)
+        if not self.enabled or not limit:
+            return fitted
+
+        budget = int(limit * (1 - self.safety_margin))
+        if estimate['total'] <= budget:
+            return fitted
+        if self.on_overflow == 'reject':
+            raise InputTooLargeError(provider_name, estimate['total'], limit)
+
+        # Downscale the image until it fits (tile formulas are step functions)
+        while estimate['total'] > budget and estimate['image'] and image is not None and image.size:
+            longest = max(image.size)
+            if longest <= self.min_image_side:
+                break
+            target = max(0, budget - estimate['text'])
+            ratio = min(0.9, max(0.5, math.sqrt(target / estimate['image'])))
+            resized = image.resized(max(self.min_image_side, int(longest * ratio)))
+            resized_estimate = self.estimate(provider_name, messages, resized)
+            if resized_estimate['image'] >= estimate['image']:
+                # Fixed-cost formula: a smaller image saves nothing
+                break
+            image, estimate = resized, resized_estimate
+            fitted.adjustments.append(f"image downscaled to {image.size[0]}x{image.size[1]}")
+
+        if estimate['total'] > budget:
+            trimmed = self._trim_document(provider_name, messages, estimate['total'] - budget)
+            if trimmed is not None:
+                messages = trimmed
+                estimate = self.estimate(provider_name, messages, image)
+                fitted.adjustments.append(
+                    f"document text trimmed to {len(messages[document_message_index(messages)]['content'])} characters"
+                )
+
+        if estimate['total'] > budget:
+            raise InputTooLargeError(provider_name, estimate['total'], limit)
+
+        logger.warning(
+            f"Input fitted to {provider_name} ({limit} tokens): {', '.join(fitted.adjustments)}",
+            extra={'event': 'llm_input_fitted', 'model': provider_name, 'estimated_tokens': estimate['total']}
+        )
+        fitted.messages = messages
+        fitted.image = image
+        fitted.estimated_tokens = estimate['total']
+        return fitted
+
+    def _trim_document(
+        self,
+        provider_name: str,
+        messages: List[Dict[str, Any]],
+        excess_tokens: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Cut the end of the document message's text, or None if nothing useful would be left."""
+        index = document_message_index(messages)
+        if index is None or not isinstance(messages[index].get('content'), str):
+            return None
+
+        text = messages[index]['content']
+        scale = float(self.token_scale.get(provider_name, 1.0))
+        excess_chars = math.ceil(excess_tokens * self.chars_per_token / scale) + len(TRUNCATION_MARKER)
+        keep = len(text) - excess_chars
+        if keep <= len(text) // 10:
+            return None
+
+        # Cut at a line break when there is one close by
+        cut = text.rfind('\n', int(keep * 0.95), keep)
+        trimmed = text[:cut if cut > 0 else keep] + TRUNCATION_MARKER
+        return messages[:index] + [{**messages[index], 'content': trimmed}] + messages[index + 1:]
+
+    def calibration(self, samples: List[Tuple[str, int, int]]) -> List[Dict[str, Any]]:
+        """
+        Compare estimated with actual prompt tokens of finished jobs.
+
+        Args:
+            samples: (model_used, estimated_prompt_tokens, prompt_tokens) per job
+
+        Returns:
+            Per provider: job count, median actual/estimated ratio, current
+            token_scale and the suggested token_scale (current x ratio)
+        """
+        # model_used holds the LiteLLM model, possibly tagged " [fallback:...]"
+        providers_by_model: Dict[str, str] = {}
+        for provider_name, provider_config in self.llm_config.get('providers', {}).items():
+            providers_by_model.setdefault(provider_config.get('model'), provider_name)
+
+        ratios: Dict[str, List[float]] = {}
+        for model_used, estimated, actual in samples:
+            if not estimated or not actual or not model_used:
+                continue
+            provider_name = providers_by_model.get(model_used.split(' [', 1)[0])
+            if provider_name:
+                ratios.setdefault(provider_name, []).append(actual / estimated)
+
+        report = []
+        for provider_name, values in sorted(ratios.items()):
+            values.sort()
+            ratio = values[len(values) // 2]
+            scale = float(self.token_scale.get(provider_name, 1.0))
+            report.append({
+                'provider': provider_name,
+                'jobs': len(values),
+                'median_ratio': round(ratio, 3),
+                'token_scale': scale,
+                'suggested_token_scale': round(scale * ratio, 3)
+            })
+        return report
+
+
+# Global instance
+_token_estimator: Optional[TokenEstimator] = None
+
+
+def get_token_estimator() -> TokenEstimator:
+    """Get or create global token estimator."""
+    global _token_estimator
+    if _token_estimator is None:
+        _token_estimator = TokenEstimator()
+    return _token_estimator
@@ -11,6 +11,7 @@ from autoglean.db.base import get_db
 from autoglean.db.models import User, Extractor, ExtractorApiKey, ApiExtractionJob
 from autoglean.core.storage import get_storage_manager
 from autoglean.api.celery_app import celery_app
+from autoglean.api.tasks import deferred_task_id
 from autoglean.public_api.schemas import (
     PublicExtractionResponse,
     PublicTaskStatusResponse
@@ -29,6 +30,7 @@ async def public_extract(
     user_id: int = Form(..., description="ID of the user making the request"),
     label: str = Form(..., description="Label/title for this extraction request"),
     file: UploadFile = File(..., description="File to extract information from"),
+    deferred: bool = Form(False, description="Queue for discounted batch processing (results within ~24h)"),
     db: Session = Depends(get_db)
 ):
     """
@@ -78,12 +80,22 @@ async def public_extract(
             requester_user_id=user_id,
             request_label=label,
             file_name=file.filename,
-            status="pending"
+            status="queued" if deferred else "pending",
+            job_class="deferred" if deferred else "interactive"
         )
         db.add(api_job)
         db.commit()
         db.refresh(api_job)
 
+        if deferred:
+            # Picked up by the batch collector; the result is stored under this task ID
+            logger.info(f"API extraction queued for batch processing: job {job_id}")
+            return PublicExtractionResponse(
+                task_id=deferred_task_id(job_id),
+                job_id=job_id,
+                message="Extraction queued for batch processing"
+            )
+
         # 6. Trigger Celery task for extraction
         task = celery_app.send_task(
             'autoglean.extract_document',
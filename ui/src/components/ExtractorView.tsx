@@ -6,7 +6,7 @@ import { useAuth } from "@/contexts/AuthContext";
 import { UploadCloud, Play, File, Zap, Map, Calendar, Home, Search, Circle, LucideIcon, Copy, FileText, Loader2, Lock, Share2, Star, History, CheckCircle, Clock, Folder, Database, Settings, Users, BarChart, Layers, Package, Globe, Book, Briefcase, ClipboardList, Mail, Phone, MapPin, Tag, Archive, ThumbsUp, TrendingUp, Activity, Award, Target, Flag, CheckSquare, Filter, Compass, Navigation, Bell, Bookmark, Box, Camera, Cast, ChevronRight, Cloud, Code, Coffee, CreditCard, DollarSign, Download, Droplet, Edit, Eye, Facebook, FileCheck, Film, Flame, Gift, Headphones, Image, Instagram, Key, Link, MessageCircle, Mic, Monitor, Moon, Music, PenTool, Percent, Printer, Radio, Repeat, Save, Send, Server, Shield, ShoppingBag, ShoppingCart, Shuffle, Smartphone, Speaker, Sun, Thermometer, Trash, Truck, Tv, Twitter, Umbrella, Upload, User, Video, Wifi, Wind, Youtube, Anchor, Atom, Battery, Bluetooth, Calculator, ChevronDown, Clipboard, CloudRain, Cpu, Disc, Feather, FileVideo, Fingerprint, Flashlight, FolderOpen, Gamepad2, HardDrive, Hash, Headset, HelpCircle, Laptop, Lightbulb, Medal, Menu, MessageSquare, Paperclip, PieChart } from "lucide-react";
 import { cn } from "@/lib/utils";
 import type { Extractor, ExtractedResult } from "@/types/extractor";
-import { uploadFile, startExtraction, pollTaskStatus } from "@/services/api";
+import { uploadFile, startExtraction, pollTaskStatus, streamTaskContent } from "@/services/api";
 import { toast } from "sonner";
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
@@ -236,8 +236,25 @@ export const ExtractorView = ({ extractor }: ExtractorViewProps) => {
         }));
         setProcessingStatus(language === 'en' ? 'Processing document...' : 'معالجة المستند...');
 
+        // Render content live while the LLM is still generating
+        const stopStreaming = streamTaskContent(extractionResponse.task_id, (partialContent) => {
+          const partialResult: ExtractedResult = {
+            id: extractionResponse.task_id,
+            fileName: file.name,
+            content: partialContent,
+            extractedAt: new Date(),
+            originalContent: originalContent,
+            fileType: file.type,
+            jobId: jobId,
+          };
+          setResults(prev => [partialResult, ...prev.filter(r => r.id !== partialResult.id)]);
+        });
+
         // Poll for completion
-        const taskResult = await pollTaskStatus(extractionResponse.task_id);
+        const taskResult = await pollTaskStatus(extractionResponse.task_id).finally(stopStreaming);
+
+        // Drop the live partial result; it is replaced by the final one below
+        setResults(prev => prev.filter(r => r.id !== extractionResponse.task_id));
 
         if (taskResult.status === 'success' && taskResult.result) {
           // Check if extraction was successful or failed
@@ -379,6 +379,68 @@ export async function pollTaskStatus(
   throw new Error('Task polling timeout');
 }
 
+/**
+ * Stream partial task content via Server-Sent Events
+ *
+ * Calls onContent with all content received so far. Returns a function
+ * that closes the stream. The stream is read with fetch rather than
+ * EventSource, which cannot send the Authorization header.
+ */
+export function streamTaskContent(
+  taskId: string,
+  onContent: (content: string) => void
+): () => void {
+  const controller = new AbortController();
+  let content = '';
+
+  const handleEvent = (event: string, data: string) => {
+    if (event === 'snapshot') {
+      content = JSON.parse(data).content;
+    } else if (event === 'delta') {
+      content += JSON.parse(data).content;
+    } else if (event === 'reset') {
+      // The task was retried: its content starts over
+      content = '';
+    } else {
+      if (event === 'done' || event === 'timeout') controller.abort();
+      return;
+    }
+    onContent(content);
+  };
+
+  (async () => {
+    const response = await fetch(`${API_BASE_URL}/api/task/${taskId}/stream`, {
+      headers: getAuthHeaders(),
+      signal: controller.signal,
+    });
+    if (!response.ok || !response.body) return;
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = 'message';
+        const data: string[] = [];
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data.push(line.slice(6));
+        }
+        handleEvent(event, data.join('\n'));
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+  })().catch(() => controller.abort());
+
+  return () => controller.abort();
+}
+
 /**
  * Get unique departments from extractors
  */